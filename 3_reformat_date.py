@@ -1,6 +1,12 @@
+import os
+import sys
 import pandas as pd
 import json
-from dateutil.parser import parse
+
+# The date parser lives next to the pipeline scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'python-scripts'))
+from russian_dates import (DateCache, classify_date_formats, convert_dates_by_format, format_histogram,
+                           new_conversion_stats, print_conversion_stats)
 
 # Load the JSON file with extracted lecture information
 with open('output/02_lectures_with_extracted_info.json', 'r', encoding='utf-8') as file:
@@ -15,91 +21,23 @@ print("\nColumns:", df.columns.tolist())
 print("\nOriginal data:")
 print(df[['title', 'number', 'date']].head())
 
-# Create a mapping for Russian months to English
-russian_months = {
-    'января': 'January', 'февраля': 'February', 'марта': 'March',
-    'апреля': 'April', 'мая': 'May', 'июня': 'June',
-    'июля': 'July', 'августа': 'August', 'сентября': 'September',
-    'октября': 'October', 'ноября': 'November', 'декабря': 'December'
-}
-
-def convert_russian_date(date_str):
-    """Convert Russian date format to DD/MM/YYYY"""
-    if pd.isna(date_str) or date_str is None:
-        return None
-    
-    try:
-        # Replace Russian month names with English
-        english_date = str(date_str)
-        for ru_month, en_month in russian_months.items():
-            english_date = english_date.replace(ru_month, en_month)
-        
-        # Parse the date and format as DD/MM/YYYY
-        parsed_date = parse(english_date)
-        return parsed_date.strftime('%d/%m/%Y')
-        
-    except Exception as e:
-        print(f"Error converting date '{date_str}': {e}")
-        return None
-
 # Advanced date conversion logic (adapted from script 4)
 print("\nAnalyzing date format and converting to standard DD/MM/YYYY...")
 
 if 'date' in df.columns:
-    # Check if dates are already in DD/MM/YYYY format
-    sample_dates = df['date'].dropna().head(5) if not df['date'].dropna().empty else []
-    
-    # Analyze sample dates to detect format
-    dd_mm_yyyy_count = 0
-    russian_format_count = 0
-    
-    for sample_date in sample_dates:
-        if '/' in str(sample_date):
-            dd_mm_yyyy_count += 1
-        elif any(month in str(sample_date) for month in russian_months.keys()):
-            russian_format_count += 1
-    
-    print(f"Date format analysis: {dd_mm_yyyy_count} DD/MM/YYYY, {russian_format_count} Russian format")
-    
-    if dd_mm_yyyy_count > russian_format_count:
-        # Already in DD/MM/YYYY format
-        print("Dates appear to be in DD/MM/YYYY format - keeping as-is")
-        df['date_standard'] = df['date'].astype(str)
-        # Create datetime column for validation
-        df['date_datetime'] = pd.to_datetime(df['date'], format='%d/%m/%Y', errors='coerce')
-    else:
-        # Convert from Russian format
-        print("Converting from Russian date format...")
-        
-        def convert_russian_date_advanced(date_str):
-            """Advanced Russian date conversion with better error handling"""
-            if pd.isna(date_str) or date_str is None:
-                return None, None
-            
-            try:
-                # Clean up the date string
-                date_str = str(date_str).strip()
-                
-                # Replace Russian month names with English
-                english_date = date_str
-                for ru_month, en_month in russian_months.items():
-                    english_date = english_date.replace(ru_month, en_month)
-                
-                # Parse the date
-                parsed_date = parse(english_date)
-                date_standard = parsed_date.strftime('%d/%m/%Y')
-                
-                return parsed_date, date_standard
-                
-            except Exception as e:
-                print(f"Warning: Could not parse date '{date_str}': {e}")
-                return None, None
-        
-        # Apply conversion
-        conversion_results = df['date'].apply(convert_russian_date_advanced)
-        df['date_datetime'] = [result[0] for result in conversion_results]
-        df['date_standard'] = [result[1] for result in conversion_results]
-        
+    # Every row's format is classified and each group goes to its own parser,
+    # so a column that mixes formats isn't converted as a whole with one of them
+    formats = classify_date_formats(df['date'])
+    format_counts = format_histogram(formats)
+    print("Date format analysis: " + ', '.join(
+        f"{count} {date_format}" for date_format, count in format_counts.items()))
+
+    conversion_stats = new_conversion_stats()
+    conversion_results = convert_dates_by_format(df['date'], conversion_stats, DateCache(), formats=formats)
+    df['date_datetime'] = [result[0] for result in conversion_results]
+    df['date_standard'] = [result[1] for result in conversion_results]
+    print_conversion_stats(conversion_stats)
+
     # Report conversion results
     successful_conversions = df['date_datetime'].notna().sum()
     total_dates = df['date'].notna().sum()
@@ -1,29 +1,135 @@
-import os
-import pandas as pd
+import argparse
 import json
+import os
+import time
+
+from boilerplate_strip import BoilerplateStripper, DEFAULT_PHRASES, load_phrases
+from columnar_io import write_parquet
+from dump_merge import DEFAULT_READ_THREADS, dump_paths, is_dump_collection, merge_dumps
+from json_stream import DEFAULT_CHUNK_SIZE, iter_record_chunks
+from lazy_import import lazy_module
+from ndjson_stream import write_ndjson
+from pipeline_metrics import RunMetrics
+
+pd = lazy_module('pandas')
+
+INPUT_FILE = '../input/dataset_youtube-scraper-task_2025-04-26.json'
+OUTPUT_DIR = '../output'
+
+# Columns we don't need for the catalogue
+COLUMNS_TO_DROP = ['order', 'thumbnailUrl', 'date', 'id', 'url', 'duration']
+
+
+def extract_rename_columns(df, keep_columns=()):
+    """Drop unused columns (except keep_columns) and rename "text" to "description" """
+    # Remove some columns (already gone if they were projected away while streaming)
+    df = df.drop(columns=[col for col in COLUMNS_TO_DROP if col not in keep_columns], errors='ignore')
+    # Rename columns for clarity, "text" to "description"
+    return df.rename(columns={"text": "description"})
+
+
+def strip_boilerplate(df, stripper):
+    """Remove the boilerplate lines of the descriptions (see boilerplate_strip.py), their hashtags go to "tags" """
+    df = df.copy()
+    descriptions, tags = stripper.strip_column(df['description'])
+    df['description'] = descriptions
+    # object keeps None, so videos without hashtags are written as null rather than NaN
+    df['tags'] = pd.Series(tags, index=df.index, dtype=object)
+    return df
+
+
+def description_chars(df):
+    """Characters in the description column, to report what stripping saved"""
+    return int(sum(len(text) for text in df['description'] if isinstance(text, str)))
+
+
+def iter_cleaned_chunks(input_file=INPUT_FILE, chunk_size=DEFAULT_CHUNK_SIZE, keep_columns=(),
+                        threads=DEFAULT_READ_THREADS):
+    """Stream the Apify dump and yield cleaned DataFrames of at most chunk_size rows.
+
+    Unused columns are dropped while each record is parsed, so the whole dump
+    is never held in memory. keep_columns (e.g. "id") are kept even though
+    they are normally dropped.
+
+    input_file can also be a directory or a glob pattern of several dumps:
+    they are read by `threads` threads and merged to one record per video
+    id, the latest scrape wins (see dump_merge.py).
+    """
+    drop_fields = [col for col in COLUMNS_TO_DROP if col not in keep_columns]
+    if is_dump_collection(input_file):
+        paths = dump_paths(input_file)
+        print(f"Merging {len(paths)} dumps matching {input_file}")
+        records = merge_dumps(paths, drop_fields, threads, chunk_size)
+        for start in range(0, len(records), chunk_size):
+            # "id" and "date" were kept for the merge, extract_rename_columns drops them
+            yield extract_rename_columns(pd.DataFrame(records[start:start + chunk_size]), keep_columns)
+        return
+
+    for records in iter_record_chunks(input_file, chunk_size, drop_fields=drop_fields):
+        yield extract_rename_columns(pd.DataFrame(records), keep_columns)
+
+
+def load_cleaned_data(input_file=INPUT_FILE, chunk_size=DEFAULT_CHUNK_SIZE, threads=DEFAULT_READ_THREADS):
+    """Stream the Apify dump (or merge several) into a single cleaned DataFrame"""
+    chunks = list(iter_cleaned_chunks(input_file, chunk_size, threads=threads))
+    if not chunks:
+        return pd.DataFrame(columns=['description', 'title'])
+    return pd.concat(chunks, ignore_index=True)
+
+
+def save_results(df, output_dir=OUTPUT_DIR, output_format='json'):
+    # Ensure output directory exists
+    os.makedirs(output_dir, exist_ok=True)
+
+    if output_format == 'parquet':
+        output_file = write_parquet(df, os.path.join(output_dir, '01_title_description_cleaned.parquet'))
+        print(f"\nDataFrame saved to '{output_file}'")
+        return
+    if output_format == 'ndjson':
+        output_file = write_ndjson(df, os.path.join(output_dir, '01_title_description_cleaned.ndjson'))
+        print(f"\nDataFrame saved to '{output_file}'")
+        return
+
+    # Optional: Save the cleaned DataFrame to CSV
+    df.to_csv(os.path.join(output_dir, '01_title_description_cleaned.csv'), index=False, encoding='utf-8-sig', sep=';')
+    print("\nDataFrame saved to '01_title_description_cleaned.csv'")
 
-# Read the JSON file
-with open('../input/dataset_youtube-scraper-task_2025-04-26.json', 'r', encoding='utf-8') as file:
-    data = json.load(file)
+    # Convert the DataFrame back to JSON
+    df_records = df.to_dict(orient='records')
 
-# Convert JSON to DataFrame
-df = pd.DataFrame(data)
+    # Optional: Save the JSON to a file
+    with open(os.path.join(output_dir, '01_title_description_cleaned.json'), 'w', encoding='utf-8') as json_file:
+        json.dump(df_records, json_file, ensure_ascii=False, indent=4)
 
-# Remove some columns
-df = df.drop(['order','thumbnailUrl','date','id','url','duration'], axis=1)
-# Rename columns for clarity, "text" to "description"
-df = df.rename(columns={"text": "description"})
 
-# Ensure output directory exists
-os.makedirs('../output', exist_ok=True)
+def main():
+    parser = argparse.ArgumentParser(description="Clean the scraper dump")
+    parser.add_argument('--input', default=INPUT_FILE,
+                        help="Apify dump, or a directory / glob pattern of dumps to merge by video id")
+    parser.add_argument('--threads', type=int, default=DEFAULT_READ_THREADS,
+                        help="Threads reading the dumps when merging several")
+    parser.add_argument('--strip-boilerplate', action='store_true',
+                        help="Remove the donation / contact / divider lines and move hashtags to a tags column")
+    parser.add_argument('--phrases', metavar='FILE',
+                        help="JSON list of the phrases whose lines are removed (implies --strip-boilerplate)")
+    args = parser.parse_args()
 
-# Optional: Save the cleaned DataFrame to CSV
-df.to_csv('../output/01_title_description_cleaned.csv', index=False, encoding='utf-8-sig', sep=';')
-print("\nDataFrame saved to '01_title_description_cleaned.csv'")
+    metrics = RunMetrics('stage 1', input_file=args.input)
+    start = time.perf_counter()
+    df = load_cleaned_data(args.input, threads=args.threads)
+    metrics.add_stage('1 load + clean', len(df), time.perf_counter() - start)
+    if args.strip_boilerplate or args.phrases:
+        stripper = BoilerplateStripper(load_phrases(args.phrases) if args.phrases else DEFAULT_PHRASES)
+        chars_before = description_chars(df)
+        with metrics.stage('1 strip boilerplate', len(df)) as counts:
+            df = strip_boilerplate(df, stripper)
+            counts.update(chars_before=chars_before, chars_after=description_chars(df),
+                          with_tags=int(df['tags'].notna().sum()))
+        print(f"Stripped boilerplate: {counts['chars_before']} → {counts['chars_after']} description characters, "
+              f"{counts['with_tags']} videos with hashtags")
+    save_results(df)
+    print(f"Metrics appended to: {metrics.save(OUTPUT_DIR)}")
 
-# Convert the DataFrame back to JSON   
-df_records = df.to_dict(orient='records')
 
-# Optional: Save the JSON to a file
-with open('../output/01_title_description_cleaned.json', 'w', encoding='utf-8') as json_file:
-    json.dump(df_records, json_file, ensure_ascii=False, indent=4)
+if __name__ == '__main__':
+    main()
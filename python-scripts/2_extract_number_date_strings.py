@@ -1,93 +1,109 @@
-import pandas as pd
+import argparse
 import json
-import re
-
-# Load the recently saved JSON file
-with open('../output/01_title_description_cleaned.json', 'r', encoding='utf-8') as file:
-    data = json.load(file)
-
-# Convert JSON to DataFrame
-df = pd.DataFrame(data)
-
-# Display basic info about the loaded data
-print("Loaded DataFrame shape:", df.shape)
-print("\nColumns:", df.columns.tolist())
-print("\nFirst few rows:")
-print(df[['title']].head())
-
-# Extract lecture information using regex pattern
-# Pattern: "Лекцию №*Сергей Бугаев прочитал*года"
-# We want to extract: 
-# 1. Text between "№" and "Сергей" 
-# 2. Text between "прочитал" and "года"
-
-def extract_lecture_info(description):
-    if pd.isna(description):
-        return None, None
-    
-    # Pattern 1: "© Лекцию №X (часть Y) Сергей Бугаев прочитал DATE года"
-    pattern1 = r'©\s*Лекцию\s+№\s*([^(]*?)\s*\(часть\s*([^)]*?)\)\s*Сергей\s+Бугаев\s+прочитал\s+(.*?)\s+года'
-    match1 = re.search(pattern1, description, re.IGNORECASE | re.DOTALL)
-    
-    if match1:
-        lecture_number = match1.group(1).strip()
-        part_number = match1.group(2).strip()
-        lecture_date = match1.group(3).strip()
-        # Combine lecture number and part number in X-Y format
-        combined_number = f"{lecture_number}-{part_number}"
-        return combined_number, lecture_date
-    
-    # Pattern 2: "© Лекцию №X Сергей Бугаев прочитал DATE года" (without части)
-    pattern2 = r'©\s*Лекцию\s+№\s*([^С]*?)\s*Сергей\s+Бугаев\s+прочитал\s+(.*?)\s+года'
-    match2 = re.search(pattern2, description, re.IGNORECASE | re.DOTALL)
-    
-    if match2:
-        lecture_number = match2.group(1).strip()
-        lecture_date = match2.group(2).strip()
-        return lecture_number, lecture_date
-    
-    # Pattern 3: "Лекция прочитана DATE года" (no number, just date)
-    pattern3 = r'Лекция\s+прочитана\s+(.*?)\s+года'
-    match3 = re.search(pattern3, description, re.IGNORECASE | re.DOTALL)
-    
-    if match3:
-        lecture_number = None
-        lecture_date = match3.group(1).strip()
-        return lecture_number, lecture_date
-    
-    return None, None
-
-# Apply the extraction function to each row
-print("\nExtracting lecture information...")
-lecture_info = df['description'].apply(extract_lecture_info)
-
-# Create new columns for the extracted information
-df['number'] = [info[0] for info in lecture_info]
-df['date'] = [info[1] for info in lecture_info]
-
-# Display results
-print("\nExtraction results:")
-print("="*50)
-for idx, row in df.iterrows():
-    print(f"Title: {row['title']}")
-    print(f"Number: {row['number']}")
-    print(f"Date: {row['date']}")
-    print("-" * 30)
-
-# Show only rows where extraction was successful
-extracted_df = df[df['number'].notna()]
-print(f"\nFound {len(extracted_df)} rows with lecture information:")
-print(extracted_df[['title', 'number', 'date']])
-
-# Save the enhanced DataFrame with extracted information
-output_file = '../output/02_lectures_with_extracted_info.json'
-df_records = df.to_dict(orient='records')
-
-with open(output_file, 'w', encoding='utf-8') as json_file:
-    json.dump(df_records, json_file, ensure_ascii=False, indent=4)
-
-print(f"\nEnhanced data saved to: {output_file}")
-
-# Optional: Save as CSV for easier viewing with proper UTF-8 BOM and semicolon delimiter
-df.to_csv('../output/02_lectures_with_extracted_info.csv', index=False, encoding='utf-8-sig', sep=';')
-print("Also saved as CSV: ../output/02_lectures_with_extracted_info.csv")
\ No newline at end of file
+import os
+
+import pandas as pd
+
+from columnar_io import load_stage_input, write_parquet
+# Regex patterns for the three description formats live in lecture_extraction.py
+from lecture_extraction import extract_lecture_columns
+from ndjson_stream import write_ndjson
+from parallel import map_chunks
+from pipeline_metrics import RunMetrics, rate
+
+INPUT_FILE = '../output/01_title_description_cleaned.json'
+OUTPUT_DIR = '../output'
+
+
+def extract_number_date_strings(df, workers=1):
+    """Add "number" and "date" columns parsed from the description, in a process pool if workers > 1"""
+    df = df.copy()
+
+    # Extract the whole column at once (or chunk by chunk in parallel)
+    lecture_info = pd.concat(map_chunks(extract_lecture_columns, df['description'], workers))
+
+    # Create new columns for the extracted information
+    df['number'] = lecture_info['number']
+    df['date'] = lecture_info['date']
+    return df
+
+
+def extraction_metrics(df):
+    """Counts for the metrics file: rows with a lecture number, a date, or either"""
+    with_lecture_info = (df['number'].notna() | df['date'].notna()).sum()
+    return {
+        'with_number': int(df['number'].notna().sum()),
+        'with_date': int(df['date'].notna().sum()),
+        'extraction_rate': rate(with_lecture_info, len(df)),
+    }
+
+
+def report_extraction(df, verbose=False):
+    """Print the extracted lectures, every row's title, number and date too if verbose"""
+    if verbose:
+        print("\nExtraction results:")
+        print("="*50)
+        for title, number, date in zip(df['title'], df['number'], df['date']):
+            print(f"Title: {title}")
+            print(f"Number: {number}")
+            print(f"Date: {date}")
+            print("-" * 30)
+
+    # Show only rows where extraction was successful
+    extracted_df = df[df['number'].notna()]
+    print(f"\nFound {len(extracted_df)} rows with lecture information:")
+    print(extracted_df[['title', 'number', 'date']] if verbose else extracted_df[['title', 'number', 'date']].head(10))
+
+
+def save_results(df, output_dir=OUTPUT_DIR, output_format='json'):
+    if output_format == 'parquet':
+        output_file = write_parquet(df, os.path.join(output_dir, '02_lectures_with_extracted_info.parquet'))
+        print(f"\nEnhanced data saved to: {output_file}")
+        return
+    if output_format == 'ndjson':
+        output_file = write_ndjson(df, os.path.join(output_dir, '02_lectures_with_extracted_info.ndjson'))
+        print(f"\nEnhanced data saved to: {output_file}")
+        return
+
+    # Save the enhanced DataFrame with extracted information
+    output_file = os.path.join(output_dir, '02_lectures_with_extracted_info.json')
+    df_records = df.to_dict(orient='records')
+
+    with open(output_file, 'w', encoding='utf-8') as json_file:
+        json.dump(df_records, json_file, ensure_ascii=False, indent=4)
+
+    print(f"\nEnhanced data saved to: {output_file}")
+
+    # Optional: Save as CSV for easier viewing with proper UTF-8 BOM and semicolon delimiter
+    output_csv = os.path.join(output_dir, '02_lectures_with_extracted_info.csv')
+    df.to_csv(output_csv, index=False, encoding='utf-8-sig', sep=';')
+    print(f"Also saved as CSV: {output_csv}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract lecture numbers and dates from the descriptions")
+    parser.add_argument('--verbose', action='store_true', help="List the title, number and date of every row")
+    args = parser.parse_args()
+
+    # Load the recently saved JSON (or Parquet) file
+    df = load_stage_input(INPUT_FILE)
+
+    # Display basic info about the loaded data
+    print("Loaded DataFrame shape:", df.shape)
+    print("\nColumns:", df.columns.tolist())
+    print("\nFirst few rows:")
+    print(df[['title']].head())
+
+    metrics = RunMetrics('stage 2')
+    print("\nExtracting lecture information...")
+    with metrics.stage('2 extract', len(df)) as counts:
+        df = extract_number_date_strings(df)
+        counts.update(extraction_metrics(df))
+
+    report_extraction(df, args.verbose)
+    save_results(df)
+    print(f"Metrics appended to: {metrics.save(OUTPUT_DIR)}")
+
+
+if __name__ == '__main__':
+    main()
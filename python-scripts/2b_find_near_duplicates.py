@@ -0,0 +1,81 @@
+"""Cluster re-uploaded and near-duplicate lectures (see near_duplicates.py).
+
+Adds a "cluster_id" column to the stage 2 output: rows whose title and
+description are at least --threshold similar (estimated Jaccard similarity
+of their word shingles) share an id. Stage 3b reads this file instead of
+the 02_ file when it is the newer one, so the ids reach the 4b output,
+where 4b_create_chronological_order.py --collapse-duplicates keeps only the
+first of the rows with the same cluster and lecture number.
+
+Usage:
+    python 2b_find_near_duplicates.py [--threshold 0.7]
+"""
+import argparse
+import json
+import os
+
+from columnar_io import load_stage_input, write_parquet
+from ndjson_stream import write_ndjson
+from near_duplicates import DEFAULT_THRESHOLD, cluster_rows
+from pipeline_metrics import RunMetrics
+
+INPUT_FILE = '../output/02_lectures_with_extracted_info.json'
+OUTPUT_FILE = '../output/02b_lectures_with_clusters.json'
+OUTPUT_DIR = '../output'
+
+
+def find_near_duplicates(df, threshold=DEFAULT_THRESHOLD):
+    """Add the "cluster_id" column, returns (df, stats)"""
+    df = df.copy()
+    cluster_ids, stats = cluster_rows(df['title'], df['description'], threshold)
+    df['cluster_id'] = cluster_ids
+    return df, stats
+
+
+def report_clusters(df, stats, examples=5):
+    print(f"\nClusters: {stats['clusters']} for {len(df)} rows")
+    print(f"Clusters with near-duplicates: {stats['duplicate_clusters']} "
+          f"({stats['rows_in_duplicate_clusters']} rows, largest: {stats['largest_cluster']})")
+    print(f"Signature comparisons: {stats['comparisons']}")
+
+    sizes = df['cluster_id'].value_counts()
+    for cluster_id in sizes[sizes > 1].index[:examples]:
+        print(f"\nCluster {cluster_id}:")
+        for title, number in df.loc[df['cluster_id'] == cluster_id, ['title', 'number']].head(5).itertuples(index=False):
+            print(f"  {title} (number: {number})")
+
+
+def save_results(df, output_dir=OUTPUT_DIR, output_format='json'):
+    output_file = os.path.join(output_dir, os.path.basename(OUTPUT_FILE))
+    if output_format == 'parquet':
+        output_file = write_parquet(df, os.path.splitext(output_file)[0] + '.parquet')
+    elif output_format == 'ndjson':
+        output_file = write_ndjson(df, os.path.splitext(output_file)[0] + '.ndjson')
+    else:
+        with open(output_file, 'w', encoding='utf-8') as json_file:
+            json.dump(df.to_dict(orient='records'), json_file, ensure_ascii=False, indent=4)
+    print(f"\nClustered data saved to: {output_file}")
+    return output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cluster near-duplicate lectures of the stage 2 output")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="Minimum estimated similarity of two rows in a cluster (default: 0.7)")
+    args = parser.parse_args()
+
+    df = load_stage_input(INPUT_FILE)
+    print("Loaded DataFrame shape:", df.shape)
+
+    metrics = RunMetrics('stage 2b')
+    print("\nFinding near-duplicates...")
+    with metrics.stage('2b near-duplicates', len(df)) as counts:
+        df, stats = find_near_duplicates(df, args.threshold)
+        counts.update(stats)
+    report_clusters(df, stats)
+    save_results(df)
+    print(f"Metrics appended to: {metrics.save(OUTPUT_DIR)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,92 +1,88 @@
-import pandas as pd
 import json
+import os
+
+from columnar_io import load_stage_input
+from pipeline_metrics import RunMetrics
+from russian_dates import classify_date_formats, format_histogram
+
+INPUT_FILE = '../output/02_lectures_with_extracted_info.json'
+OUTPUT_DIR = '../output'
+
+FORMAT_NAMES = {'russian': 'Russian', 'dd_mm_yyyy': 'DD/MM/YYYY', 'other': 'Other'}
+EXAMPLES_PER_FORMAT = 3
+
+
+def analyze_date_format(df):
+    """Classify every date's format, returns the analysis dict or None if there is no date column"""
+    print("\nAnalyzing date formats...")
+
+    if 'date' not in df.columns:
+        print("No date column found!")
+        return None
+
+    # One pass over all rows instead of a sample, 3b routes each format group to its own parser
+    formats = classify_date_formats(df['date'])
+    format_counts = format_histogram(formats)
+    total_dates = int(df['date'].notna().sum())
 
-# Load the JSON file with extracted lecture information from script 2
-with open('../output/02_lectures_with_extracted_info.json', 'r', encoding='utf-8') as file:
-    data = json.load(file)
-
-# Convert JSON to DataFrame
-df = pd.DataFrame(data)
-
-# Display basic info about the loaded data
-print("Loaded DataFrame shape:", df.shape)
-print("\nColumns:", df.columns.tolist())
-print("\nFirst 5 rows:")
-print(df[['title', 'number', 'date']].head())
-
-# Russian month mapping for detection
-russian_months = {
-    'января': 'January', 'февраля': 'February', 'марта': 'March',
-    'апреля': 'April', 'мая': 'May', 'июня': 'June',
-    'июля': 'July', 'августа': 'August', 'сентября': 'September',
-    'октября': 'October', 'ноября': 'November', 'декабря': 'December'
-}
-
-# Analyze date format
-print("\nAnalyzing date formats...")
-
-if 'date' in df.columns:
-    # Get sample dates for analysis
-    sample_dates = df['date'].dropna().head(10) if not df['date'].dropna().empty else []
-    
-    # Count different format types
-    dd_mm_yyyy_count = 0
-    russian_format_count = 0
-    other_format_count = 0
-    
-    print(f"\nAnalyzing {len(sample_dates)} sample dates:")
-    for i, sample_date in enumerate(sample_dates):
-        date_str = str(sample_date)
-        print(f"  {i+1}. '{date_str}'", end=" - ")
-        
-        if '/' in date_str and len(date_str.split('/')) == 3:
-            dd_mm_yyyy_count += 1
-            print("DD/MM/YYYY format")
-        elif any(month in date_str for month in russian_months.keys()):
-            russian_format_count += 1
-            print("Russian format")
-        else:
-            other_format_count += 1
-            print("Other format")
-    
-    # Summary
-    total_dates = df['date'].notna().sum()
     print(f"\nFormat Analysis Summary:")
     print(f"Total dates found: {total_dates}")
-    print(f"Sample analysis (first 10):")
-    print(f"  - DD/MM/YYYY format: {dd_mm_yyyy_count}")
-    print(f"  - Russian format: {russian_format_count}")
-    print(f"  - Other formats: {other_format_count}")
-    
-    # Determine primary format
-    if dd_mm_yyyy_count > russian_format_count:
+    examples = {}
+    for date_format, count in format_counts.items():
+        examples[date_format] = [str(date_str) for date_str in
+                                 df['date'][formats == date_format].drop_duplicates().head(EXAMPLES_PER_FORMAT)]
+        shown = ', '.join(f"'{date_str}'" for date_str in examples[date_format])
+        print(f"  - {FORMAT_NAMES[date_format]} format: {count}" + (f" (e.g. {shown})" if shown else ""))
+
+    # Primary format, for the report; 3b converts every group regardless
+    if format_counts['dd_mm_yyyy'] > format_counts['russian']:
         detected_format = "DD/MM/YYYY"
-        needs_conversion = False
     else:
         detected_format = "Russian"
-        needs_conversion = True
-    
+    needs_conversion = format_counts['russian'] + format_counts['other'] > 0
+
     print(f"\nDetected primary format: {detected_format}")
     print(f"Conversion needed: {'Yes' if needs_conversion else 'No'}")
-    
-    # Save analysis results for next script
-    analysis_results = {
+
+    return {
         'detected_format': detected_format,
         'needs_conversion': needs_conversion,
-        'total_dates': int(total_dates),  # Convert to regular int
-        'sample_analysis': {
-            'dd_mm_yyyy_count': int(dd_mm_yyyy_count),  # Convert to regular int
-            'russian_format_count': int(russian_format_count),  # Convert to regular int
-            'other_format_count': int(other_format_count)  # Convert to regular int
-        }
+        'total_dates': total_dates,
+        'format_counts': format_counts,
+        'format_examples': examples,
     }
-    
-    with open('../output/03b_date_format_analysis.json', 'w', encoding='utf-8') as f:
+
+
+def save_results(analysis_results, output_dir=OUTPUT_DIR):
+    # Save analysis results for next script
+    output_file = os.path.join(output_dir, '03b_date_format_analysis.json')
+    with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(analysis_results, f, ensure_ascii=False, indent=2)
 
-    print(f"\nAnalysis results saved to: output/03b_date_format_analysis.json")
+    print(f"\nAnalysis results saved to: {output_file}")
+
+
+def main():
+    # Load the JSON (or Parquet) file with extracted lecture information from script 2
+    df = load_stage_input(INPUT_FILE)
+
+    # Display basic info about the loaded data
+    print("Loaded DataFrame shape:", df.shape)
+    print("\nColumns:", df.columns.tolist())
+    print("\nFirst 5 rows:")
+    print(df[['title', 'number', 'date']].head())
+
+    metrics = RunMetrics('stage 3a')
+    with metrics.stage('3a analyze', len(df)) as counts:
+        analysis_results = analyze_date_format(df)
+        if analysis_results is not None:
+            counts.update(analysis_results['format_counts'])
+    if analysis_results is not None:
+        save_results(analysis_results)
+    print(f"Metrics appended to: {metrics.save(OUTPUT_DIR)}")
+
+    print(f"\nNext step: Run 3b_convert_dates.py to perform date conversion")
 
-else:
-    print("No date column found!")
 
-print(f"\nNext step: Run 3b_convert_dates.py to perform date conversion")
+if __name__ == '__main__':
+    main()
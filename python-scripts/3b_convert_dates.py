@@ -1,101 +1,147 @@
-import pandas as pd
+import argparse
 import json
-from dateutil.parser import parse
-
-# Load the data and analysis results
-with open('../output/02_lectures_with_extracted_info.json', 'r', encoding='utf-8') as file:
-    data = json.load(file)
-
-with open('../output/03b_date_format_analysis.json', 'r', encoding='utf-8') as file:
-    analysis = json.load(file)
-
-df = pd.DataFrame(data)
-
-print("Loaded DataFrame shape:", df.shape)
-print(f"Analysis results: {analysis['detected_format']} format detected")
-print(f"Conversion needed: {analysis['needs_conversion']}")
-
-# Russian month mapping
-russian_months = {
-    'января': 'January', 'февраля': 'February', 'марта': 'March',
-    'апреля': 'April', 'мая': 'May', 'июня': 'June',
-    'июля': 'July', 'августа': 'August', 'сентября': 'September',
-    'октября': 'October', 'ноября': 'November', 'декабря': 'December'
-}
-
-print("\nPerforming date conversion...")
-
-if analysis['needs_conversion']:
-    # Convert from Russian format
-    print("Converting from Russian date format to DD/MM/YYYY...")
-    
-    def convert_russian_date_advanced(date_str):
-        """Convert Russian date to DD/MM/YYYY format"""
-        if pd.isna(date_str) or date_str is None:
-            return None, None
-        
-        try:
-            # Clean and prepare the date string
-            date_str = str(date_str).strip()
-            
-            # Replace Russian month names with English
-            english_date = date_str
-            for ru_month, en_month in russian_months.items():
-                english_date = english_date.replace(ru_month, en_month)
-            
-            # Parse the date
-            parsed_date = parse(english_date)
-            date_standard = parsed_date.strftime('%d/%m/%Y')
-            
-            return parsed_date, date_standard
-            
-        except Exception as e:
-            return None, None
-    
-    # Apply conversion
-    print("Processing all dates...")
-    conversion_results = df['date'].apply(convert_russian_date_advanced)
+import os
+
+from columnar_io import load_stage_input, newest_stage_input, write_parquet
+from ndjson_stream import write_ndjson
+from pipeline_metrics import RunMetrics, rate
+from russian_dates import (DateCache, classify_date_formats, convert_dates_by_format, format_histogram,
+                           new_conversion_stats, print_conversion_stats)
+
+INPUT_FILE = '../output/02_lectures_with_extracted_info.json'
+# Stage 2b's output with cluster ids, read instead when it is newer than INPUT_FILE
+CLUSTERED_INPUT_FILE = '../output/02b_lectures_with_clusters.json'
+ANALYSIS_FILE = '../output/03b_date_format_analysis.json'
+OUTPUT_DIR = '../output'
+# Parsed dates are kept here between runs (--date-cache), --no-date-cache caches in memory only
+DATE_CACHE_FILE = '../output/03b_date_cache.json'
+
+
+def convert_dates(df, analysis=None, stats=None, cache=None, workers=1):
+    """Add "date_datetime" and "date_standard" columns, whatever the mix of date formats.
+
+    Every row's format is classified and each group goes to its own parser
+    (see russian_dates.convert_dates_by_format). The per-format counts of the
+    3a analysis, if given, are checked against this classification.
+    Fast/slow path and cache hit counts are added to stats if given, parse
+    results are memoised in cache (a DateCache). With workers > 1 dates are
+    parsed in a process pool.
+    """
+    df = df.copy()
+
+    formats = classify_date_formats(df['date'])
+    format_counts = format_histogram(formats)
+    print("Converting dates by format: " + ', '.join(
+        f"{date_format} {count}" for date_format, count in format_counts.items()))
+    # 3a classifies the same rows, other counts mean its analysis is of an older stage 2 output
+    if analysis and analysis.get('format_counts', format_counts) != format_counts:
+        print(f"Warning: the date format analysis counted {analysis['format_counts']}, "
+              f"re-run 3a_analyze_date_format.py")
+
+    conversion_results = convert_dates_by_format(df['date'], stats, cache, workers, formats)
     df['date_datetime'] = [result[0] for result in conversion_results]
     df['date_standard'] = [result[1] for result in conversion_results]
-    
-else:
-    # Already in DD/MM/YYYY format
-    print("Dates already in DD/MM/YYYY format - validating...")
-    df['date_standard'] = df['date'].astype(str)
-    df['date_datetime'] = pd.to_datetime(df['date'], format='%d/%m/%Y', errors='coerce')
-
-# Report results
-successful_conversions = df['date_datetime'].notna().sum()
-total_dates = df['date'].notna().sum()
-
-print(f"\nConversion Results:")
-print(f"Total dates: {total_dates}")
-print(f"Successfully processed: {successful_conversions}")
-print(f"Failed conversions: {total_dates - successful_conversions}")
-print(f"Success rate: {(successful_conversions/total_dates*100):.1f}%" if total_dates > 0 else "N/A")
-
-# Show failed conversions
-failed_dates = df[df['date'].notna() & df['date_datetime'].isna()]
-if len(failed_dates) > 0:
-    print(f"\nFailed conversions ({len(failed_dates)}):")
-    for idx, row in failed_dates.head(5).iterrows():
-        print(f"  - '{row['date']}' in '{row['title']}'")
-    if len(failed_dates) > 5:
-        print(f"  ... and {len(failed_dates) - 5} more")
-
-# Clean up and save
-df_export = df.drop(columns=['date_datetime'], errors='ignore')
-
-output_file = '../output/03b_lectures_with_reformatted_dates.json'
-df_records = df_export.to_dict(orient='records')
-
-with open(output_file, 'w', encoding='utf-8') as json_file:
-    json.dump(df_records, json_file, ensure_ascii=False, indent=4)
-
-print(f"\nData saved to: {output_file}")
-
-# Also save CSV
-df_export.to_csv('../output/03b_lectures_with_reformatted_dates.csv', index=False, encoding='utf-8-sig', sep=';')
-print("Also saved as CSV: output/03b_lectures_with_reformatted_dates.csv")
-
-print(f"\nNext step: Run 4a_prepare_sorting.py to prepare for chronological ordering")
+
+    return df
+
+
+def conversion_metrics(df, stats=None):
+    """Counts for the metrics file: dates found, converted and the parser's fast/slow path and cache counts"""
+    total_dates = int(df['date'].notna().sum())
+    converted = int((df['date'].notna() & df['date_datetime'].notna()).sum())
+    return {
+        'dates': total_dates,
+        'converted': converted,
+        'failed': total_dates - converted,
+        'conversion_rate': rate(converted, total_dates),
+        **(stats or {}),
+    }
+
+
+def report_conversion(df, stats=None):
+    # Report results
+    successful_conversions = df['date_datetime'].notna().sum()
+    total_dates = df['date'].notna().sum()
+
+    print(f"\nConversion Results:")
+    print(f"Total dates: {total_dates}")
+    print(f"Successfully processed: {successful_conversions}")
+    print(f"Failed conversions: {total_dates - successful_conversions}")
+    print(f"Success rate: {(successful_conversions/total_dates*100):.1f}%" if total_dates > 0 else "N/A")
+    if stats is not None:
+        print_conversion_stats(stats)
+
+    # Show failed conversions
+    failed_dates = df[df['date'].notna() & df['date_datetime'].isna()]
+    if len(failed_dates) > 0:
+        print(f"\nFailed conversions ({len(failed_dates)}):")
+        for idx, row in failed_dates.head(5).iterrows():
+            print(f"  - '{row['date']}' in '{row['title']}'")
+        if len(failed_dates) > 5:
+            print(f"  ... and {len(failed_dates) - 5} more")
+
+
+def save_results(df, output_dir=OUTPUT_DIR, output_format='json'):
+    # Clean up and save
+    df_export = df.drop(columns=['date_datetime'], errors='ignore')
+
+    if output_format == 'parquet':
+        output_file = write_parquet(df_export, os.path.join(output_dir, '03b_lectures_with_reformatted_dates.parquet'))
+        print(f"\nData saved to: {output_file}")
+        return
+    if output_format == 'ndjson':
+        output_file = write_ndjson(df_export, os.path.join(output_dir, '03b_lectures_with_reformatted_dates.ndjson'))
+        print(f"\nData saved to: {output_file}")
+        return
+
+    output_file = os.path.join(output_dir, '03b_lectures_with_reformatted_dates.json')
+    df_records = df_export.to_dict(orient='records')
+
+    with open(output_file, 'w', encoding='utf-8') as json_file:
+        json.dump(df_records, json_file, ensure_ascii=False, indent=4)
+
+    print(f"\nData saved to: {output_file}")
+
+    # Also save CSV
+    output_csv = os.path.join(output_dir, '03b_lectures_with_reformatted_dates.csv')
+    df_export.to_csv(output_csv, index=False, encoding='utf-8-sig', sep=';')
+    print(f"Also saved as CSV: {output_csv}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the extracted dates to DD/MM/YYYY")
+    parser.add_argument('--date-cache', metavar='FILE', default=DATE_CACHE_FILE,
+                        help=f"Keep parsed dates in this JSON file between runs (default: {DATE_CACHE_FILE})")
+    parser.add_argument('--no-date-cache', action='store_true',
+                        help="Only cache parsed dates in memory, don't read or write a cache file")
+    args = parser.parse_args()
+
+    # Load the data and analysis results
+    input_file = newest_stage_input([CLUSTERED_INPUT_FILE, INPUT_FILE])
+    df = load_stage_input(input_file)
+
+    with open(ANALYSIS_FILE, 'r', encoding='utf-8') as file:
+        analysis = json.load(file)
+
+    print(f"Loaded DataFrame shape from {input_file}:", df.shape)
+    print(f"Analysis results: {analysis['detected_format']} format detected")
+    if 'format_counts' in analysis:
+        print(f"Dates per format: {analysis['format_counts']}")
+
+    print("\nPerforming date conversion...")
+    metrics = RunMetrics('stage 3b')
+    stats = new_conversion_stats()
+    cache = DateCache(path=None if args.no_date_cache else args.date_cache)
+    with metrics.stage('3b convert', len(df)) as counts:
+        df = convert_dates(df, analysis, stats, cache)
+        counts.update(conversion_metrics(df, stats))
+    cache.save()
+    report_conversion(df, stats)
+    save_results(df)
+    print(f"Metrics appended to: {metrics.save(OUTPUT_DIR)}")
+
+    print(f"\nNext step: Run 4a_prepare_sorting.py to prepare for chronological ordering")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,194 @@
-# so far just to convert .xlsx to .json 
+"""Merge the experimental order sheet onto the 3b output.
+
+input/lectures_experimental_order is an Excel sheet that rarely changes, so
+its openpyxl parse is cached in output/ as a pickled DataFrame together with
+the sheet's size, mtime and content hash. A run with an unchanged sheet
+loads the pickle instead of parsing the workbook; a touched but identical
+sheet is recognised by its hash. The cache records its own format version
+and the pandas version that pickled it, a cache of another version is
+parsed again.
+
+The sheet's rows are joined onto the 3b lectures by a key column (the
+title by default, compared without surrounding whitespace and case), not
+by row position, so both files can be in any order.
+
+Nothing downstream reads 03c_lectures_with_experimental_order.json yet, and
+the sheet isn't in the repository; tests/test_experimental_order.py runs the
+cache and the join on a small generated sheet instead.
+
+Usage:
+    python 3c_merge_3b_output_and_pub_date.py [--key COLUMN] [--refresh]
+"""
+import argparse
+import hashlib
 import json
+import os
+import pickle
+import time
+
 import pandas as pd
 
-# load the data
+from columnar_io import load_stage_input
+from pipeline_metrics import RunMetrics, rate
+
+INPUT_FILE = '../output/03b_lectures_with_reformatted_dates.json'
+EXPERIMENTAL_ORDER_FILE = '../input/lectures_experimental_order'
+EXPERIMENTAL_ORDER_JSON = '../output/lectures_experimental_order.json'
+CACHE_FILE = '../output/3c_experimental_order_cache.pkl'
+OUTPUT_DIR = '../output'
+
+# Bump when the cached dict changes
+CACHE_VERSION = 1
+
+DEFAULT_KEY = 'title'
+# Added to sheet columns that the 3b output already has
+COLUMN_SUFFIX = '_experimental'
+
+
+def file_fingerprint(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_experimental_order(path=EXPERIMENTAL_ORDER_FILE, cache_file=CACHE_FILE, refresh=False):
+    """The sheet as a DataFrame, from the cache when the file hasn't changed.
+
+    Returns (df, from_cache).
+    """
+    fingerprint = file_fingerprint(path)
+    cached = None
+    if not refresh and os.path.exists(cache_file):
+        cached = _load_cache(cache_file)
+
+    content_hash = None
+    if cached is not None:
+        if cached['fingerprint'] == fingerprint:
+            return cached['df'], True
+        # Touched or copied: only re-parse if the content differs
+        content_hash = file_hash(path)
+        if cached['hash'] == content_hash:
+            cached['fingerprint'] = fingerprint
+            _save_cache(cached, cache_file)
+            return cached['df'], True
+
+    print(f"Parsing {path} with openpyxl...")
+    df = pd.read_excel(path, engine='openpyxl')
+    _save_cache({'version': CACHE_VERSION, 'pandas': pd.__version__,
+                 'fingerprint': fingerprint, 'hash': content_hash or file_hash(path), 'df': df}, cache_file)
+    return df, False
+
+
+def _load_cache(cache_file):
+    """The cached dict, None if it was written by another cache format or pandas version"""
+    try:
+        with open(cache_file, 'rb') as file:
+            cached = pickle.load(file)
+    except (pickle.UnpicklingError, AttributeError, ImportError, EOFError, TypeError):
+        # A DataFrame pickled by another pandas version may not load at all
+        return None
+    if not isinstance(cached, dict) or cached.get('version') != CACHE_VERSION \
+            or cached.get('pandas') != pd.__version__:
+        return None
+    return cached
+
+
+def _save_cache(cached, cache_file):
+    temp_file = cache_file + '.tmp'
+    with open(temp_file, 'wb') as file:
+        pickle.dump(cached, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_file, cache_file)
+
+
+def _join_key(values):
+    return pd.Series(values, dtype=object).map(lambda value: value.strip().casefold()
+                                               if isinstance(value, str) else value)
+
+
+def merge_experimental_order(df, experimental, key=DEFAULT_KEY):
+    """Left-join the sheet's columns onto df by key, returns (merged df, stats)"""
+    if key not in df.columns or key not in experimental.columns:
+        raise KeyError(f"Join column '{key}' must be in both the 3b output and the experimental order sheet")
+
+    experimental = experimental.copy()
+    experimental['_join_key'] = _join_key(experimental[key]).to_numpy()
+    duplicated = experimental['_join_key'].duplicated(keep='first') & experimental['_join_key'].notna()
+    # One sheet row per key, so the join can't multiply lectures
+    experimental = experimental[~duplicated & experimental['_join_key'].notna()].drop(columns=[key])
+    experimental = experimental.rename(columns={
+        column: column + COLUMN_SUFFIX for column in experimental.columns if column in df.columns})
+
+    keys = _join_key(df[key]).to_numpy()
+    merged = (df.assign(_join_key=keys)
+              .merge(experimental, how='left', on='_join_key', validate='many_to_one')
+              .drop(columns=['_join_key']))
+    matched = int(pd.Series(keys).isin(experimental['_join_key']).sum())
+    stats = {
+        'lectures': len(df),
+        'sheet_rows': int(len(experimental) + duplicated.sum()),
+        'matched': matched,
+        'match_rate': rate(matched, len(df)),
+        'duplicate_sheet_keys': int(duplicated.sum()),
+    }
+    return merged, stats
+
+
+def report_merge(stats, key):
+    print(f"\nMerge Results (key: {key}):")
+    print(f"Lectures: {stats['lectures']}")
+    print(f"Experimental order rows: {stats['sheet_rows']}")
+    print(f"Matched lectures: {stats['matched']}")
+    print(f"Unmatched lectures: {stats['lectures'] - stats['matched']}")
+    if stats['duplicate_sheet_keys']:
+        print(f"Duplicate keys in the sheet (first row kept): {stats['duplicate_sheet_keys']}")
+
+
+def save_results(df, output_dir=OUTPUT_DIR):
+    output_file = os.path.join(output_dir, '03c_lectures_with_experimental_order.json')
+    df_records = df.to_dict(orient='records')
+    with open(output_file, 'w', encoding='utf-8') as json_file:
+        json.dump(df_records, json_file, ensure_ascii=False, indent=4, default=str)
+    print(f"\nMerged data saved to: {output_file}")
+    return output_file
+
+
+def save_experimental_order_json(experimental, output_file=EXPERIMENTAL_ORDER_JSON):
+    # The plain JSON conversion of the sheet, as this script wrote before the merge existed
+    with open(output_file, 'w', encoding='utf-8') as json_file:
+        json.dump(experimental.to_dict(orient='records'), json_file, ensure_ascii=False, indent=4, default=str)
+    print(f"Experimental order saved to: {output_file}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the experimental order sheet onto the 3b output")
+    parser.add_argument('--key', default=DEFAULT_KEY, help="Column to join on (default: title)")
+    parser.add_argument('--refresh', action='store_true', help="Ignore the cached sheet and parse it again")
+    args = parser.parse_args()
 
-df = pd.read_excel('../input/lectures_experimental_order', engine='openpyxl')
+    metrics = RunMetrics('stage 3c')
+    start = time.perf_counter()
+    experimental, from_cache = load_experimental_order(refresh=args.refresh)
+    metrics.add_stage('3c load sheet', len(experimental), time.perf_counter() - start, from_cache=from_cache)
+    print(f"Experimental order: {experimental.shape} ({'cached' if from_cache else 'parsed'})")
+    if not from_cache or not os.path.exists(EXPERIMENTAL_ORDER_JSON):
+        save_experimental_order_json(experimental)
 
-# Convert DataFrame to JSON format
+    df = load_stage_input(INPUT_FILE)
+    print("Loaded DataFrame shape:", df.shape)
+    with metrics.stage('3c merge', len(df)) as counts:
+        merged, stats = merge_experimental_order(df, experimental, args.key)
+        counts.update(stats)
+    report_merge(stats, args.key)
+    save_results(merged)
+    print(f"Metrics appended to: {metrics.save(OUTPUT_DIR)}")
 
-df_records = df.to_dict(orient='records')
 
-# Save the DataFrame to a JSON file
-output_file = '../output/lectures_experimental_order.json'
-with open(output_file, 'w') as f:
-    json.dump(df_records, f, indent=4)
+if __name__ == '__main__':
+    main()
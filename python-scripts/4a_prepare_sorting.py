@@ -1,90 +1,214 @@
-import pandas as pd
 import json
+import math
+import os
 
-# Load the processed data from script 3
-with open('../output/03b_lectures_with_reformatted_dates.json', 'r', encoding='utf-8') as file:
-    data = json.load(file)
+from columnar_io import load_stage_input, write_parquet
+from lazy_import import lazy_module
+from ndjson_stream import write_ndjson
+from parallel import map_chunks
+from pipeline_metrics import RunMetrics
 
-df = pd.DataFrame(data)
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+INPUT_FILE = '../output/03b_lectures_with_reformatted_dates.json'
+OUTPUT_DIR = '../output'
+
+# "126" or "126-2" with at most 18 digits per number, so both always fit an int64.
+# Numbers in this form are parsed column-wise, the others row by row with extract_lecture_part
+NUMBER_PATTERN = r'^\s*(?P<lecture>[0-9]{1,18})\s*(?:-\s*(?P<part>[0-9]{1,18})\s*)?$'
+# Largest lecture or part number kept, lecture_num and part_num are read back as int64
+MAX_NUMBER = 2 ** 63 - 1
+
+
+def compact_uint(values):
+    """Non-negative integers as the smallest unsigned numpy dtype that holds them.
+
+    Not a nullable dtype: a missing number is 0, as it always was in the
+    output, and it sorts before the numbered lectures of the same day.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    return values.astype(np.min_scalar_type(int(values.max())) if len(values) else np.uint8)
+
+
+def parse_lecture_part(number_str):
+    """(lecture, part) of a number like '126-2' or '126', None if it doesn't parse.
+
+    Each piece is read with int(), so whitespace, a '+', '_' separators and
+    non-ASCII digits are accepted, and pieces after the second are ignored
+    ('126-2-3' is lecture 126, part 2).
+    """
+    parts = str(number_str).split('-')
+    try:
+        lecture_num = int(parts[0])
+        part_num = int(parts[1]) if len(parts) > 1 else 0
+    except ValueError:
+        return None
+    if lecture_num > MAX_NUMBER or part_num > MAX_NUMBER:
+        return None
+    return lecture_num, part_num
 
-print("Loaded DataFrame shape:", df.shape)
-print("\nColumns:", df.columns.tolist())
-print("\nSample data:")
-print(df[['title', 'number', 'date', 'date_standard']].head())
 
 def extract_lecture_part(number_str):
-    """Extract lecture number and part from format like '126-2' or plain number"""
-    if pd.isna(number_str) or number_str is None:
+    """Extract lecture number and part from format like '126-2' or plain number, (0, 0) if there is none"""
+    # Checked without pandas, which the lite pipeline never imports; pd.NA and NaT don't parse either
+    if number_str is None or isinstance(number_str, float) and math.isnan(number_str):
         return 0, 0  # For lectures without numbers
-    
-    number_str = str(number_str)
-    if '-' in number_str:
-        # Format like '126-2'
-        parts = number_str.split('-')
-        try:
-            lecture_num = int(parts[0])
-            part_num = int(parts[1])
-            return lecture_num, part_num
-        except (ValueError, IndexError):
-            return 0, 0
+    return parse_lecture_part(number_str) or (0, 0)
+
+
+def _number_strings(numbers):
+    # A string dtype so the matching below runs in pandas' vectorized string kernels
+    return pd.Series(numbers, dtype=object).astype('string')
+
+
+def _irregular(numbers):
+    """Positions of the numbers that aren't plain "X" or "X-Y", these are parsed row by row"""
+    simple = numbers.str.fullmatch(NUMBER_PATTERN).fillna(False).to_numpy(bool)
+    return np.flatnonzero(numbers.notna().to_numpy(bool) & ~simple), simple
+
+
+def unparsed_number_mask(numbers):
+    """True where a number was extracted but doesn't parse (e.g. "126а" or "126 (часть 2)")"""
+    numbers = _number_strings(numbers)
+    mask = np.zeros(len(numbers), dtype=bool)
+    irregular, _ = _irregular(numbers)
+    mask[irregular] = [parse_lecture_part(numbers.iloc[position]) is None for position in irregular]
+    return mask
+
+
+def parse_lecture_numbers(numbers):
+    """Column-wise extract_lecture_part, returns int64 (lecture, part) arrays.
+
+    Rows without a number and rows that don't parse get (0, 0), so they sort
+    before the numbered lectures of the same day.
+    """
+    numbers = _number_strings(numbers)
+    irregular, simple = _irregular(numbers)
+    plain = numbers.where(simple)
+    # Numbered backreferences, named ones aren't supported by the pyarrow-backed kernels.
+    # Integer parsing: at most 18 digits can't overflow, a float would lose precision
+    lecture = plain.str.replace(NUMBER_PATTERN, r'\1', regex=True)
+    part = plain.str.replace(NUMBER_PATTERN, r'\2', regex=True).replace('', '0')
+    lecture = lecture.astype('Int64').fillna(0).to_numpy(np.int64)
+    part = part.astype('Int64').fillna(0).to_numpy(np.int64)
+
+    # The rare other forms ('+5', '126-2-3', '1_000', ...) keep the per-row parsing
+    for position in irregular:
+        lecture[position], part[position] = extract_lecture_part(numbers.iloc[position])
+    return lecture, part
+
+
+def prepare_sorting(df, workers=1):
+    """Add the "date_datetime", "lecture_num" and "part_num" sort keys, in a process pool if workers > 1"""
+    df = df.copy()
+
+    # Process dates for sorting
+    if 'date_standard' in df.columns:
+        print("Using standardized dates from script 3")
+        df['date_datetime'] = pd.to_datetime(df['date_standard'], format='%d/%m/%Y', errors='coerce')
+    elif 'date' in df.columns:
+        print("Using original date column")
+        df['date_datetime'] = pd.to_datetime(df['date'], errors='coerce')
+        df['date_standard'] = df['date_datetime'].dt.strftime('%d/%m/%Y')
     else:
-        # Plain number like '126'
-        try:
-            lecture_num = int(number_str)
-            return lecture_num, 0  # No part number
-        except ValueError:
-            return 0, 0
-
-print("\nPreparing data for sorting...")
-
-# Process dates for sorting
-if 'date_standard' in df.columns:
-    print("Using standardized dates from script 3")
-    df['date_datetime'] = pd.to_datetime(df['date_standard'], format='%d/%m/%Y', errors='coerce')
-elif 'date' in df.columns:
-    print("Using original date column")
-    df['date_datetime'] = pd.to_datetime(df['date'], errors='coerce')
-    df['date_standard'] = df['date_datetime'].dt.strftime('%d/%m/%Y')
-else:
-    print("No date columns found!")
-    df['date_datetime'] = pd.NaT
-    df['date_standard'] = None
-
-# Extract lecture and part numbers
-print("Extracting lecture numbers and parts...")
-df['lecture_num'], df['part_num'] = zip(*df['number'].apply(extract_lecture_part))
-
-# Report preparation results
-valid_dates = df['date_datetime'].notna().sum()
-total_rows = len(df)
-lectures_with_numbers = df['number'].notna().sum()
-
-print(f"\nPreparation Results:")
-print(f"Total lectures: {total_rows}")
-print(f"Valid dates: {valid_dates}")
-print(f"Lectures with numbers: {lectures_with_numbers}")
-print(f"Lectures without numbers: {total_rows - lectures_with_numbers}")
-
-# Show examples of extracted numbers
-print(f"\nSample number extractions:")
-sample_df = df[['title', 'number', 'lecture_num', 'part_num']].head(10)
-for _, row in sample_df.iterrows():
-    if pd.notna(row['number']):
-        print(f"  '{row['number']}' → Lecture: {row['lecture_num']}, Part: {row['part_num']}")
-
-# Save prepared data
-output_file = '../output/4a_lectures_prepared_for_sorting.json'
-
-# Convert DataFrame to records, handling datetime objects
-df_for_json = df.copy()
-# Convert datetime objects to strings for JSON serialization
-df_for_json['date_datetime'] = df_for_json['date_datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
-
-df_records = df_for_json.to_dict(orient='records')
-
-with open(output_file, 'w', encoding='utf-8') as json_file:
-    json.dump(df_records, json_file, ensure_ascii=False, indent=4)
-
-
-print(f"\nPrepared data saved to: {output_file}")
-print(f"Next step: Run 4b_create_chronological_order.py to create final ordering")
+        print("No date columns found!")
+        df['date_datetime'] = pd.NaT
+        df['date_standard'] = None
+
+    # Extract lecture and part numbers
+    print("Extracting lecture numbers and parts...")
+    lecture_parts = map_chunks(parse_lecture_numbers, df['number'], workers)
+    df['lecture_num'] = compact_uint(np.concatenate([lecture for lecture, _ in lecture_parts]))
+    df['part_num'] = compact_uint(np.concatenate([part for _, part in lecture_parts]))
+    return df
+
+
+def preparation_metrics(df):
+    """Counts for the metrics file: rows with a valid date and with a lecture number"""
+    return {
+        'valid_dates': int(df['date_datetime'].notna().sum()),
+        'with_number': int(df['number'].notna().sum()),
+        'unparsed_numbers': int(unparsed_number_mask(df['number']).sum()),
+    }
+
+
+def report_preparation(df):
+    # Report preparation results
+    valid_dates = df['date_datetime'].notna().sum()
+    total_rows = len(df)
+    lectures_with_numbers = df['number'].notna().sum()
+
+    print(f"\nPreparation Results:")
+    print(f"Total lectures: {total_rows}")
+    print(f"Valid dates: {valid_dates}")
+    print(f"Lectures with numbers: {lectures_with_numbers}")
+    print(f"Lectures without numbers: {total_rows - lectures_with_numbers}")
+
+    # Numbers that were extracted but couldn't be parsed sort like lectures without a number
+    unparsed = df.loc[unparsed_number_mask(df['number']), 'number']
+    print(f"Unparsable numbers (sorted as lecture 0): {len(unparsed)}")
+    for number in unparsed.head(5):
+        print(f"  - '{number}'")
+    if len(unparsed) > 5:
+        print(f"  ... and {len(unparsed) - 5} more")
+
+    # Show examples of extracted numbers
+    print(f"\nSample number extractions:")
+    sample_df = df[['title', 'number', 'lecture_num', 'part_num']].head(10)
+    for _, row in sample_df.iterrows():
+        if pd.notna(row['number']):
+            print(f"  '{row['number']}' → Lecture: {row['lecture_num']}, Part: {row['part_num']}")
+
+
+def save_results(df, output_dir=OUTPUT_DIR, output_format='json'):
+    if output_format == 'parquet':
+        # date_datetime stays a real timestamp here
+        output_file = write_parquet(df, os.path.join(output_dir, '4a_lectures_prepared_for_sorting.parquet'))
+        print(f"\nPrepared data saved to: {output_file}")
+        return
+    if output_format == 'ndjson':
+        # write_ndjson formats date_datetime like the JSON file below
+        output_file = write_ndjson(df, os.path.join(output_dir, '4a_lectures_prepared_for_sorting.ndjson'))
+        print(f"\nPrepared data saved to: {output_file}")
+        return
+
+    # Save prepared data
+    output_file = os.path.join(output_dir, '4a_lectures_prepared_for_sorting.json')
+
+    # Convert DataFrame to records, handling datetime objects
+    df_for_json = df.copy()
+    # Convert datetime objects to strings for JSON serialization
+    df_for_json['date_datetime'] = df_for_json['date_datetime'].dt.strftime('%Y-%m-%d %H:%M:%S')
+
+    df_records = df_for_json.to_dict(orient='records')
+
+    with open(output_file, 'w', encoding='utf-8') as json_file:
+        json.dump(df_records, json_file, ensure_ascii=False, indent=4)
+
+    print(f"\nPrepared data saved to: {output_file}")
+
+
+def main():
+    # Load the processed data from script 3
+    df = load_stage_input(INPUT_FILE)
+
+    print("Loaded DataFrame shape:", df.shape)
+    print("\nColumns:", df.columns.tolist())
+    print("\nSample data:")
+    print(df[['title', 'number', 'date', 'date_standard']].head())
+
+    metrics = RunMetrics('stage 4a')
+    print("\nPreparing data for sorting...")
+    with metrics.stage('4a prepare', len(df)) as counts:
+        df = prepare_sorting(df)
+        counts.update(preparation_metrics(df))
+    report_preparation(df)
+    save_results(df)
+    print(f"Metrics appended to: {metrics.save(OUTPUT_DIR)}")
+
+    print(f"Next step: Run 4b_create_chronological_order.py to create final ordering")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,93 +1,457 @@
-import pandas as pd
+import argparse
 import json
+import math
+import os
+import time
+from bisect import bisect_right
 
-# Load the prepared data
-with open('../output/4a_lectures_prepared_for_sorting.json', 'r', encoding='utf-8') as file:
-    data = json.load(file)
+from catalogue_facets import FACETS_FILE_NAME, FacetCounts
+from columnar_io import load_stage_input, read_parquet, stage_input_path, write_parquet
+from excel_stream import DEFAULT_SHEET_NAME, add_sheet, append_row, new_workbook, write_frame_excel
+from external_sort import external_sort
+from json_stream import DEFAULT_CHUNK_SIZE, iter_record_chunks
+from lazy_import import lazy_module
+from ndjson_stream import write_ndjson
+from pipeline_metrics import RunMetrics
 
-df = pd.DataFrame(data)
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
 
-print("Loaded DataFrame shape:", df.shape)
-print("Columns:", df.columns.tolist())
+INPUT_FILE = '../output/4a_lectures_prepared_for_sorting.json'
+OUTPUT_DIR = '../output'
 
-# Perform multi-level sorting
-print("\nSorting lectures chronologically...")
-print("Sort order: 1) Date (earliest first), 2) Lecture number, 3) Part number")
+SORT_COLUMNS = ['date_datetime', 'lecture_num', 'part_num']
+# Rows with the same values are one lecture uploaded several times (stage 2b)
+DUPLICATE_COLUMNS = ['cluster_id', 'number']
+# Columns of the final export, in this order, followed by any others
+PREFERRED_COLUMN_ORDER = ['order', 'title', 'number', 'date', 'date_standard', 'description']
 
-df_sorted = df.sort_values(['date_datetime', 'lecture_num', 'part_num'], 
-                          ascending=[True, True, True]).reset_index(drop=True)
+# Packed keys must stay below the int64 sign bit
+PACKED_KEY_BITS = 63
+# Datetime units from the coarsest to the finest; a coarser unit reaches further years
+DATETIME_UNITS = ['s', 'ms', 'us', 'ns']
 
-# Create order column
-df_sorted['order'] = range(1, len(df_sorted) + 1)
+# A frame takes several times the size of its JSON file in memory, bigger inputs use the external sort
+IN_MEMORY_EXPANSION = 5
 
-print(f"\nSorting complete! Created order from 1 to {len(df_sorted)}")
 
-# Show first 10 ordered results
-print(f"\nFirst 10 lectures in chronological order:")
-print("="*70)
-for idx, row in df_sorted.head(10).iterrows():
-    date_display = row.get('date_standard', row.get('date', 'N/A'))
-    print(f"Order: {row['order']}")
-    print(f"Title: {row['title']}")
-    print(f"Number: {row['number']} (Lecture: {row['lecture_num']}, Part: {row['part_num']})")
-    print(f"Date: {date_display}")
-    print("-" * 50)
+def _dates(df):
+    # Datetimes or the JSON strings, at pandas' own resolution: a nanosecond one ends in 2262
+    return pd.to_datetime(df['date_datetime'])
 
-# Clean up temporary columns for final export
-print(f"\nPreparing final export...")
-columns_to_drop = ['date_datetime', 'lecture_num', 'part_num']
 
-# Handle missing values
-if 'date_standard' in df_sorted.columns:
-    df_sorted['date_standard'] = df_sorted['date_standard'].fillna('')
+def _ticks_per_day(unit):
+    return int(np.timedelta64(1, 'D') // np.timedelta64(1, unit))
 
-if 'date' in df_sorted.columns:
-    df_sorted['date'] = df_sorted['date'].fillna('').astype(str)
 
-# Create final DataFrame
-df_final = df_sorted.drop(columns=[col for col in columns_to_drop if col in df_sorted.columns], errors='ignore')
+def _date_ticks(df):
+    """date_datetime as int64 ticks of its unit (NaT stays NaT in the mask), and the ticks per day"""
+    dates = _dates(df)
+    return dates.to_numpy().view('int64'), dates.isna().to_numpy(), _ticks_per_day(dates.dt.unit)
 
-# Reorder columns for better readability
-available_columns = df_final.columns.tolist()
-preferred_order = ['order', 'title', 'number', 'date', 'date_standard', 'description']
-remaining_columns = [col for col in available_columns if col not in preferred_order]
-column_order = [col for col in preferred_order if col in available_columns] + remaining_columns
-df_final = df_final[column_order]
 
-print(f"Final columns: {df_final.columns.tolist()}")
+def _as_unit(df, unit):
+    """df with its date_datetime column in unit if it holds datetimes (JSON strings are left alone)"""
+    if pd.api.types.is_datetime64_dtype(df['date_datetime']):
+        return df.assign(date_datetime=df['date_datetime'].dt.as_unit(unit))
+    return df
 
-# Save final results
-output_json = '../output/4b_lectures_with_order.json'
-df_records = df_final.to_dict(orient='records')
 
-with open(output_json, 'w', encoding='utf-8') as json_file:
-    json.dump(df_records, json_file, ensure_ascii=False, indent=4)
+def packed_sort_keys(df):
+    """One int64 per row that orders like sort_values(SORT_COLUMNS), missing dates last.
 
-print(f"\nFinal data saved to: {output_json}")
+    The date (in days when every date is midnight), lecture number and part
+    number are each offset by their minimum and packed into consecutive bit
+    fields. Returns None if the fields need more than 63 bits together.
+    """
+    ticks, no_date, ticks_per_day = _date_ticks(df)
+    dated = ticks[~no_date]
+    if len(dated) and not (dated % ticks_per_day).any():
+        dated = dated // ticks_per_day
 
-# Save Excel format
-output_excel = '../output/4b_lectures_with_order.xlsx'
-df_final.to_excel(output_excel, index=False, engine='openpyxl')
-print(f"Also saved to Excel: {output_excel}")
+    date_codes = np.zeros(len(df), dtype=np.int64)
+    if len(dated):
+        date_codes[~no_date] = dated - dated.min()
+    # Missing dates sort after every real date
+    date_codes[no_date] = date_codes.max() + 1 if len(dated) else 0
 
-# Display summary statistics
-print(f"\nFinal Summary:")
-print(f"Total lectures: {len(df_final)}")
-print(f"Lectures with numbers: {df_final['number'].notna().sum()}")
-print(f"Lectures without numbers: {df_final['number'].isna().sum()}")
+    keys = np.zeros(len(df), dtype=np.int64)
+    used_bits = 0
+    for codes in (date_codes, df['lecture_num'].to_numpy(np.int64), df['part_num'].to_numpy(np.int64)):
+        if len(codes):
+            codes = codes - codes.min()
+        width = int(codes.max()).bit_length() if len(codes) else 0
+        used_bits += width
+        if used_bits > PACKED_KEY_BITS:
+            return None
+        keys = (keys << width) | codes
+    return keys
 
-# Date range
-try:
-    valid_dates = df_final['date'].dropna()
-    if len(valid_dates) > 0:
-        valid_dates = valid_dates.astype(str)
-        print(f"Date range: {valid_dates.min()} to {valid_dates.max()}")
+
+def _sort_keys(df):
+    """Comparable (no date, date, lecture, part) tuples matching the sort_values order, missing dates last.
+
+    The date is in nanoseconds whatever the frame's unit, so keys of different
+    chunks compare; Python ints don't overflow past 2262.
+    """
+    ticks, no_date, ticks_per_day = _date_ticks(df)
+    scale = _ticks_per_day('ns') // ticks_per_day
+    date_values = [tick * scale for tick in np.where(no_date, 0, ticks).tolist()]
+    return list(zip(no_date.tolist(), date_values,
+                    df['lecture_num'].astype('int64').tolist(), df['part_num'].astype('int64').tolist()))
+
+
+def chronological_order(df):
+    """Positions of df's rows in chronological order, ties kept in input order"""
+    keys = packed_sort_keys(df)
+    if keys is not None:
+        return np.argsort(keys, kind='stable')
+    # Numbers too large to pack, compare key tuples instead
+    tuple_keys = _sort_keys(df)
+    return np.array(sorted(range(len(df)), key=tuple_keys.__getitem__), dtype=np.int64)
+
+
+def sort_chronologically(df):
+    # Perform multi-level sorting
+    print("\nSorting lectures chronologically...")
+    print("Sort order: 1) Date (earliest first), 2) Lecture number, 3) Part number")
+
+    return df.iloc[chronological_order(df)].reset_index(drop=True)
+
+
+def merge_into_sorted(df_sorted, df_new):
+    """Merge new rows into an already sorted frame without re-sorting it.
+
+    df_new is sorted on its own, then every new row is placed with a binary
+    search over the existing keys. On equal keys existing rows come first.
+    """
+    df_new = df_new.iloc[chronological_order(df_new)].reset_index(drop=True)
+    # Dates in the coarser unit of the two frames: concat casts to the finer one, which may not hold them all
+    unit = min((_dates(df).dt.unit for df in (df_sorted, df_new)), key=DATETIME_UNITS.index)
+    df_sorted, df_new = _as_unit(df_sorted, unit), _as_unit(df_new, unit)
+    # Packed over both frames at once so the keys are comparable
+    keys = packed_sort_keys(pd.concat([df_sorted[SORT_COLUMNS], df_new[SORT_COLUMNS]], ignore_index=True))
+    if keys is not None:
+        positions = np.searchsorted(keys[:len(df_sorted)], keys[len(df_sorted):], side='right')
     else:
-        print("Date range: No valid dates found")
-except Exception as e:
-    print(f"Date range: Error calculating - {e}")
-
-print(f"\nChronological ordering complete!")
-print(f"Files created:")
-print(f"- {output_json}")
-print(f"- {output_excel}")
+        existing_keys = _sort_keys(df_sorted)
+        positions = [bisect_right(existing_keys, key) for key in _sort_keys(df_new)]
+
+    merged_order = np.insert(np.arange(len(df_sorted)), positions, np.arange(len(df_new)) + len(df_sorted))
+    merged = pd.concat([df_sorted, df_new], ignore_index=True)
+    return merged.iloc[merged_order].reset_index(drop=True)
+
+
+def _sort_records(records):
+    """Sort one chunk of 4a records for the external sort, returns (key, record) pairs"""
+    df = pd.DataFrame(records, columns=SORT_COLUMNS)
+    # The packed keys are only comparable within the chunk, the runs are merged on the key tuples
+    tuple_keys = _sort_keys(df)
+    return [(tuple_keys[i], records[i]) for i in chronological_order(df)]
+
+
+def iter_sorted_records(input_file, chunk_size=DEFAULT_CHUNK_SIZE, work_dir=None):
+    """Stream a 4a JSON file in chunks and yield its records in chronological order, memory-bounded"""
+    return external_sort(iter_record_chunks(input_file, chunk_size), _sort_records, work_dir)
+
+
+def collapse_duplicates(df_sorted):
+    """Keep the earliest row of each near-duplicate cluster and lecture number, see 2b_find_near_duplicates.py"""
+    if 'cluster_id' not in df_sorted.columns:
+        print("No cluster_id column (run 2b_find_near_duplicates.py first), nothing to collapse")
+        return df_sorted
+    # Parts of a multi-part lecture share a cluster but have different numbers, they are all kept
+    duplicated = df_sorted.duplicated(subset=DUPLICATE_COLUMNS, keep='first')
+    print(f"\nCollapsed {int(duplicated.sum())} re-uploads of {int((~duplicated).sum())} lectures")
+    return df_sorted[~duplicated].reset_index(drop=True)
+
+
+def _collapse_records(records):
+    """collapse_duplicates for the sorted records of the external sort"""
+    seen = set()
+    for record in records:
+        if 'cluster_id' in record:
+            key = (record['cluster_id'], None if _is_missing(record.get('number')) else record.get('number'))
+            if key in seen:
+                continue
+            seen.add(key)
+        yield record
+
+
+def create_chronological_order(df, collapse=False, facets=None):
+    """Sort by date, lecture and part number, assign "order" and drop the sort keys.
+
+    With collapse only the earliest of the rows stage 2b found to be
+    re-uploads of the same lecture is kept. The sorted rows are counted into
+    facets (a FacetCounts) while their sort keys are still there.
+    """
+    df_sorted = sort_chronologically(df)
+    if collapse:
+        df_sorted = collapse_duplicates(df_sorted)
+    if facets is not None:
+        facets.add_frame(df_sorted)
+    return finalize_order(df_sorted)
+
+
+def finalize_order(df_sorted):
+    """Assign "order" to already sorted rows and drop the sort keys"""
+    df_sorted = df_sorted.copy()
+
+    # Create order column
+    df_sorted['order'] = range(1, len(df_sorted) + 1)
+
+    print(f"\nSorting complete! Created order from 1 to {len(df_sorted)}")
+
+    # Show first 10 ordered results
+    print(f"\nFirst 10 lectures in chronological order:")
+    print("="*70)
+    for idx, row in df_sorted.head(10).iterrows():
+        date_display = row.get('date_standard', row.get('date', 'N/A'))
+        print(f"Order: {row['order']}")
+        print(f"Title: {row['title']}")
+        print(f"Number: {row['number']} (Lecture: {row['lecture_num']}, Part: {row['part_num']})")
+        print(f"Date: {date_display}")
+        print("-" * 50)
+
+    # Clean up temporary columns for final export
+    print(f"\nPreparing final export...")
+    columns_to_drop = SORT_COLUMNS
+
+    # Handle missing values
+    if 'date_standard' in df_sorted.columns:
+        df_sorted['date_standard'] = df_sorted['date_standard'].fillna('')
+
+    if 'date' in df_sorted.columns:
+        df_sorted['date'] = df_sorted['date'].fillna('').astype(str)
+
+    # Create final DataFrame
+    df_final = df_sorted.drop(columns=[col for col in columns_to_drop if col in df_sorted.columns], errors='ignore')
+
+    # Reorder columns for better readability
+    available_columns = df_final.columns.tolist()
+    preferred_order = PREFERRED_COLUMN_ORDER
+    remaining_columns = [col for col in available_columns if col not in preferred_order]
+    column_order = [col for col in preferred_order if col in available_columns] + remaining_columns
+    df_final = df_final[column_order]
+
+    print(f"Final columns: {df_final.columns.tolist()}")
+    return df_final
+
+
+def save_results(df_final, output_dir=OUTPUT_DIR, output_format='json', boilerplate=None, excel=True, facets=None):
+    """Write the final JSON (or Parquet or NDJSON) and Excel files, the Excel file only if excel is set.
+
+    boilerplate is the BoilerplateTable of a --compact-text run: its blocks
+    are written to 4b_boilerplate_blocks.json and to a sheet of the Excel file.
+    facets (a FacetCounts) is written to 4b_facets.json.
+    """
+    # Save final results
+    if output_format == 'parquet':
+        output_json = write_parquet(df_final, os.path.join(output_dir, '4b_lectures_with_order.parquet'))
+    elif output_format == 'ndjson':
+        # Written row by row, catalogue_service.py can load it while it is written
+        output_json = write_ndjson(df_final, os.path.join(output_dir, '4b_lectures_with_order.ndjson'))
+    else:
+        output_json = os.path.join(output_dir, '4b_lectures_with_order.json')
+        df_records = df_final.to_dict(orient='records')
+
+        with open(output_json, 'w', encoding='utf-8') as json_file:
+            json.dump(df_records, json_file, ensure_ascii=False, indent=4)
+
+    print(f"\nFinal data saved to: {output_json}")
+
+    output_files = [output_json]
+    if excel:
+        # Save Excel format, streamed row by row
+        output_excel = os.path.join(output_dir, '4b_lectures_with_order.xlsx')
+        if boilerplate is None:
+            write_frame_excel(df_final, output_excel)
+        else:
+            blocks = pd.DataFrame({'reference': range(len(boilerplate)), 'block': boilerplate.blocks})
+            write_frame_excel(df_final, output_excel, 'lectures', [('boilerplate', blocks)])
+        print(f"Also saved to Excel: {output_excel}")
+        output_files.append(output_excel)
+
+    if boilerplate is not None:
+        output_blocks = boilerplate.save(os.path.join(output_dir, '4b_boilerplate_blocks.json'))
+        print(f"Boilerplate blocks saved to: {output_blocks}")
+        output_files.append(output_blocks)
+    if facets is not None:
+        output_files.append(save_facets(facets, output_dir))
+    return output_files
+
+
+def save_facets(facets, output_dir=OUTPUT_DIR):
+    """Write the facet counts after the lectures, so the catalogue can tell they belong to them"""
+    output_facets = facets.save(os.path.join(output_dir, FACETS_FILE_NAME))
+    print(f"Facet counts saved to: {output_facets} ({len(facets.facets['year'])} years, "
+          f"{len(facets.facets['month'])} months, {len(facets.facets['number_range'])} number ranges)")
+    return output_facets
+
+
+def report_summary(df_final, output_files):
+    # Display summary statistics
+    print(f"\nFinal Summary:")
+    print(f"Total lectures: {len(df_final)}")
+    print(f"Lectures with numbers: {df_final['number'].notna().sum()}")
+    print(f"Lectures without numbers: {df_final['number'].isna().sum()}")
+
+    # Date range
+    try:
+        valid_dates = df_final['date'].dropna()
+        if len(valid_dates) > 0:
+            valid_dates = valid_dates.astype(str)
+            print(f"Date range: {valid_dates.min()} to {valid_dates.max()}")
+        else:
+            print("Date range: No valid dates found")
+    except Exception as e:
+        print(f"Date range: Error calculating - {e}")
+
+    print(f"\nChronological ordering complete!")
+    print(f"Files created:")
+    for output_file in output_files:
+        print(f"- {output_file}")
+
+
+def load_sorted_parquet(path):
+    """Sort a 4a Parquet file reading only the sort key columns, then load the full rows in that order"""
+    keys = read_parquet(path, SORT_COLUMNS)
+    print(f"Sorting on {SORT_COLUMNS} ({len(keys)} rows)")
+    return read_parquet(path).iloc[chronological_order(keys)].reset_index(drop=True)
+
+
+def needs_external_sort(input_file):
+    """True if the input file probably doesn't fit in the available memory as a DataFrame"""
+    try:
+        available = os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):  # no sysconf on Windows
+        return False
+    return os.path.getsize(input_file) * IN_MEMORY_EXPANSION > available
+
+
+def _is_missing(value):
+    """None or NaN, the missing values of a record read from JSON"""
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def final_record(record, order):
+    """finalize_order for a single record of the external sort (or of the lightweight path)"""
+    record = {column: value for column, value in record.items() if column not in SORT_COLUMNS}
+    record['order'] = order
+    for column in ('date_standard', 'date'):
+        if column in record and _is_missing(record[column]):
+            record[column] = ''
+    if 'date' in record:
+        record['date'] = str(record['date'])
+    columns = [col for col in PREFERRED_COLUMN_ORDER if col in record] + [
+        col for col in record if col not in PREFERRED_COLUMN_ORDER]
+    return {column: record[column] for column in columns}
+
+
+def write_json_array(records, output_file):
+    """Write records one at a time, formatted like json.dump(records, indent=4), returns the count"""
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as json_file:
+        for record in records:
+            text = json.dumps(record, ensure_ascii=False, indent=4).replace('\n', '\n    ')
+            json_file.write(('[\n    ' if count == 0 else ',\n    ') + text)
+            count += 1
+        json_file.write('\n]' if count else '[]')
+    return count
+
+
+def _tee_to_sheet(records, workbook):
+    """Pass records through, appending each to a new sheet of the write-only workbook"""
+    sheet = None
+    columns = []
+    for record in records:
+        if sheet is None:
+            columns = list(record)
+            sheet = add_sheet(workbook, DEFAULT_SHEET_NAME, columns)
+        append_row(sheet, [record.get(column) for column in columns])
+        yield record
+    if sheet is None:
+        add_sheet(workbook, DEFAULT_SHEET_NAME, columns)
+
+
+def create_external_order(input_file=INPUT_FILE, output_dir=OUTPUT_DIR, chunk_size=DEFAULT_CHUNK_SIZE, excel=True,
+                          collapse=False):
+    """Order a 4a JSON file of any size with the external merge sort and stream it to the 4b JSON file.
+
+    With excel the records also go to the Excel file as they are written, in
+    openpyxl's write-only mode, so neither file needs the whole table in memory.
+    The facet counts are taken from the records on their way to the file.
+    """
+    print(f"\nSorting {input_file} externally in chunks of {chunk_size} records...")
+    print("Sort order: 1) Date (earliest first), 2) Lecture number, 3) Part number")
+    output_json = os.path.join(output_dir, '4b_lectures_with_order.json')
+    sorted_records = iter_sorted_records(input_file, chunk_size, output_dir)
+    if collapse:
+        sorted_records = _collapse_records(sorted_records)
+    facets = FacetCounts()
+    records = (final_record(record, order) for order, record in enumerate(facets.tally(sorted_records), start=1))
+    workbook = new_workbook() if excel else None
+    count = write_json_array(records if workbook is None else _tee_to_sheet(records, workbook), output_json)
+
+    print(f"\nSorting complete! Created order from 1 to {count}")
+    print(f"Final data saved to: {output_json}")
+    output_files = [output_json]
+    if workbook is not None:
+        output_excel = os.path.join(output_dir, '4b_lectures_with_order.xlsx')
+        workbook.save(output_excel)
+        print(f"Also saved to Excel: {output_excel}")
+        output_files.append(output_excel)
+    output_files.append(save_facets(facets, output_dir))
+    return count, output_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the final chronological order")
+    parser.add_argument('--external', action='store_true',
+                        help="Use the memory-bounded external merge sort (automatic when the input is larger than RAM)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Records per sorted run of the external sort")
+    parser.add_argument('--no-excel', action='store_true',
+                        help="Skip the Excel file (write it later with excel_stream.py)")
+    parser.add_argument('--collapse-duplicates', action='store_true',
+                        help="Keep one row per near-duplicate cluster and lecture number (needs stage 2b)")
+    args = parser.parse_args()
+
+    metrics = RunMetrics('stage 4b')
+    facets = FacetCounts()
+
+    # Load the prepared data
+    input_file = stage_input_path(INPUT_FILE)
+    if input_file.endswith('.json') and (args.external or needs_external_sort(input_file)):
+        start = time.perf_counter()
+        count, output_files = create_external_order(input_file, OUTPUT_DIR, args.chunk_size, not args.no_excel,
+                                                    args.collapse_duplicates)
+        metrics.add_stage('4b external sort', count, time.perf_counter() - start)
+        print(f"Metrics appended to: {metrics.save(OUTPUT_DIR)}")
+        return
+    if input_file.endswith('.parquet'):
+        # Only the sort keys are needed to work out the order
+        print(f"Reading {input_file}")
+        df_sorted = load_sorted_parquet(input_file)
+        print("Loaded DataFrame shape:", df_sorted.shape)
+        print("Columns:", df_sorted.columns.tolist())
+        with metrics.stage('4b order', len(df_sorted)):
+            if args.collapse_duplicates:
+                df_sorted = collapse_duplicates(df_sorted)
+            facets.add_frame(df_sorted)
+            df_final = finalize_order(df_sorted)
+    else:
+        df = load_stage_input(INPUT_FILE)
+        print("Loaded DataFrame shape:", df.shape)
+        print("Columns:", df.columns.tolist())
+        with metrics.stage('4b order', len(df)):
+            df_final = create_chronological_order(df, args.collapse_duplicates, facets)
+
+    with metrics.stage('4b save', len(df_final)):
+        output_files = save_results(df_final, excel=not args.no_excel, facets=facets)
+    report_summary(df_final, output_files)
+    print(f"Metrics appended to: {metrics.save(OUTPUT_DIR)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import os
+import time
+
+from columnar_io import load_stage_input, stage_input_path
+from compact_text import load_boilerplate
+from pipeline_metrics import RunMetrics
+from search_index import INDEX_FILE, RESULT_COLUMNS, SearchIndex, build_index, save_index
+
+INPUT_FILE = '../output/4b_lectures_with_order.json'
+BOILERPLATE_FILE = '../output/4b_boilerplate_blocks.json'
+OUTPUT_DIR = '../output'
+
+
+def build_search_index(df, boilerplate=None):
+    """Index the titles and descriptions of the final 4b frame"""
+    descriptions = df['description'] if boilerplate is None else boilerplate.expand_column(df['description'])
+    # None instead of NaN so the stored columns serialise as null
+    result_columns = {column: df[column].astype(object).where(df[column].notna(), None)
+                      for column in RESULT_COLUMNS if column != 'title' and column in df.columns}
+    return build_index(df['order'], df['title'].astype(object).where(df['title'].notna(), None),
+                       descriptions, **result_columns)
+
+
+def report_index(index, output_file):
+    print(f"\nIndexed lectures: {len(index['documents']['order'])}")
+    print(f"Distinct terms: {len(index['postings'])}")
+    print(f"Postings: {sum(len(positions) for positions, _ in index['postings'].values())}")
+    print(f"Index saved to: {output_file} ({os.path.getsize(output_file) / 2 ** 20:.2f} MiB)")
+
+    # Sample query with the most common term
+    search = SearchIndex(index)
+    if index['postings']:
+        term = max(index['postings'], key=lambda term: len(index['postings'][term][0]))
+        start = time.perf_counter()
+        results = search.search(term, limit=3)
+        print(f"\nSample query '{term}' ({(time.perf_counter() - start) * 1000:.2f} ms):")
+        for result in results:
+            print(f"  {result['order']}. {result['title']} (score {result['score']})")
+
+
+def main():
+    # Load the final ordered lectures from script 4b
+    input_file = stage_input_path(INPUT_FILE)
+    df = load_stage_input(INPUT_FILE, columns=['order', 'title', 'description', *RESULT_COLUMNS[1:]])
+    print("Loaded DataFrame shape:", df.shape)
+    boilerplate = load_boilerplate(BOILERPLATE_FILE, input_file)
+    if boilerplate is not None:
+        print(f"Expanding {len(boilerplate)} boilerplate blocks from {BOILERPLATE_FILE}")
+
+    metrics = RunMetrics('stage 5')
+    with metrics.stage('5 search index', len(df)) as counts:
+        index = build_search_index(df, boilerplate)
+        counts['terms'] = len(index['postings'])
+    output_file = save_index(index, os.path.join(OUTPUT_DIR, os.path.basename(INDEX_FILE)))
+    report_index(index, output_file)
+    print(f"Metrics appended to: {metrics.save(OUTPUT_DIR)}")
+
+    print(f"\nQuery it with: python search_index.py \"<words>\"")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Throughput benchmark for the stage 2 lecture extraction (rows/sec).
+
+Runs extract_lecture_columns on descriptions from the sample dump, repeated
+up to the requested number of rows.
+
+Usage:
+    python benchmark_extraction.py [--rows N] [--input FILE]
+"""
+import argparse
+import json
+import time
+
+import pandas as pd
+
+from lecture_extraction import extract_lecture_columns
+
+SAMPLE_FILE = '../input/dataset_youtube-scraper-task_2025-04-26_subset.json'
+
+
+def build_descriptions(input_file, rows):
+    with open(input_file, 'r', encoding='utf-8') as file:
+        texts = [record.get('text') for record in json.load(file)]
+    # Plus one description without any lecture marker, like most non-lecture videos
+    texts.append("В живой беседе Сергей Бугаев отвечает на вопросы.\n\n#вопросы #ответы")
+    # and markers in unusual case, which the patterns match case-insensitively
+    texts.append("Лекция Прочитана 5 мая 2020 года")
+    texts.append("Беседа о практике.\nлЕкЦиЯ ПРОЧИТАНА 12 июня 2019 года")
+    texts.append("© ЛЕКЦИЮ №7 (ЧАСТЬ 2) сергей бугаев ПРОЧИТАЛ 1 мая 2018 года")
+    return pd.Series((texts * (rows // len(texts) + 1))[:rows])
+
+
+def time_it(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark stage 2 lecture extraction")
+    parser.add_argument('--rows', type=int, default=100000, help="Number of descriptions to process")
+    parser.add_argument('--input', default=SAMPLE_FILE, help="Apify dump to take descriptions from")
+    args = parser.parse_args()
+
+    descriptions = build_descriptions(args.input, args.rows)
+    print(f"Benchmarking {len(descriptions)} descriptions...")
+
+    lecture_info, seconds = time_it(lambda: extract_lecture_columns(descriptions))
+    found = int((lecture_info['number'].notna() | lecture_info['date'].notna()).sum())
+
+    print(f"\nExtraction: {seconds:.3f}s ({len(descriptions) / seconds:,.0f} rows/sec)")
+    print(f"Descriptions with a lecture number or date: {found}")
+
+
+if __name__ == '__main__':
+    main()
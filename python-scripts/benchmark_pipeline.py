@@ -0,0 +1,114 @@
+"""Scaling benchmark for every pipeline stage on synthetic dumps.
+
+For each size a synthetic dump is generated (synthetic_dataset.py) and the
+stages run in memory the same way run_pipeline.py chains them. Every stage
+is timed on its own, then run again under tracemalloc for its peak memory,
+so the tracing overhead doesn't end up in the timings.
+
+The "scaling" column is the time per row relative to the smallest size:
+about 1.0 for a linear stage, growing with the size for a superlinear one.
+
+Usage:
+    python benchmark_pipeline.py [--sizes 1000 10000 100000] [--results FILE] [--skip-memory]
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from russian_dates import DateCache
+from synthetic_dataset import write_dataset
+
+stage1 = importlib.import_module('1_extract_rename_columns')
+stage2 = importlib.import_module('2_extract_number_date_strings')
+stage3a = importlib.import_module('3a_analyze_date_format')
+stage3b = importlib.import_module('3b_convert_dates')
+stage4a = importlib.import_module('4a_prepare_sorting')
+stage4b = importlib.import_module('4b_create_chronological_order')
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+
+def pipeline_stages(input_file, output_dir):
+    """(name, function) pairs, each function takes the previous stage's result"""
+    return [
+        ('1 load + clean', lambda _: stage1.load_cleaned_data(input_file)),
+        ('2 extract', stage2.extract_number_date_strings),
+        ('3a analyze', lambda df: (df, stage3a.analyze_date_format(df))),
+        # A fresh in-memory cache each time, so every run parses its dates
+        ('3b convert', lambda previous: stage3b.convert_dates(*previous, cache=DateCache())),
+        ('4a prepare', lambda df: stage4a.prepare_sorting(df.drop(columns=['date_datetime']))),
+        ('4b order', stage4b.create_chronological_order),
+        ('4b save', lambda df: stage4b.save_results(df, output_dir)),
+    ]
+
+
+def measure(func, argument, trace_memory):
+    """Run func(argument) with its output silenced, returns (result, seconds, peak MiB or None)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func(argument)
+        seconds = time.perf_counter() - start
+
+        peak = None
+        if trace_memory:
+            tracemalloc.start()
+            func(argument)
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+    return result, seconds, peak
+
+
+def benchmark_size(rows, work_dir, trace_memory=True):
+    """Generate a dump of the given size and measure every stage on it"""
+    input_file = write_dataset(os.path.join(work_dir, f'synthetic_{rows}.json'), rows)
+    results = []
+    result = None
+    for name, func in pipeline_stages(input_file, work_dir):
+        result, seconds, peak = measure(func, result, trace_memory)
+        results.append({'stage': name, 'rows': rows, 'seconds': seconds,
+                        'rows_per_sec': rows / seconds if seconds else None, 'peak_mib': peak})
+    return results
+
+
+def print_results(results):
+    # Time per row of each stage at its smallest size, to show how it scales
+    baseline = {}
+    for result in sorted(results, key=lambda result: result['rows']):
+        baseline.setdefault(result['stage'], result['seconds'] / result['rows'])
+
+    print(f"\n{'Stage':<16}{'Rows':>10}{'Seconds':>10}{'Rows/sec':>12}{'Peak MiB':>10}{'Scaling':>9}")
+    for result in sorted(results, key=lambda result: (result['stage'], result['rows'])):
+        peak = f"{result['peak_mib']:.1f}" if result['peak_mib'] is not None else '-'
+        scaling = result['seconds'] / result['rows'] / baseline[result['stage']]
+        print(f"{result['stage']:<16}{result['rows']:>10}{result['seconds']:>10.3f}"
+              f"{result['rows_per_sec']:>12,.0f}{peak:>10}{scaling:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on synthetic dumps")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help="Dump sizes in records")
+    parser.add_argument('--results', metavar='FILE', help="Also write the measurements to this JSON file")
+    parser.add_argument('--skip-memory', action='store_true', help="Don't measure peak memory (halves the run time)")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in args.sizes:
+            print(f"Benchmarking {rows} records...")
+            results += benchmark_size(rows, work_dir, not args.skip_memory)
+
+    print_results(results)
+    if args.results:
+        with open(args.results, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"\nResults saved to: {args.results}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Strip fixed boilerplate lines from the descriptions and pull out their hashtags.
+
+Most descriptions carry the same donation, contact and divider lines, e.g.
+
+    ► Поддержать создание лекций:
+    Приватбанк: 4731 1856 1944 8878
+    Юмани: https://yoomoney.ru/to/4100115065109229
+
+and end with a line of hashtags. BoilerplateStripper finds every phrase of
+a configurable list and every hashtag in one left-to-right scan per
+description: the phrases are compiled into a single regular expression
+shaped like their character trie, so at each position the regex engine
+follows one trie path in C instead of trying every phrase (the same
+single pass as an Aho-Corasick automaton, without a per-character Python
+loop or a C extension).
+
+A line containing a phrase is removed. Hashtags go to the "tags" column
+(space separated, without "#", in order of first appearance); a line of
+nothing but hashtags is removed, hashtags inside a sentence stay in the
+text. The lines stage 2 parses ("© Лекцию №...", "Лекция прочитана ...")
+contain none of the default phrases, so the extracted numbers and dates
+don't change.
+"""
+import json
+import re
+
+# Matched case-sensitively anywhere in a line
+DEFAULT_PHRASES = (
+    '► Поддержать создание лекций',
+    '► Спрашивайте, задавайте вопросы',
+    'Приватбанк:',
+    'Юмани:',
+    'yoomoney.ru/to/',
+    'money.yandex.ru/to/',
+    'guru.sergey.bugaev',
+    '-----',
+)
+# Preceded by whitespace or the start of the text, checked in strip(): a
+# lookbehind here would stop the regex engine from skipping ahead to the
+# first characters of the phrases
+HASHTAG_PATTERN = r'#(?P<tag>\w+)'
+_HASHTAG_LINE = re.compile(r'(?:\s*#\w+)+\s*')
+_EXTRA_BLANK_LINES = re.compile(r'\n\s*\n(?:\s*\n)+')
+
+
+def load_phrases(path):
+    """A phrase list from a JSON file: a list of strings"""
+    with open(path, 'r', encoding='utf-8') as file:
+        phrases = json.load(file)
+    if not isinstance(phrases, list) or not all(isinstance(phrase, str) and phrase for phrase in phrases):
+        raise ValueError(f"{path} must hold a JSON list of non-empty strings")
+    return phrases
+
+
+def trie_alternatives(phrases):
+    """Regular expressions, one per first character, matching any of phrases (the longest one), nested like their trie"""
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        # '' marks the end of a phrase
+        node[''] = {}
+
+    def branches(node):
+        return [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char]
+
+    def pattern(node):
+        alternatives = branches(node)
+        if not alternatives:
+            return ''
+        if len(alternatives) == 1 and '' not in node:
+            return alternatives[0]
+        group = '(?:' + '|'.join(alternatives) + ')'
+        # A phrase may end here, a longer one continues
+        return group + '?' if '' in node else group
+
+    return branches(trie)
+
+
+class BoilerplateStripper:
+    """Removes the lines containing any of phrases and collects the hashtags, in one scan per text"""
+
+    def __init__(self, phrases=DEFAULT_PHRASES):
+        self.phrases = [phrase for phrase in phrases if phrase]
+        # One flat alternation, so the engine only stops at the phrases' first characters and at "#"
+        self.pattern = re.compile('|'.join(trie_alternatives(self.phrases) + [HASHTAG_PATTERN]))
+
+    def strip(self, text):
+        """(text without the boilerplate lines, space-separated hashtags or None)"""
+        if not isinstance(text, str):
+            return text, None
+        tags = {}
+        removed_lines = set()
+        checked_lines = set()
+        for match in self.pattern.finditer(text):
+            line_start = text.rfind('\n', 0, match.start()) + 1
+            tag = match.group('tag')
+            if tag is None:
+                removed_lines.add(line_start)
+                continue
+            if match.start() > 0 and not text[match.start() - 1].isspace():
+                # e.g. a link's "#anchor"
+                continue
+            tags.setdefault(tag, None)
+            if line_start not in checked_lines:
+                checked_lines.add(line_start)
+                line_end = text.find('\n', line_start)
+                if _HASHTAG_LINE.fullmatch(text, line_start, line_end if line_end != -1 else len(text)):
+                    removed_lines.add(line_start)
+
+        if removed_lines:
+            pieces = []
+            position = 0
+            for line_start in sorted(removed_lines):
+                pieces.append(text[position:line_start])
+                line_end = text.find('\n', line_start)
+                position = line_end + 1 if line_end != -1 else len(text)
+            pieces.append(text[position:])
+            # Removed lines leave runs of blank lines behind
+            text = _EXTRA_BLANK_LINES.sub('\n\n', ''.join(pieces)).strip()
+        return text, ' '.join(tags) if tags else None
+
+    def strip_column(self, texts):
+        """(stripped texts, tags) lists of a column"""
+        results = [self.strip(text) for text in texts]
+        return [text for text, _ in results], [tags for _, tags in results]
@@ -0,0 +1,239 @@
+"""Make-style runner for the numbered stage scripts that skips up-to-date stages.
+
+Each stage is declared with its script, the files it reads and the files it
+writes. After a stage runs, a manifest in the output directory records a
+content hash of each input, of the stage's code (the script plus the local
+modules it imports) and of each output. On the next build a stage is skipped
+when all of these still match, so after editing 4b only 4b is re-run.
+
+Because inputs are compared by content, a stage that re-runs but writes
+byte-identical output doesn't invalidate the stages after it.
+
+The near-duplicate stage 2b only runs with --find-duplicates. Its output is
+still an input of 3b, which reads it when it is newer than the stage 2 output.
+
+Usage:
+    python build_pipeline.py [--dry-run] [--force STAGE] [--until STAGE] [--find-duplicates]
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+from columnar_io import stage_input_path
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_FILE = '../output/pipeline_manifest.json'
+
+# name, script, inputs, outputs; paths are relative to python-scripts/, like in the scripts
+STAGES = [
+    ('1', '1_extract_rename_columns.py',
+     ['../input/dataset_youtube-scraper-task_2025-04-26.json'],
+     ['../output/01_title_description_cleaned.json', '../output/01_title_description_cleaned.csv']),
+    ('2', '2_extract_number_date_strings.py',
+     ['../output/01_title_description_cleaned.json'],
+     ['../output/02_lectures_with_extracted_info.json', '../output/02_lectures_with_extracted_info.csv']),
+    ('2b', '2b_find_near_duplicates.py',
+     ['../output/02_lectures_with_extracted_info.json'],
+     ['../output/02b_lectures_with_clusters.json']),
+    ('3a', '3a_analyze_date_format.py',
+     ['../output/02_lectures_with_extracted_info.json'],
+     ['../output/03b_date_format_analysis.json']),
+    # The date cache is read and extended by every run, so it is tracked as an
+    # output: a cache changed by another run (run_pipeline.py --date-cache) makes 3b stale
+    ('3b', '3b_convert_dates.py',
+     ['../output/02_lectures_with_extracted_info.json', '../output/02b_lectures_with_clusters.json',
+      '../output/03b_date_format_analysis.json'],
+     ['../output/03b_lectures_with_reformatted_dates.json', '../output/03b_lectures_with_reformatted_dates.csv',
+      '../output/03b_date_cache.json']),
+    ('4a', '4a_prepare_sorting.py',
+     ['../output/03b_lectures_with_reformatted_dates.json'],
+     ['../output/4a_lectures_prepared_for_sorting.json']),
+    ('4b', '4b_create_chronological_order.py',
+     ['../output/4a_lectures_prepared_for_sorting.json'],
+     ['../output/4b_lectures_with_order.json', '../output/4b_lectures_with_order.xlsx',
+      '../output/4b_facets.json']),
+    ('5', '5_build_search_index.py',
+     ['../output/4b_lectures_with_order.json'],
+     ['../output/5_search_index.json']),
+]
+STAGE_NAMES = [stage[0] for stage in STAGES]
+# Stages that only run when asked for, and the inputs that are missing until they have
+OPTIONAL_STAGES = {'2b'}
+OPTIONAL_INPUTS = {'../output/02b_lectures_with_clusters.json'}
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def local_imports(script):
+    """The script plus every module of this directory it imports, directly or through other modules"""
+    pending = [script]
+    found = set()
+    while pending:
+        file_name = pending.pop()
+        if file_name in found:
+            continue
+        found.add(file_name)
+        with open(os.path.join(SCRIPTS_DIR, file_name), 'r', encoding='utf-8') as file:
+            tree = ast.parse(file.read(), file_name)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                modules = [node.module]
+            else:
+                continue
+            for module in modules:
+                module_file = module.split('.')[0] + '.py'
+                if os.path.exists(os.path.join(SCRIPTS_DIR, module_file)):
+                    pending.append(module_file)
+    return sorted(found)
+
+
+def code_hash(script):
+    digest = hashlib.sha256()
+    for file_name in local_imports(script):
+        digest.update(file_name.encode('utf-8') + b'\0')
+        with open(os.path.join(SCRIPTS_DIR, file_name), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+class FileHasher:
+    """Content hashes of files, reusing the recorded hash while size and mtime are unchanged"""
+
+    def __init__(self, known=None):
+        # path -> [size, mtime_ns, sha256]
+        self.known = dict(known or {})
+
+    def hash(self, path):
+        """sha256 of the file, None if it doesn't exist"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        recorded = self.known.get(path)
+        if recorded and recorded[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return recorded[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        self.known[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return self.known[path][2]
+
+
+def load_manifest(manifest_file=MANIFEST_FILE):
+    if not os.path.exists(manifest_file):
+        return {'stages': {}, 'files': {}}
+    with open(manifest_file, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_manifest(manifest, manifest_file=MANIFEST_FILE):
+    os.makedirs(os.path.dirname(manifest_file), exist_ok=True)
+    temp_file = manifest_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2)
+    os.replace(temp_file, manifest_file)
+
+
+def stage_inputs(inputs):
+    # Stage scripts read a newer Parquet sibling instead of the JSON file
+    return [stage_input_path(path) for path in inputs]
+
+
+def stale_reason(record, current_code_hash, input_hashes, hasher):
+    """Why a stage has to run, or None if its recorded outputs are still valid"""
+    if record is None:
+        return "never built"
+    if record['code'] != current_code_hash:
+        return "code changed"
+    if record['inputs'] != input_hashes:
+        changed = [path for path in input_hashes if record['inputs'].get(path) != input_hashes[path]]
+        return f"input changed: {', '.join(changed) or 'input files differ'}"
+    for path, output_hash in record['outputs'].items():
+        current_hash = hasher.hash(path)
+        if current_hash is None:
+            return f"output missing: {path}"
+        if current_hash != output_hash:
+            return f"output modified: {path}"
+    return None
+
+
+def build(force_from=None, until=None, dry_run=False, manifest_file=MANIFEST_FILE, optional=()):
+    """Run the stages that are out of date, returns the names of the stages that ran (or would run).
+
+    Of OPTIONAL_STAGES only the ones in optional are run.
+    """
+    manifest = load_manifest(manifest_file)
+    hasher = FileHasher(manifest['files'])
+    last = STAGE_NAMES.index(until) if until else len(STAGES) - 1
+    # stage name -> reason it runs regardless of the manifest
+    forced = dict.fromkeys(STAGE_NAMES[STAGE_NAMES.index(force_from):], "forced") if force_from else {}
+
+    ran = []
+    for name, script, inputs, outputs in STAGES[:last + 1]:
+        if name in OPTIONAL_STAGES and name not in optional:
+            continue
+        input_files = stage_inputs(inputs)
+        # A missing optional input is hashed as None, so the stage re-runs once it appears
+        missing = [path for path, declared in zip(input_files, inputs)
+                   if declared not in OPTIONAL_INPUTS and not os.path.exists(path)]
+        if missing and not dry_run:
+            raise FileNotFoundError(f"Stage {name} needs {', '.join(missing)}")
+
+        current_code_hash = code_hash(script)
+        input_hashes = {path: hasher.hash(path) for path in input_files}
+        reason = forced.get(name) or stale_reason(
+            manifest['stages'].get(name), current_code_hash, input_hashes, hasher)
+        if reason is None:
+            print(f"Stage {name}: up to date, skipped")
+            continue
+
+        ran.append(name)
+        if dry_run:
+            print(f"Stage {name}: would run ({reason})")
+            # Without running it we can't tell if its outputs change, so assume the later stages run too
+            for later in STAGE_NAMES[STAGE_NAMES.index(name) + 1:]:
+                forced.setdefault(later, f"after stage {name}")
+            continue
+
+        print(f"\nStage {name}: running {script} ({reason})")
+        subprocess.run([sys.executable, script], cwd=SCRIPTS_DIR, check=True)
+
+        manifest['stages'][name] = {
+            'code': current_code_hash,
+            'inputs': input_hashes,
+            # Outputs a run didn't write (e.g. the Excel file of an external 4b sort) aren't tracked
+            'outputs': {path: output_hash for path in outputs if (output_hash := hasher.hash(path)) is not None},
+        }
+        manifest['files'] = hasher.known
+        save_manifest(manifest, manifest_file)
+
+    print(f"\nStages run: {', '.join(ran) if ran else 'none, everything up to date'}")
+    return ran
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the stage scripts that are out of date")
+    parser.add_argument('--dry-run', action='store_true', help="Only show which stages would run and why")
+    parser.add_argument('--force', choices=STAGE_NAMES, metavar='STAGE',
+                        help=f"Re-run this stage and everything after it ({', '.join(STAGE_NAMES)})")
+    parser.add_argument('--until', choices=STAGE_NAMES, metavar='STAGE', help="Stop after this stage")
+    parser.add_argument('--find-duplicates', action='store_true',
+                        help="Also run stage 2b, which adds the near-duplicate cluster ids")
+    args = parser.parse_args()
+
+    # The stage scripts use paths relative to python-scripts/
+    os.chdir(SCRIPTS_DIR)
+    optional = {'2b'} if args.find_duplicates or args.force == '2b' else set()
+    build(args.force, args.until, args.dry_run, optional=optional)
+
+
+if __name__ == '__main__':
+    main()
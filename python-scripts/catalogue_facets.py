@@ -0,0 +1,135 @@
+"""Per-year, per-month and per-lecture-number-range counts of the final catalogue.
+
+The catalogue sidebar shows how many lectures each year and month of
+`date_standard` and each range of NUMBER_RANGE_SIZE lecture numbers holds.
+Stage 4b counts them while it orders the rows and writes them next to the
+lectures as 4b_facets.json:
+
+    {"total": 1200, "undated": 12, "unnumbered": 40,
+     "year": {"2019": 310, ...},
+     "month": {"2019-01": 25, ...},
+     "number_range": {"1-50": 48, "51-100": 50, ...}}
+
+An incremental run (run_pipeline.py --state-db) keeps the counts in the
+state database and only takes out the old rows of edited and removed videos
+and adds the new ones, instead of counting the whole catalogue again.
+"""
+import json
+import os
+import re
+from collections import Counter
+
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+NUMBER_RANGE_SIZE = 50
+FACETS_FILE_NAME = '4b_facets.json'
+FACET_NAMES = ('year', 'month', 'number_range')
+
+_DATE_PATTERN = re.compile(r'\d\d/(?P<month>\d\d)/(?P<year>\d{4})')
+
+
+def number_range(lecture_num):
+    """The "1-50" style range of a lecture number"""
+    start = (lecture_num - 1) // NUMBER_RANGE_SIZE * NUMBER_RANGE_SIZE + 1
+    return f"{start}-{start + NUMBER_RANGE_SIZE - 1}"
+
+
+class FacetCounts:
+    """Lecture counts per facet value, built from (date_standard, lecture_num) pairs"""
+
+    def __init__(self, counts=None):
+        counts = counts or {}
+        self.total = counts.get('total', 0)
+        self.undated = counts.get('undated', 0)
+        self.unnumbered = counts.get('unnumbered', 0)
+        self.facets = {name: Counter(counts.get(name, {})) for name in FACET_NAMES}
+
+    def update(self, rows, sign=1):
+        """Count (date_standard, lecture_num) pairs, sign=-1 takes them out again.
+
+        date_standard is a DD/MM/YYYY string (anything else is undated),
+        lecture_num stage 4a's parsed lecture number (0 when unnumbered).
+        """
+        years, months, ranges = (self.facets[name] for name in FACET_NAMES)
+        for date_standard, lecture_num in rows:
+            self.total += sign
+            match = _DATE_PATTERN.fullmatch(date_standard) if isinstance(date_standard, str) else None
+            if match is None:
+                self.undated += sign
+            else:
+                years[match['year']] += sign
+                months[f"{match['year']}-{match['month']}"] += sign
+            if lecture_num > 0:
+                ranges[number_range(int(lecture_num))] += sign
+            else:
+                self.unnumbered += sign
+        if sign < 0:
+            # Values whose last lecture was taken out
+            for facet in self.facets.values():
+                for value in [value for value, count in facet.items() if count <= 0]:
+                    del facet[value]
+
+    def add_frame(self, df, sign=1):
+        """update() with the rows of a frame with "date_standard" and "lecture_num" columns, column-wise"""
+        # The pyarrow-backed string kernels, anything but a DD/MM/YYYY string counts as undated
+        dates = df['date_standard'].astype('str')
+        dates = dates[dates.str.fullmatch(_DATE_PATTERN.pattern).fillna(False).astype(bool)]
+        years = dates.str.slice(6, 10)
+        lecture_nums = df['lecture_num'].to_numpy(np.int64)
+        range_starts, range_counts = np.unique((lecture_nums[lecture_nums > 0] - 1) // NUMBER_RANGE_SIZE,
+                                               return_counts=True)
+        self.total += sign * len(df)
+        self.undated += sign * (len(df) - len(dates))
+        self.unnumbered += sign * int((lecture_nums <= 0).sum())
+        counts = (years.value_counts().items(),
+                  (years + '-' + dates.str.slice(3, 5)).value_counts().items(),
+                  ((number_range(int(start) * NUMBER_RANGE_SIZE + 1), count)
+                   for start, count in zip(range_starts, range_counts)))
+        for name, values in zip(FACET_NAMES, counts):
+            facet = self.facets[name]
+            for value, count in values:
+                facet[value] += sign * int(count)
+                if facet[value] <= 0:
+                    del facet[value]
+
+    def add_records(self, records, sign=1):
+        """update() with records with "date_standard" and "lecture_num" keys"""
+        self.update(((record.get('date_standard'), record.get('lecture_num') or 0) for record in records), sign)
+
+    def tally(self, records):
+        """Pass records through, counting each, for the streamed paths"""
+        for record in records:
+            self.update([(record.get('date_standard'), record.get('lecture_num') or 0)])
+            yield record
+
+    def to_dict(self):
+        """The counts in display order: years and months ascending, number ranges by their first number"""
+        return {
+            'total': self.total,
+            'undated': self.undated,
+            'unnumbered': self.unnumbered,
+            'year': dict(sorted(self.facets['year'].items())),
+            'month': dict(sorted(self.facets['month'].items())),
+            'number_range': dict(sorted(self.facets['number_range'].items(),
+                                        key=lambda item: int(item[0].partition('-')[0]))),
+        }
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.to_dict(), file, ensure_ascii=False, indent=4)
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            return cls(json.load(file))
+
+
+def load_facets(facets_file, data_file):
+    """FacetCounts written with data_file, None if there are none or they are older than it"""
+    # A run writes the counts right after its lectures, older counts belong to an earlier run
+    if not os.path.exists(facets_file) or os.path.getmtime(facets_file) < os.path.getmtime(data_file):
+        return None
+    return FacetCounts.load(facets_file)
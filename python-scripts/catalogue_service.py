@@ -0,0 +1,372 @@
+"""Local HTTP query service for the final lecture catalogue.
+
+The 4b output is loaded once at start-up. Two sorted indexes are built over
+it: one on the date (`date_standard`) and one on the parsed
+(lecture number, part number). A request then finds its range with two
+bisections and only serialises the requested page, instead of scanning the
+whole list:
+
+    GET /lectures?date_from=2021-01-01&date_to=2021-12-31&offset=0&limit=50
+    GET /lectures?number=126         (all parts of lecture 126)
+    GET /lectures?number=126-2
+    GET /lectures?tag=философия      (hashtag, with --strip-boilerplate)
+    GET /tags                        (every hashtag with its number of lectures)
+    GET /facets                      (lectures per year, month and number range)
+    GET /lectures/57                 (one lecture by its order)
+
+Dates are accepted as YYYY-MM-DD or DD/MM/YYYY. Responses carry an ETag
+derived from the dataset's content and the query, a request with a matching
+If-None-Match gets an empty 304.
+
+The facet counts come from the 4b_facets.json stage 4b wrote with the
+lectures; without it (or when it is older) they are counted once at
+start-up.
+
+An NDJSON 4b file (run_pipeline.py --format ndjson) is read while the
+pipeline is still writing it, so the service can be started together with
+the pipeline and is up as soon as the last line is written.
+
+Usage:
+    python catalogue_service.py [--input FILE] [--host HOST] [--port PORT]
+"""
+import argparse
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from catalogue_facets import FacetCounts, load_facets
+from columnar_io import load_stage_input, stage_input_path
+from compact_text import load_boilerplate
+from ndjson_stream import iter_ndjson
+
+# Stage modules start with a digit, so they can't be imported with a plain import statement
+stage4a = importlib.import_module('4a_prepare_sorting')
+
+INPUT_FILE = '../output/4b_lectures_with_order.json'
+BOILERPLATE_FILE = '../output/4b_boilerplate_blocks.json'
+FACETS_FILE = '../output/4b_facets.json'
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_REQUEST_HEAD = 16 * 1024
+# Bodies up to this size are read and dropped to keep the connection, larger ones close it
+MAX_DISCARDED_BODY = 64 * 1024
+
+STATUS_TEXT = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+class QueryError(ValueError):
+    """Invalid query parameter, answered with 400"""
+
+
+def parse_date(value):
+    """Day ordinal of a YYYY-MM-DD or DD/MM/YYYY date"""
+    for date_format in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime(value, date_format).toordinal()
+        except ValueError:
+            pass
+    raise QueryError(f"invalid date {value!r}, expected YYYY-MM-DD or DD/MM/YYYY")
+
+
+def parse_number(value):
+    """(lecture, part) of "126-2", (lecture, None) of "126" """
+    lecture, _, part = value.partition('-')
+    if not lecture.strip().isdigit() or (part and not part.strip().isdigit()):
+        raise QueryError(f"invalid lecture number {value!r}, expected X or X-Y")
+    return int(lecture), int(part) if part else None
+
+
+class CatalogueIndex:
+    """The lectures in order, with sorted date and number indexes for range queries"""
+
+    def __init__(self, records, version, facets=None):
+        # records are in `order`, as written by stage 4b
+        self.records = records
+        self.version = version
+        self.by_order = {record['order']: position for position, record in enumerate(records)}
+
+        numbers = [record.get('number') for record in records]
+        lectures, parts = stage4a.parse_lecture_numbers(numbers)
+        date_days = pd.to_datetime(pd.Series([record.get('date_standard') for record in records], dtype=object),
+                                   format='%d/%m/%Y', errors='coerce')
+
+        # Per position: day ordinal of the date and (lecture, part), None where missing or unparsed
+        self.day_of = [None if pd.isna(day) else day.toordinal() for day in date_days]
+        self.number_of = [(int(lecture), int(part)) if lecture > 0 else None for lecture, part in zip(lectures, parts)]
+
+        dated = sorted((day, position) for position, day in enumerate(self.day_of) if day is not None)
+        self.date_keys = [key for key, _ in dated]
+        self.date_positions = [position for _, position in dated]
+        numbered = sorted((key, position) for position, key in enumerate(self.number_of) if key is not None)
+        self.number_keys = [key for key, _ in numbered]
+        self.number_positions = [position for _, position in numbered]
+
+        if facets is None:
+            facets = FacetCounts()
+            facets.update((record.get('date_standard'), key[0] if key is not None else 0)
+                          for record, key in zip(records, self.number_of))
+        self.facets = facets.to_dict()
+
+        # Hashtags of run_pipeline.py --strip-boilerplate, case-insensitive, positions in order
+        self.tag_positions = {}
+        for position, record in enumerate(records):
+            for tag in dict.fromkeys((record.get('tags') or '').casefold().split()):
+                self.tag_positions.setdefault(tag, []).append(position)
+
+    def __len__(self):
+        return len(self.records)
+
+    def date_range(self, date_from=None, date_to=None):
+        """Index slice of the lectures dated within [date_from, date_to] (day ordinals)"""
+        start = bisect_left(self.date_keys, date_from) if date_from is not None else 0
+        stop = bisect_right(self.date_keys, date_to) if date_to is not None else len(self.date_keys)
+        return start, max(start, stop)
+
+    def number_range(self, lecture, part=None):
+        """Index slice of lecture's parts, or of the one part"""
+        if part is None:
+            return bisect_left(self.number_keys, (lecture, 0)), bisect_left(self.number_keys, (lecture + 1, 0))
+        return bisect_left(self.number_keys, (lecture, part)), bisect_right(self.number_keys, (lecture, part))
+
+    def query(self, date_from=None, date_to=None, number=None, tag=None, offset=0, limit=DEFAULT_PAGE_SIZE):
+        """One page of the lectures matching the filters, returns (total, records).
+
+        With one filter the page is sliced straight out of that filter's
+        index. With both, the smaller of the two ranges is checked against
+        the other filter. A tag's lectures are checked against the others.
+        """
+        if tag is not None:
+            positions = [position for position in self.tag_positions.get(tag.lstrip('#').casefold(), [])
+                         if (number is None or self._numbered(position, *number))
+                         and (date_from is None and date_to is None or self._dated_within(position, date_from, date_to))]
+            return len(positions), [self.records[position] for position in positions[offset:offset + limit]]
+        if number is None and date_from is None and date_to is None:
+            return len(self.records), self.records[offset:offset + limit]
+
+        if number is not None:
+            number_start, number_stop = self.number_range(*number)
+        if date_from is not None or date_to is not None:
+            date_start, date_stop = self.date_range(date_from, date_to)
+            if number is None:
+                page = self.date_positions[date_start + offset:min(date_stop, date_start + offset + limit)]
+                return date_stop - date_start, [self.records[position] for position in page]
+        else:
+            page = self.number_positions[number_start + offset:min(number_stop, number_start + offset + limit)]
+            return number_stop - number_start, [self.records[position] for position in page]
+
+        if number_stop - number_start <= date_stop - date_start:
+            positions = [position for position in self.number_positions[number_start:number_stop]
+                         if self._dated_within(position, date_from, date_to)]
+        else:
+            positions = [position for position in self.date_positions[date_start:date_stop]
+                         if self._numbered(position, *number)]
+        return len(positions), [self.records[position] for position in positions[offset:offset + limit]]
+
+    def _numbered(self, position, lecture, part=None):
+        key = self.number_of[position]
+        return key is not None and key[0] == lecture and part in (None, key[1])
+
+    def _dated_within(self, position, date_from, date_to):
+        day = self.day_of[position]
+        return day is not None and (date_from is None or day >= date_from) and (date_to is None or day <= date_to)
+
+    def tag_counts(self):
+        """{tag: number of lectures}, the most used first"""
+        return dict(sorted(((tag, len(positions)) for tag, positions in self.tag_positions.items()),
+                           key=lambda item: (-item[1], item[0])))
+
+    def get(self, order):
+        """The lecture with this order, None if there is none"""
+        position = self.by_order.get(order)
+        return None if position is None else self.records[position]
+
+
+def load_catalogue(input_file=INPUT_FILE, boilerplate_file=BOILERPLATE_FILE, facets_file=FACETS_FILE):
+    """CatalogueIndex over the 4b output (JSON, or its newer Parquet or NDJSON sibling) and its facet counts"""
+    if input_file.endswith('.ndjson'):
+        # Follows the file while stage 4b writes it, the records already have null for missing values
+        records = list(iter_ndjson(input_file))
+        data_file = input_file
+        # The blocks file of --compact-text is written after the data file is complete
+        boilerplate = load_boilerplate(boilerplate_file, data_file)
+        if boilerplate is not None:
+            for record in records:
+                if record.get('description') is not None:
+                    record['description'] = boilerplate.expand(record['description'])
+    else:
+        data_file = stage_input_path(input_file)
+        df = load_stage_input(input_file)
+        # None instead of NaN / NaT so the records serialise as null
+        df = df.astype(object).where(df.notna(), None)
+        boilerplate = load_boilerplate(boilerplate_file, data_file)
+        if boilerplate is not None and 'description' in df.columns:
+            df['description'] = boilerplate.expand_column(df['description'])
+        records = df.to_dict(orient='records')
+
+    digest = hashlib.sha256()
+    with open(data_file, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return CatalogueIndex(records, digest.hexdigest()[:16], load_facets(facets_file, data_file))
+
+
+def _query_params(query_string):
+    params = {name: values[-1] for name, values in parse_qs(query_string).items()}
+    unknown = set(params) - {'date_from', 'date_to', 'number', 'tag', 'offset', 'limit'}
+    if unknown:
+        raise QueryError(f"unknown parameter(s): {', '.join(sorted(unknown))}")
+    try:
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise QueryError("offset and limit must be integers")
+    if offset < 0 or not 0 < limit <= MAX_PAGE_SIZE:
+        raise QueryError(f"offset must be >= 0 and limit between 1 and {MAX_PAGE_SIZE}")
+    return {
+        'date_from': parse_date(params['date_from']) if 'date_from' in params else None,
+        'date_to': parse_date(params['date_to']) if 'date_to' in params else None,
+        'number': parse_number(params['number']) if 'number' in params else None,
+        'tag': params['tag'] if 'tag' in params else None,
+        'offset': offset,
+        'limit': limit,
+    }
+
+
+def handle_request(catalogue, method, target, headers):
+    """Answer one request, returns (status, extra headers, body bytes)"""
+    if method not in ('GET', 'HEAD'):
+        return 405, {'Allow': 'GET, HEAD'}, b''
+    url = urlsplit(target)
+    path = url.path.rstrip('/')
+    # The answer only depends on the dataset and the request target
+    etag = '"{}"'.format(hashlib.sha256(f"{catalogue.version} {target}".encode('utf-8')).hexdigest()[:32])
+    cache_headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+    not_modified = etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]
+
+    try:
+        if path == '/lectures':
+            params = _query_params(url.query)
+            if not_modified:
+                return 304, cache_headers, b''
+            total, records = catalogue.query(**params)
+            payload = {'total': total, 'offset': params['offset'], 'limit': params['limit'], 'items': records}
+        elif path == '/tags':
+            if url.query:
+                raise QueryError("/tags takes no parameters")
+            if not_modified:
+                return 304, cache_headers, b''
+            payload = catalogue.tag_counts()
+        elif path == '/facets':
+            if url.query:
+                raise QueryError("/facets takes no parameters")
+            if not_modified:
+                return 304, cache_headers, b''
+            payload = catalogue.facets
+        elif path.startswith('/lectures/') and path[len('/lectures/'):].isdigit():
+            payload = catalogue.get(int(path[len('/lectures/'):]))
+            if payload is None:
+                return 404, {}, _json_body({'error': "no lecture with this order"})
+            if not_modified:
+                return 304, cache_headers, b''
+        else:
+            return 404, {}, _json_body({'error': "not found"})
+    except QueryError as e:
+        return 400, {}, _json_body({'error': str(e)})
+    return 200, cache_headers, _json_body(payload)
+
+
+def _json_body(payload):
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+
+async def _serve_connection(catalogue, reader, writer):
+    try:
+        while True:
+            try:
+                head = await reader.readuntil(b'\r\n\r\n')
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            except asyncio.LimitOverrunError:
+                await _write_response(writer, 400, {}, _json_body({'error': "request head too large"}), False, False)
+                return
+            request_line, *header_lines = head.decode('latin-1').split('\r\n')
+            try:
+                method, target, version = request_line.split(' ')
+            except ValueError:
+                await _write_response(writer, 400, {}, _json_body({'error': "malformed request line"}), False, False)
+                return
+            headers = {}
+            for line in header_lines:
+                name, _, value = line.partition(':')
+                if name:
+                    headers[name.strip().lower()] = value.strip()
+
+            keep_alive = (headers.get('connection', '').lower() != 'close'
+                          if version == 'HTTP/1.1' else headers.get('connection', '').lower() == 'keep-alive')
+            # No request takes a body (a POST gets 405), but its bytes mustn't be read as the next request
+            body_length = headers.get('content-length', '0')
+            if 'transfer-encoding' in headers or not body_length.isdigit() or int(body_length) > MAX_DISCARDED_BODY:
+                keep_alive = False
+            elif int(body_length):
+                try:
+                    await reader.readexactly(int(body_length))
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+            status, extra_headers, body = handle_request(catalogue, method, target, headers)
+            await _write_response(writer, status, extra_headers, body, method == 'HEAD', keep_alive)
+            if not keep_alive:
+                return
+    finally:
+        writer.close()
+
+
+async def _write_response(writer, status, extra_headers, body, head_only, keep_alive):
+    headers = {
+        'Content-Length': str(len(body)),
+        'Connection': 'keep-alive' if keep_alive else 'close',
+        **extra_headers,
+    }
+    if body:
+        headers['Content-Type'] = 'application/json; charset=utf-8'
+    head = f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n" + ''.join(
+        f"{name}: {value}\r\n" for name, value in headers.items()) + "\r\n"
+    writer.write(head.encode('latin-1') + (b'' if head_only else body))
+    await writer.drain()
+
+
+async def serve(catalogue, host='127.0.0.1', port=8080):
+    """Serve the catalogue until cancelled"""
+    server = await asyncio.start_server(
+        lambda reader, writer: _serve_connection(catalogue, reader, writer), host, port, limit=MAX_REQUEST_HEAD)
+    print(f"Serving {len(catalogue)} lectures on http://{host}:{port}/lectures")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the lecture catalogue over HTTP")
+    parser.add_argument('--input', default=INPUT_FILE, help="Final 4b dataset (an .ndjson file is read while it is written)")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on")
+    parser.add_argument('--port', type=int, default=8080, help="Port to listen on")
+    args = parser.parse_args()
+
+    input_dir = os.path.dirname(args.input)
+    catalogue = load_catalogue(args.input, os.path.join(input_dir, os.path.basename(BOILERPLATE_FILE)),
+                               os.path.join(input_dir, os.path.basename(FACETS_FILE)))
+    print(f"Indexed {len(catalogue.date_keys)} dated and {len(catalogue.number_keys)} numbered lectures")
+    try:
+        asyncio.run(serve(catalogue, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
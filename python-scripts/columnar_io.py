@@ -0,0 +1,93 @@
+"""Parquet intermediates and outputs (needs the optional pyarrow package).
+
+Unlike the pretty-printed JSON files, Parquet keeps column types: dates are
+stored as timestamps and lecture_num/part_num as integers. Files are read
+memory-mapped and only the requested columns are loaded, e.g. 4b can read
+just date_datetime, lecture_num and part_num to work out the order.
+
+Stages read whichever of an artifact's .json, .parquet and .ndjson files
+(see ndjson_stream.py) was written last.
+"""
+import json
+import os
+
+from lazy_import import lazy_module
+
+from ndjson_stream import ndjson_path, read_ndjson
+
+pd = lazy_module('pandas')
+
+OUTPUT_FORMATS = ('json', 'parquet', 'ndjson')
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet output needs pyarrow: pip install pyarrow") from None
+    return pyarrow
+
+
+def parquet_path(json_path):
+    """The .parquet sibling of a pipeline .json artifact"""
+    return os.path.splitext(json_path)[0] + '.parquet'
+
+
+def write_parquet(df, path):
+    """Write df to a Parquet file with typed date and lecture/part number columns"""
+    pyarrow = _pyarrow()
+    df = df.copy()
+    if 'date_datetime' in df.columns:
+        df['date_datetime'] = pd.to_datetime(df['date_datetime'])
+    for column in ('lecture_num', 'part_num'):
+        # Stage 4a already stores them as compact unsigned integers
+        if column in df.columns and not pd.api.types.is_integer_dtype(df[column]):
+            df[column] = df[column].astype('int64')
+
+    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+    pyarrow.parquet.write_table(table, path)
+    return path
+
+
+def read_parquet(path, columns=None):
+    """Memory-map a Parquet file and load only the given columns (all if None)"""
+    pyarrow = _pyarrow()
+    table = pyarrow.parquet.read_table(path, columns=columns, memory_map=True)
+    df = table.to_pandas()
+    # Text columns keep missing values as None, like frames loaded from JSON
+    for field in table.schema:
+        if pyarrow.types.is_string(field.type) or pyarrow.types.is_large_string(field.type):
+            df[field.name] = df[field.name].astype(object).where(df[field.name].notna(), None)
+    return df
+
+
+def stage_input_path(json_path):
+    """The file to read for a pipeline artifact: the newest of the JSON file and its Parquet and NDJSON siblings"""
+    # On equal mtimes the typed Parquet file wins, then NDJSON
+    candidates = [path for path in (parquet_path(json_path), ndjson_path(json_path), json_path)
+                  if os.path.exists(path)]
+    if not candidates:
+        return json_path
+    return max(candidates, key=os.path.getmtime)
+
+
+def newest_stage_input(json_paths):
+    """The artifact of json_paths written last (the first on equal mtimes), e.g. an optional stage's output or its input"""
+    existing = [(os.path.getmtime(stage_input_path(path)), -position, path)
+                for position, path in enumerate(json_paths) if os.path.exists(stage_input_path(path))]
+    return max(existing)[2] if existing else json_paths[-1]
+
+
+def load_stage_input(json_path, columns=None):
+    """Load a pipeline artifact from JSON or from its newer Parquet or NDJSON sibling"""
+    input_path = stage_input_path(json_path)
+    if input_path != json_path:
+        print(f"Reading {input_path}")
+        if input_path.endswith('.ndjson'):
+            return read_ndjson(input_path, columns)
+        return read_parquet(input_path, columns)
+
+    with open(json_path, 'r', encoding='utf-8') as file:
+        df = pd.DataFrame(json.load(file))
+    return df[columns] if columns is not None else df
@@ -0,0 +1,108 @@
+"""Boilerplate deduplication for the description column.
+
+Almost every description carries the same blocks, e.g.
+
+    ► Поддержать создание лекций:
+    Приватбанк: 4731 1856 1944 8878
+    Юмани: https://yoomoney.ru/to/4100115065109229
+
+A block is a paragraph starting with "►", up to the next blank line. With
+--compact-text each distinct block is stored once in a BoilerplateTable and
+replaced in the description by a short reference such as
+"[[boilerplate 0]]", so the frame (and the 4b output) hold every block once
+instead of once per video. expand() puts the blocks back.
+
+Backslashes and "[[" in the rest of the text are escaped with a backslash,
+so a description that happens to contain "[[boilerplate 1]]" itself comes
+back unchanged.
+"""
+import json
+import os
+import re
+
+# A "►" paragraph: the marker line plus every following non-blank line
+BLOCK_PATTERN = re.compile(r'^►[^\n]*(?:\n(?![^\S\n]*(?:\n|$))[^\n]*)*', re.MULTILINE)
+REFERENCE_FORMAT = '[[boilerplate {}]]'
+_ESCAPE_PATTERN = re.compile(r'\\|\[\[')
+# An escaped "\" or "[[", or a reference
+_EXPAND_PATTERN = re.compile(r'\\(\\|\[\[)|\[\[boilerplate (\d+)\]\]')
+
+
+def _escape(text):
+    return _ESCAPE_PATTERN.sub(lambda match: '\\' + match.group(0), text)
+
+
+class BoilerplateTable:
+    """Distinct boilerplate blocks, referenced from the descriptions by their index"""
+
+    def __init__(self, blocks=()):
+        self.blocks = list(blocks)
+        self._ids = {block: block_id for block_id, block in enumerate(self.blocks)}
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def _reference(self, block):
+        block_id = self._ids.get(block)
+        if block_id is None:
+            block_id = self._ids[block] = len(self.blocks)
+            self.blocks.append(block)
+        return REFERENCE_FORMAT.format(block_id)
+
+    def compact(self, text):
+        """Replace every boilerplate block in text by a reference"""
+        if not isinstance(text, str) or not ('►' in text or '[[' in text or '\\' in text):
+            return text
+        pieces = []
+        position = 0
+        for match in BLOCK_PATTERN.finditer(text):
+            pieces.append(_escape(text[position:match.start()]))
+            pieces.append(self._reference(match.group(0)))
+            position = match.end()
+        pieces.append(_escape(text[position:]))
+        return ''.join(pieces)
+
+    def _expand_match(self, match):
+        escaped, block_id = match.groups()
+        return escaped if escaped is not None else self.blocks[int(block_id)]
+
+    def expand(self, text):
+        """Put the referenced blocks back into a compacted text"""
+        if not isinstance(text, str) or not ('[[' in text or '\\' in text):
+            return text
+        return _EXPAND_PATTERN.sub(self._expand_match, text)
+
+    def compact_column(self, texts):
+        return [self.compact(text) for text in texts]
+
+    def expand_column(self, texts):
+        return [self.expand(text) for text in texts]
+
+    def save(self, path):
+        """Write the blocks as a JSON list, a block's reference number is its index"""
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(self.blocks, file, ensure_ascii=False, indent=4)
+        return path
+
+
+def compact_descriptions(df, table):
+    """Copy of df with the boilerplate blocks of "description" moved into table"""
+    df = df.copy()
+    df['description'] = table.compact_column(df['description'])
+    return df
+
+
+def expand_descriptions(df, table):
+    """Copy of df with the full descriptions restored"""
+    df = df.copy()
+    df['description'] = table.expand_column(df['description'])
+    return df
+
+
+def load_boilerplate(blocks_file, data_file):
+    """BoilerplateTable of a --compact-text output, None if data_file has the full descriptions"""
+    # The blocks are written right after the data file, a later plain run leaves an older blocks file behind
+    if not os.path.exists(blocks_file) or os.path.getmtime(blocks_file) < os.path.getmtime(data_file):
+        return None
+    with open(blocks_file, 'r', encoding='utf-8') as file:
+        return BoilerplateTable(json.load(file))
@@ -0,0 +1,115 @@
+"""Merge several overlapping scraper dumps into one set of videos.
+
+The channel is scraped repeatedly and from overlapping playlists, so the
+same video appears in many dumps. Given a directory or a glob pattern,
+merge_dumps streams every dump in a thread pool and keeps one record per
+video `id` in a dict as the records come in: a record replaces the kept
+one when its `date` is later, or equal and from a later dump (in file name
+order). Memory is bounded by the number of distinct videos, not by the
+size of all dumps together.
+
+The merged records keep the order in which their winning version appears
+in the dumps, so merging a single dump gives back its records in file
+order. Records without an `id` can't be matched and are all kept.
+"""
+import glob
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from json_stream import DEFAULT_CHUNK_SIZE, iter_record_chunks
+
+DEFAULT_READ_THREADS = 4
+# Fields merge_dumps needs, even when the caller drops them from the records
+KEY_FIELDS = ('id', 'date')
+
+_DONE = object()
+
+
+def is_dump_collection(source):
+    """True if source names several dumps: a directory or a glob pattern"""
+    return os.path.isdir(source) or any(char in source for char in '*?[')
+
+
+def dump_paths(source):
+    """Sorted dump files of a directory (its *.json files) or a glob pattern"""
+    pattern = os.path.join(source, '*.json') if os.path.isdir(source) else source
+    paths = sorted(path for path in glob.glob(pattern) if os.path.isfile(path))
+    if not paths:
+        raise FileNotFoundError(f"No dumps found for {source}")
+    return paths
+
+
+def scrape_time(value):
+    """Sortable timestamp of an Apify "date" such as "2024-11-12T10:13:26.000Z", None if missing or invalid"""
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def _read_dump(dump_index, path, chunk_size, drop_fields, chunks):
+    count = 0
+    for records in iter_record_chunks(path, chunk_size, drop_fields=drop_fields):
+        chunks.put((dump_index, count, records))
+        count += len(records)
+    return count
+
+
+def merge_dumps(paths, drop_fields=(), threads=DEFAULT_READ_THREADS, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream the dumps concurrently and return one record per video id.
+
+    drop_fields are removed while parsing, except for "id" and "date" which
+    are needed for the deduplication; the caller drops them afterwards.
+    """
+    drop_fields = [field for field in drop_fields if field not in KEY_FIELDS]
+    # Bounded, so readers can't run far ahead of the deduplication
+    chunks = queue.Queue(maxsize=2 * max(1, threads))
+    # id (or a unique key for records without one) -> ((scrape time, dump, position), record)
+    kept = {}
+    duplicates = 0
+
+    def consume(dump_index, start, records):
+        nonlocal duplicates
+        for offset, record in enumerate(records):
+            position = (dump_index, start + offset)
+            video_id = record.get('id')
+            key = video_id if video_id is not None else position
+            # Missing dates rank before any valid one
+            time_value = scrape_time(record.get('date'))
+            rank = (time_value is not None, time_value or 0.0, position)
+            previous = kept.get(key)
+            if previous is None:
+                kept[key] = (rank, record)
+                continue
+            duplicates += 1
+            if rank > previous[0]:
+                kept[key] = (rank, record)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(threads, len(paths)))) as pool:
+        remaining = len(paths)
+        futures = []
+        for dump_index, path in enumerate(paths):
+            future = pool.submit(_read_dump, dump_index, path, chunk_size, drop_fields, chunks)
+            # Signal the end of each dump, also when its reader failed
+            future.add_done_callback(lambda _: chunks.put(_DONE))
+            futures.append(future)
+
+        while remaining:
+            item = chunks.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            consume(*item)
+
+        counts = [future.result() for future in futures]  # re-raises a reader's error
+
+    for path, count in zip(paths, counts):
+        print(f"  {path}: {count} records")
+    print(f"Merged {sum(counts)} records from {len(paths)} dumps into {len(kept)} videos "
+          f"({duplicates} duplicates dropped)")
+    # Winning versions in the order they appear in the dumps
+    return [record for _, record in sorted(kept.values(), key=lambda item: item[0][2])]
@@ -0,0 +1,109 @@
+"""Constant-memory Excel export for the final dataset.
+
+DataFrame.to_excel builds openpyxl's full workbook object model, one Python
+cell object per value, before anything is written. In write-only mode
+openpyxl serialises every appended row straight to the sheet's XML on disk,
+so time and memory grow linearly with the rows and memory stays small,
+even for long description cells.
+
+The files hold the same cells as to_excel(index=False) writes: a plain
+header row of the column names, empty cells for missing values.
+
+The Excel file can also be written later from the 4b JSON, which is
+streamed record by record:
+
+Usage:
+    python excel_stream.py [--input ../output/4b_lectures_with_order.json] [--output FILE.xlsx]
+"""
+import argparse
+import math
+import os
+
+from json_stream import iter_records
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+openpyxl = lazy_module('openpyxl')
+pd = lazy_module('pandas')
+
+INPUT_FILE = '../output/4b_lectures_with_order.json'
+DEFAULT_SHEET_NAME = 'Sheet1'
+
+
+def new_workbook():
+    return openpyxl.Workbook(write_only=True)
+
+
+def add_sheet(workbook, title, columns):
+    """New sheet of a write-only workbook with its header row already written"""
+    sheet = workbook.create_sheet(title)
+    sheet.append([str(column) for column in columns])
+    return sheet
+
+
+def cell_value(value):
+    """A value openpyxl can write, None (an empty cell) for NaN, NaT and NA"""
+    if value is None or isinstance(value, (str, int)):
+        return value
+    if isinstance(value, float):
+        return None if math.isnan(value) else value
+    # Checked last, so plain JSON values don't load pandas
+    if value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if isinstance(value, np.generic):
+        return cell_value(value.item())
+    return value
+
+
+def append_row(sheet, values):
+    sheet.append([cell_value(value) for value in values])
+
+
+def add_frame_sheet(workbook, df, title=DEFAULT_SHEET_NAME):
+    sheet = add_sheet(workbook, title, df.columns)
+    for row in df.itertuples(index=False, name=None):
+        append_row(sheet, row)
+    return sheet
+
+
+def write_frame_excel(df, path, sheet_name=DEFAULT_SHEET_NAME, extra_sheets=()):
+    """Stream df to an .xlsx file, extra_sheets are (title, DataFrame) pairs written after it"""
+    workbook = new_workbook()
+    add_frame_sheet(workbook, df, sheet_name)
+    for title, extra_df in extra_sheets:
+        add_frame_sheet(workbook, extra_df, title)
+    workbook.save(path)
+    return path
+
+
+def write_records_excel(records, path, sheet_name=DEFAULT_SHEET_NAME):
+    """Stream dict records to an .xlsx file, the columns are the keys of the first record"""
+    workbook = new_workbook()
+    sheet = None
+    columns = []
+    for record in records:
+        if sheet is None:
+            columns = list(record)
+            sheet = add_sheet(workbook, sheet_name, columns)
+        append_row(sheet, [record.get(column) for column in columns])
+    if sheet is None:
+        add_sheet(workbook, sheet_name, columns)
+    workbook.save(path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the Excel file of a JSON dataset, streaming")
+    parser.add_argument('--input', default=INPUT_FILE, help="JSON array of records, e.g. the 4b output")
+    parser.add_argument('--output', help="Excel file (default: the input with .xlsx)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0] + '.xlsx'
+    write_records_excel(iter_records(args.input), output)
+    print(f"Saved to Excel: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Chunked external merge sort for record streams larger than memory.
+
+Each chunk of records is sorted in memory and written to a temporary run
+file, one JSON line of [key, record] per record. The runs are then merged
+with heapq.merge, which reads one line per run at a time, so memory is
+bounded by the chunk size and the number of runs.
+
+heapq.merge keeps runs in the order given for equal keys, and every chunk
+is sorted stably, so the result matches a stable in-memory sort.
+"""
+import heapq
+import json
+import os
+import tempfile
+
+
+def _write_run(keyed_records, run_dir, index):
+    run_file = os.path.join(run_dir, f'run_{index:05d}.jsonl')
+    with open(run_file, 'w', encoding='utf-8') as file:
+        for key, record in keyed_records:
+            file.write(json.dumps([key, record], ensure_ascii=False) + '\n')
+    return run_file
+
+
+def _iter_run(run_file):
+    with open(run_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            key, record = json.loads(line)
+            yield tuple(key), record
+
+
+def external_sort(chunks, sort_chunk, work_dir=None):
+    """Yield the records of all chunks in sorted order.
+
+    chunks is an iterable of record lists, sort_chunk(records) returns the
+    chunk's (key, record) pairs in sorted order. Keys must be JSON-serialisable
+    sequences whose tuples compare in the wanted order. Run files go to a
+    temporary directory inside work_dir (the system default if None).
+    """
+    with tempfile.TemporaryDirectory(dir=work_dir) as run_dir:
+        run_files = [_write_run(sort_chunk(records), run_dir, index) for index, records in enumerate(chunks)]
+        print(f"Merging {len(run_files)} sorted runs")
+        for _, record in heapq.merge(*map(_iter_run, run_files), key=lambda pair: pair[0]):
+            yield record
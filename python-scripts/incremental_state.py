@@ -0,0 +1,114 @@
+"""Persistent per-video state for incremental pipeline runs.
+
+A local SQLite database keyed on the YouTube video id keeps, for every video
+of the previous run, a hash of its title and description, its position in
+the chronological order and its processed (stage 4a) row. The next run only
+sends new or edited videos through stages 2-4a and merges them into the
+stored order. The catalogue's facet counts (catalogue_facets.py) are kept
+alongside, so the next run only has to count the rows that changed.
+"""
+import hashlib
+import json
+import sqlite3
+
+from catalogue_facets import FacetCounts
+from lazy_import import lazy_module
+
+pd = lazy_module('pandas')
+
+# Columns of the stage 4a output that are stored for every video
+STATE_COLUMNS = ['title', 'description', 'number', 'date', 'date_standard',
+                 'date_datetime', 'lecture_num', 'part_num']
+
+
+def content_hash(title, description):
+    """Hash of the fields the pipeline derives everything else from"""
+    text = f"{title if isinstance(title, str) else ''}\0{description if isinstance(description, str) else ''}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def content_hashes(df):
+    return [content_hash(title, description) for title, description in zip(df['title'], df['description'])]
+
+
+class VideoStateStore:
+    """SQLite table of processed videos: id -> content hash, sort position and stage 4a row"""
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS videos (
+                   id TEXT PRIMARY KEY,
+                   content_hash TEXT NOT NULL,
+                   sort_position INTEGER NOT NULL,
+                   record TEXT NOT NULL
+               )""")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS facets (counts TEXT NOT NULL)")
+
+    def close(self):
+        self.connection.close()
+
+    def load_hashes(self):
+        """{video id: content hash} of every stored video"""
+        return dict(self.connection.execute("SELECT id, content_hash FROM videos"))
+
+    def load_facets(self):
+        """FacetCounts of the stored videos, None if none were stored or they don't match the videos"""
+        row = self.connection.execute("SELECT counts FROM facets").fetchone()
+        if row is None:
+            return None
+        facets = FacetCounts(json.loads(row[0]))
+        (videos,) = self.connection.execute("SELECT COUNT(*) FROM videos").fetchone()
+        return facets if facets.total == videos else None
+
+    def load_records(self, ids=None):
+        """Stored rows as dicts in chronological order, with "id" and "content_hash" keys.
+
+        With ids, only those videos are loaded. Values are as stored:
+        date_datetime as a "YYYY-MM-DD HH:MM:SS" string, None for missing values.
+        """
+        rows = self.connection.execute("SELECT id, content_hash, record FROM videos ORDER BY sort_position")
+        wanted = set(ids) if ids is not None else None
+        records = []
+        for video_id, video_hash, record in rows:
+            if wanted is None or video_id in wanted:
+                records.append({'id': video_id, 'content_hash': video_hash, **json.loads(record)})
+        return records
+
+    def load_rows(self, ids=None):
+        """Stored rows in chronological order, with "id" and "content_hash" columns.
+
+        With ids, only those videos are loaded.
+        """
+        # object columns keep missing numbers/dates as None, like a full run
+        df = pd.DataFrame(self.load_records(ids), columns=['id', 'content_hash'] + STATE_COLUMNS, dtype=object)
+        df['date_datetime'] = pd.to_datetime(df['date_datetime'], format='%Y-%m-%d %H:%M:%S')
+        df['lecture_num'] = df['lecture_num'].astype('int64')
+        df['part_num'] = df['part_num'].astype('int64')
+        return df
+
+    def replace_all(self, df_sorted, facets=None):
+        """Store df_sorted (stage 4a columns plus "id" and "content_hash") as the new state, in its order"""
+        records = df_sorted[STATE_COLUMNS].copy()
+        records['date_datetime'] = pd.to_datetime(records['date_datetime']).dt.strftime('%Y-%m-%d %H:%M:%S')
+        records['lecture_num'] = records['lecture_num'].astype('int64')
+        records['part_num'] = records['part_num'].astype('int64')
+        records = records.astype(object).where(records.notna(), None)
+        self.replace_records(({'id': video_id, 'content_hash': video_hash, **record}
+                              for video_id, video_hash, record in zip(
+                                  df_sorted['id'], df_sorted['content_hash'], records.to_dict(orient='records'))),
+                             facets)
+
+    def replace_records(self, records, facets=None):
+        """Store records (dicts as returned by load_records) and their FacetCounts as the new state, in their order"""
+        rows = ((record['id'], record['content_hash'], position,
+                 json.dumps({column: record[column] for column in STATE_COLUMNS}, ensure_ascii=False))
+                for position, record in enumerate(records))
+        with self.connection:
+            self.connection.execute("DELETE FROM videos")
+            self.connection.executemany("INSERT INTO videos VALUES (?, ?, ?, ?)", rows)
+            self.connection.execute("DELETE FROM facets")
+            if facets is not None:
+                self.connection.execute("INSERT INTO facets VALUES (?)",
+                                        (json.dumps(facets.to_dict(), ensure_ascii=False),))
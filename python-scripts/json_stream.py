@@ -0,0 +1,85 @@
+"""Incremental reader for large JSON array dumps such as the Apify scraper output.
+
+The file is read in fixed-size blocks and every array element is decoded on
+its own, so memory is bounded by the block size plus one chunk of records
+instead of by the size of the whole file.
+"""
+import json
+
+READ_BLOCK_SIZE = 1024 * 1024  # characters per read
+DEFAULT_CHUNK_SIZE = 10000     # records per chunk
+
+_WHITESPACE = ' \t\n\r'
+
+
+def iter_records(input_file, drop_fields=(), block_size=READ_BLOCK_SIZE):
+    """Yield the objects of a top-level JSON array one at a time.
+
+    Keys listed in drop_fields are removed from each record as soon as it is
+    decoded, so unwanted fields never accumulate in memory.
+    """
+    drop_fields = frozenset(drop_fields)
+    decoder = json.JSONDecoder()
+
+    with open(input_file, 'r', encoding='utf-8') as file:
+        buffer = ''
+        pos = 0
+        eof = False
+        in_array = False
+
+        while True:
+            # Skip whitespace and separators between records
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE + ',':
+                if buffer[pos] == ',' and not in_array:
+                    raise ValueError(f"{input_file}: unexpected ',' before the opening '['")
+                pos += 1
+
+            if pos == len(buffer):
+                if eof:
+                    raise ValueError(f"{input_file}: unexpected end of file, missing ']'")
+                buffer = file.read(block_size)
+                pos = 0
+                eof = not buffer
+                continue
+
+            if not in_array:
+                if buffer[pos] != '[':
+                    raise ValueError(f"{input_file}: expected a JSON array of records")
+                in_array = True
+                pos += 1
+                continue
+
+            if buffer[pos] == ']':
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # The record continues in the next block: keep the unread tail and read more
+                more = file.read(block_size)
+                buffer = buffer[pos:] + more
+                pos = 0
+                eof = not more
+                continue
+
+            if not isinstance(record, dict):
+                raise ValueError(f"{input_file}: expected objects in the array, got {type(record).__name__}")
+
+            if drop_fields:
+                record = {key: value for key, value in record.items() if key not in drop_fields}
+            yield record
+            pos = end
+
+
+def iter_record_chunks(input_file, chunk_size=DEFAULT_CHUNK_SIZE, drop_fields=()):
+    """Group iter_records output into lists of at most chunk_size records"""
+    chunk = []
+    for record in iter_records(input_file, drop_fields=drop_fields):
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
@@ -0,0 +1,30 @@
+"""Deferred imports of the heavy dependencies.
+
+Importing pandas takes over half a second, numpy and openpyxl a few hundred
+milliseconds more; for a run over a few dozen videos that is most of the
+run. lazy_module returns the module object right away but only executes the
+module on first attribute access, so
+
+    pd = lazy_module('pandas')
+
+costs nothing until a function actually calls pd.something. Modules used by
+the lightweight path of pipeline_cli.py import pandas, numpy and openpyxl
+this way.
+"""
+import importlib.util
+import sys
+
+
+def lazy_module(name):
+    """The module `name`, loaded on first attribute access (or the module itself if already imported)"""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
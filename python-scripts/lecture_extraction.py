@@ -0,0 +1,66 @@
+"""Lecture number / date extraction engine used by stage 2.
+
+The three description formats are compiled once:
+
+    © Лекцию №126 (часть 2) Сергей Бугаев прочитал 16 мая 2021 года   (multi-part)
+    © Лекцию №126 Сергей Бугаев прочитал 16 мая 2021 года             (single)
+    Лекция прочитана 16 мая 2021 года                                  (date only)
+
+Each description is searched row by row. The numbered forms start with a
+"©", which has no case, so re skips to it without a case-insensitive scan;
+only the date-only form scans the whole text. Column-wise str.extract
+passes, with or without a case-insensitive "лекци"/"прочита" prefilter,
+were slower than this on both the sample and the synthetic dumps (see
+benchmark_extraction.py): the scan costs the same, and pandas adds to it.
+"""
+import math
+import re
+
+from lazy_import import lazy_module
+
+pd = lazy_module('pandas')
+
+_FLAGS = re.IGNORECASE | re.DOTALL
+
+_NUMBERED_PREFIX = r'©\s*Лекцию\s+№\s*'
+# Pattern 1: "© Лекцию №X (часть Y) Сергей Бугаев прочитал DATE года"
+_MULTI_PART = r'(?P<multi_number>[^(]*?)\s*\(часть\s*(?P<multi_part>[^)]*?)\)\s*Сергей\s+Бугаев\s+прочитал\s+(?P<multi_date>.*?)\s+года'
+# Pattern 2: "© Лекцию №X Сергей Бугаев прочитал DATE года" (without части)
+_SINGLE = r'(?P<single_number>[^С]*?)\s*Сергей\s+Бугаев\s+прочитал\s+(?P<single_date>.*?)\s+года'
+# Pattern 3: "Лекция прочитана DATE года" (no number, just date)
+_DATE_ONLY = r'Лекция\s+прочитана\s+(?P<date_only_date>.*?)\s+года'
+
+MULTI_PART_PATTERN = re.compile(_NUMBERED_PREFIX + _MULTI_PART, _FLAGS)
+SINGLE_PATTERN = re.compile(_NUMBERED_PREFIX + _SINGLE, _FLAGS)
+DATE_ONLY_PATTERN = re.compile(_DATE_ONLY, _FLAGS)
+
+
+def extract_lecture_info(description):
+    """Return (number, date) for a single description, number is "X-Y" for multi-part lectures"""
+    # None and NaN are checked without pandas, which the lite pipeline never imports
+    if description is None or isinstance(description, float) and math.isnan(description):
+        return None, None
+    if not isinstance(description, str) and pd.isna(description):
+        return None, None
+
+    match1 = MULTI_PART_PATTERN.search(description)
+    if match1:
+        # Combine lecture number and part number in X-Y format
+        return f"{match1.group(1).strip()}-{match1.group(2).strip()}", match1.group(3).strip()
+
+    match2 = SINGLE_PATTERN.search(description)
+    if match2:
+        return match2.group(1).strip(), match2.group(2).strip()
+
+    match3 = DATE_ONLY_PATTERN.search(description)
+    if match3:
+        return None, match3.group(1).strip()
+
+    return None, None
+
+
+def extract_lecture_columns(descriptions):
+    """extract_lecture_info over a column: returns a DataFrame with "number" and "date" columns"""
+    descriptions = pd.Series(descriptions, dtype=object)
+    lecture_info = [extract_lecture_info(description) for description in descriptions]
+    return pd.DataFrame(lecture_info, columns=['number', 'date'], index=descriptions.index, dtype=object)
@@ -0,0 +1,250 @@
+"""Pure-Python run of stages 1 → 4b for small batches.
+
+For a few dozen videos, importing pandas, numpy and openpyxl takes longer
+than the work itself. This path runs the stage logic on plain dicts with
+the per-row functions the stages are built from, and never imports pandas
+or numpy (openpyxl is only loaded to write the Excel file):
+
+- 1: the dump is streamed without stage 1's unused columns (json_stream.py,
+     or dump_merge.py for several dumps)
+- 2: lecture_extraction.extract_lecture_info
+- 3b: DD/MM/YYYY dates with strptime, the others with
+      russian_dates.convert_russian_date and the same date cache
+- 4a: stage 4a's extract_lecture_part
+- 4b: stage 4b's sort order, the records are written by the writers of the
+      external sort and excel_stream.py
+
+The 4b files are the same as run_pipeline.py writes. With a state database
+the run is incremental like run_pipeline.py --state-db, on the same
+database, so the two can take turns.
+
+pipeline_cli.py uses this path when at most LITE_MAX_ROWS rows have to go
+through stages 2-4a.
+"""
+import importlib
+import os
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+from catalogue_facets import FacetCounts
+from dump_merge import dump_paths, is_dump_collection, merge_dumps
+from excel_stream import write_records_excel
+from incremental_state import VideoStateStore, content_hash
+from json_stream import iter_records
+from lecture_extraction import extract_lecture_info
+from pipeline_metrics import RunMetrics, rate
+from russian_dates import DateCache, convert_russian_date, date_format, new_conversion_stats
+
+# Stage modules start with a digit, so they can't be imported with a plain import statement
+stage1 = importlib.import_module('1_extract_rename_columns')
+stage4a = importlib.import_module('4a_prepare_sorting')
+stage4b = importlib.import_module('4b_create_chronological_order')
+
+LITE_MAX_ROWS = 1000
+
+STORED_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def read_records(input_file, keep_columns=()):
+    """Stage 1: the dump's records without the unused columns, "text" renamed to "description" """
+    drop_fields = [column for column in stage1.COLUMNS_TO_DROP if column not in keep_columns]
+    if is_dump_collection(input_file):
+        paths = dump_paths(input_file)
+        print(f"Merging {len(paths)} dumps matching {input_file}")
+        # merge_dumps keeps "id" and "date" for the deduplication
+        records = merge_dumps(paths, drop_fields)
+    else:
+        records = iter_records(input_file, drop_fields=drop_fields)
+    return [{('description' if column == 'text' else column): value
+             for column, value in record.items() if column not in drop_fields}
+            for record in records]
+
+
+def latest_per_id(records):
+    """One record per video id, the last one in the dump, like drop_duplicates(subset='id', keep='last')"""
+    seen = set()
+    latest = []
+    for record in reversed(records):
+        if record.get('id') not in seen:
+            seen.add(record.get('id'))
+            latest.append(record)
+    latest.reverse()
+    return latest
+
+
+def extract_records(records):
+    """Stage 2: add "number" and "date" from each description"""
+    for record in records:
+        record['number'], record['date'] = extract_lecture_info(record.get('description'))
+
+
+def convert_record_dates(records, stats, cache):
+    """Stage 3b: add "date_standard", DD/MM/YYYY or None"""
+    for record in records:
+        date_str = record.get('date')
+        if isinstance(date_str, str) and date_format(date_str) == 'dd_mm_yyyy':
+            stats['dd_mm_yyyy'] += 1
+            try:
+                record['date_standard'] = datetime.strptime(date_str.strip(), '%d/%m/%Y').strftime('%d/%m/%Y')
+            except ValueError:
+                # e.g. "31/02/2021"
+                stats['failed'] += 1
+                record['date_standard'] = None
+        else:
+            record['date_standard'] = convert_russian_date(date_str, stats, cache)[1]
+
+
+def prepare_records(records):
+    """Stage 4a: add the "date_datetime", "lecture_num" and "part_num" sort keys"""
+    for record in records:
+        date_standard = record.get('date_standard')
+        record['date_datetime'] = datetime.strptime(date_standard, '%d/%m/%Y') if date_standard else None
+        record['lecture_num'], record['part_num'] = stage4a.extract_lecture_part(record.get('number'))
+
+
+def sort_key(record):
+    """Stage 4b's order: date (missing dates last), lecture number, part number"""
+    date = record['date_datetime']
+    return date is None, date or datetime.min, record['lecture_num'], record['part_num']
+
+
+def merge_sorted(sorted_records, new_records):
+    """stage4b.merge_into_sorted for records: on equal keys the already sorted records come first"""
+    existing_keys = [sort_key(record) for record in sorted_records]
+    merged = []
+    start = 0
+    for record in sorted(new_records, key=sort_key):
+        position = bisect_right(existing_keys, sort_key(record))
+        merged.extend(sorted_records[start:position])
+        merged.append(record)
+        start = position
+    merged.extend(sorted_records[start:])
+    return merged
+
+
+def _stored_record(record):
+    """A processed record in the form VideoStateStore keeps"""
+    date = record['date_datetime']
+    return {**record, 'date_datetime': date.strftime(STORED_DATETIME_FORMAT) if date is not None else None}
+
+
+def _loaded_record(record):
+    date = record['date_datetime']
+    return {**record, 'date_datetime': datetime.strptime(date, STORED_DATETIME_FORMAT) if date else None}
+
+
+def save_results(records, output_dir, excel=True, drop_columns=(), facets=None):
+    """Write the 4b JSON (and Excel) files of the sorted records and their facet counts, returns the file paths"""
+    # Every record gets every column, like the rows of a DataFrame
+    columns = list(dict.fromkeys(column for record in records for column in record if column not in drop_columns))
+    final_records = [stage4b.final_record({column: record.get(column) for column in columns}, order)
+                     for order, record in enumerate(records, start=1)]
+
+    output_json = os.path.join(output_dir, '4b_lectures_with_order.json')
+    stage4b.write_json_array(final_records, output_json)
+    print(f"Final data saved to: {output_json}")
+    output_files = [output_json]
+    if excel:
+        output_excel = write_records_excel(final_records, os.path.join(output_dir, '4b_lectures_with_order.xlsx'))
+        print(f"Also saved to Excel: {output_excel}")
+        output_files.append(output_excel)
+    if facets is not None:
+        output_files.append(stage4b.save_facets(facets, output_dir))
+    return output_files
+
+
+def run_lite(input_file=stage1.INPUT_FILE, output_dir=stage1.OUTPUT_DIR, state_db=None, date_cache_file=None,
+             excel=True, max_rows=None, **run_info):
+    """Run stages 1 → 4b without pandas, returns the number of lectures written.
+
+    With state_db only new or edited videos go through stages 2-4a (see
+    run_pipeline.run_incremental). If more than max_rows rows would, nothing
+    is written and None is returned, so the caller can use the pandas
+    runner instead. run_info is added to the metrics record.
+    """
+    start_time = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    metrics = RunMetrics('lite' if state_db is None else 'lite incremental', input_file=input_file, **run_info)
+
+    stage_start = time.perf_counter()
+    records = read_records(input_file, keep_columns=['id'] if state_db is not None else ())
+    metrics.add_stage('1 load + clean', len(records), time.perf_counter() - stage_start)
+    print(f"Stage 1: {len(records)} videos in {input_file}")
+
+    store = None
+    facets = None
+    sorted_records = []
+    new_records = records
+    if state_db is not None:
+        # A video scraped twice in the same dump is processed once, the later record wins
+        records = latest_per_id(records)
+        for record in records:
+            record['content_hash'] = content_hash(record.get('title'), record.get('description'))
+        store = VideoStateStore(state_db)
+        known_hashes = store.load_hashes()
+        new_records = [record for record in records if known_hashes.get(record['id']) != record['content_hash']]
+        unchanged_ids = {record['id'] for record in records
+                         if known_hashes.get(record['id']) == record['content_hash']}
+        removed = len(set(known_hashes) - {record['id'] for record in records})
+        print(f"New or edited: {len(new_records)}, unchanged: {len(unchanged_ids)}, no longer in dump: {removed}")
+        metrics.record.update(new_or_edited=len(new_records), unchanged=len(unchanged_ids), removed=removed)
+
+    if max_rows is not None and len(new_records) > max_rows:
+        print(f"{len(new_records)} rows to process, more than the lightweight path's {max_rows}")
+        if store is not None:
+            store.close()
+        return None
+
+    try:
+        if store is not None:
+            # Rows of the previous run that are still valid, already in chronological order
+            sorted_records = [_loaded_record(record) for record in store.load_records(unchanged_ids)]
+            # The stored facet counts without the old rows of the edited and removed videos
+            facets = store.load_facets()
+            if facets is not None:
+                facets.add_records(store.load_records(set(known_hashes) - unchanged_ids), sign=-1)
+
+        with metrics.stage('2 extract', len(new_records)) as counts:
+            extract_records(new_records)
+            with_number = sum(record['number'] is not None for record in new_records)
+            with_date = sum(record['date'] is not None for record in new_records)
+            counts.update(with_number=with_number, with_date=with_date, extraction_rate=rate(
+                sum(record['number'] is not None or record['date'] is not None for record in new_records),
+                len(new_records)))
+        print(f"Stage 2: {with_number} with a lecture number, {with_date} with a date")
+
+        date_stats = new_conversion_stats()
+        date_cache = DateCache(path=date_cache_file)
+        with metrics.stage('3b convert', len(new_records)) as counts:
+            convert_record_dates(new_records, date_stats, date_cache)
+            converted = sum(record['date_standard'] is not None for record in new_records)
+            counts.update({'dates': with_date, 'converted': converted, 'failed': with_date - converted,
+                           'conversion_rate': rate(converted, with_date), **date_stats})
+        date_cache.save()
+        print(f"Stage 3b: {converted} of {with_date} dates converted")
+
+        with metrics.stage('4a prepare', len(new_records)) as counts:
+            prepare_records(new_records)
+            counts.update(valid_dates=converted, with_number=with_number)
+
+        with metrics.stage('4b merge' if store is not None else '4b order', len(new_records)):
+            sorted_records = merge_sorted(sorted_records, new_records)
+        print(f"Stage 4b: {len(sorted_records)} lectures in chronological order")
+        if facets is None:
+            facets = FacetCounts()
+            facets.add_records(sorted_records)
+        else:
+            facets.add_records(new_records)
+
+        if store is not None:
+            store.replace_records((_stored_record(record) for record in sorted_records), facets)
+    finally:
+        if store is not None:
+            store.close()
+
+    with metrics.stage('4b save', len(sorted_records)):
+        save_results(sorted_records, output_dir, excel, drop_columns=('id', 'content_hash'), facets=facets)
+    print(f"Metrics appended to: {metrics.save(output_dir)}")
+    print(f"Lightweight run finished in {time.perf_counter() - start_time:.2f}s")
+    return len(sorted_records)
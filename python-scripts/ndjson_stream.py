@@ -0,0 +1,129 @@
+"""Newline-delimited JSON artifacts, written row by row from a frame's columns.
+
+With --format ndjson every artifact is written as one compact JSON object
+per line (.ndjson) instead of an indented array. Rows are encoded straight
+from the DataFrame's columns, ROWS_PER_WRITE rows at a time, so no list of
+dicts of the whole frame is built and a consumer can handle every line on
+its own.
+
+orjson encodes the lines when it is installed (several times faster than
+the standard library), json otherwise; both write the same records.
+Missing values (None, NaN, NaT) are written as null, datetimes as
+"YYYY-MM-DD HH:MM:SS" like in the 4a JSON file.
+
+A file is written as <name>.ndjson.part and renamed when it is complete.
+iter_ndjson follows a .part file while it grows, so a loader can start
+ingesting the 4b output before the pipeline has finished writing it:
+
+    for record in iter_ndjson('../output/4b_lectures_with_order.ndjson'):
+        ...
+"""
+import contextlib
+import json
+import os
+import time
+
+from lazy_import import lazy_module
+
+pd = lazy_module('pandas')
+
+try:
+    import orjson
+except ImportError:  # optional, the standard library encoder is used instead
+    orjson = None
+
+NDJSON_BACKENDS = ('auto', 'json', 'orjson')
+ROWS_PER_WRITE = 10000
+PART_SUFFIX = '.part'
+FOLLOW_POLL_SECONDS = 0.2
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def ndjson_path(json_path):
+    """The .ndjson sibling of a pipeline .json artifact"""
+    return os.path.splitext(json_path)[0] + '.ndjson'
+
+
+def record_encoder(backend='auto'):
+    """Function encoding one record as a line of UTF-8 bytes (without the newline)"""
+    if backend not in NDJSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend {backend!r}, expected one of {', '.join(NDJSON_BACKENDS)}")
+    if backend == 'orjson' or (backend == 'auto' and orjson is not None):
+        if orjson is None:
+            raise ImportError("The orjson backend needs orjson: pip install orjson")
+        return orjson.dumps
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    return lambda record: encoder.encode(record).encode('utf-8')
+
+
+def _column_values(column):
+    """A column as a list of JSON-ready Python values"""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        column = column.dt.strftime(DATETIME_FORMAT)
+    return column.astype(object).where(column.notna(), None).tolist()
+
+
+def write_ndjson(df, path, backend='auto', rows_per_write=ROWS_PER_WRITE):
+    """Write df to path as NDJSON, one row per line, returns path"""
+    encode = record_encoder(backend)
+    names = [str(column) for column in df.columns]
+    temp_path = path + PART_SUFFIX
+    try:
+        with open(temp_path, 'wb') as file:
+            for start in range(0, len(df), rows_per_write):
+                chunk = df.iloc[start:start + rows_per_write]
+                columns = [_column_values(chunk[column]) for column in df.columns]
+                file.write(b''.join(encode(dict(zip(names, row))) + b'\n' for row in zip(*columns)))
+                # Followers see every finished chunk right away
+                file.flush()
+    except BaseException:
+        # iter_ndjson stops following once the .part file is gone; it is missing if open() failed
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+    return path
+
+
+def _decode(line):
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def iter_ndjson(path, follow=True, poll_seconds=FOLLOW_POLL_SECONDS):
+    """Yield the records of an NDJSON file.
+
+    If only path's .part file exists (it is still being written) and follow
+    is set, the records are yielded as they are written, until the writer
+    renames the file.
+    """
+    part_path = path + PART_SUFFIX
+    growing = follow and not os.path.exists(path) and os.path.exists(part_path)
+    with open(part_path if growing else path, 'rb') as file:
+        pending = b''
+        while True:
+            line = file.readline()
+            if line.endswith(b'\n'):
+                line, pending = pending + line, b''
+                if line.strip():
+                    yield _decode(line)
+                continue
+
+            # End of what has been written so far, possibly in the middle of a line
+            pending += line
+            if not growing:
+                break
+            if os.path.exists(part_path):
+                time.sleep(poll_seconds)
+            elif os.path.exists(path):
+                # Renamed: the open file is complete, read the rest
+                growing = False
+            else:
+                raise RuntimeError(f"{part_path} was removed before it was complete")
+        if pending.strip():
+            yield _decode(pending)
+
+
+def read_ndjson(path, columns=None):
+    """Load an NDJSON file into a DataFrame, only the given columns if set"""
+    df = pd.DataFrame(list(iter_ndjson(path, follow=False)))
+    return df[columns] if columns is not None else df
@@ -0,0 +1,199 @@
+"""Near-duplicate lectures with MinHash signatures and locality-sensitive hashing.
+
+The channel re-uploads lectures under slightly different titles and
+descriptions, and the parts of a multi-part lecture often share most of
+their description. Comparing every pair of rows is O(n²); instead
+
+1. each row's title + description (without the "►" boilerplate blocks every
+   video carries, see compact_text.py) is cut into overlapping word
+   SHINGLE_WORDS-grams, each packed into one 64-bit number,
+2. NUM_HASHES min-hashes of a row's shingles form its signature, the share
+   of equal positions in two signatures estimates the Jaccard similarity of
+   the two shingle sets,
+3. the signatures are cut into BANDS bands of ROWS_PER_BAND values; rows
+   with an identical band land in the same bucket and become candidates,
+   so a pair with similarity s is found with probability
+   1 - (1 - s^ROWS_PER_BAND)^BANDS (over 99.9% for s = 0.7, 1.3% for s = 0.2),
+4. candidates with an estimated similarity of at least the threshold are
+   joined into clusters with a union-find.
+
+Apart from splitting the texts into words, every step is numpy over all
+rows at once. Within a bucket the rows are compared with the bucket's first
+row, then the rows that weren't similar with their first row, at most
+BUCKET_PROBES times, so the work grows about linearly with the number of
+rows. Every row gets a cluster id, numbered in order of the cluster's first
+row; a row without near-duplicates is a cluster of its own.
+"""
+import re
+
+from compact_text import BLOCK_PATTERN
+from lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+SHINGLE_WORDS = 3
+NUM_HASHES = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_HASHES // BANDS
+DEFAULT_THRESHOLD = 0.7
+# Shingles per numpy batch of the signatures, the batch takes NUM_HASHES * 8 bytes per shingle
+SHINGLES_PER_BATCH = 20000
+# Comparison rounds per band; huge buckets of templated descriptions stay
+# linear, their remaining pairs still meet in other bands
+BUCKET_PROBES = 8
+SEED = 1
+
+_REFERENCE_PATTERN = re.compile(r'\[\[boilerplate \d+\]\]')
+_WORD_PATTERN = re.compile(r'\w+')
+# Odd multipliers combining the word ids of a shingle
+_SHINGLE_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9)[:SHINGLE_WORDS]
+
+
+def text_words(title, description):
+    """The lower-cased words of a title and description, boilerplate left out"""
+    text = ' '.join(value for value in (title, description) if isinstance(value, str))
+    # Blocks of full descriptions and references of compacted ones (--compact-text)
+    text = _REFERENCE_PATTERN.sub(' ', BLOCK_PATTERN.sub(' ', text))
+    return _WORD_PATTERN.findall(text.lower())
+
+
+def shingle_keys(word_lists):
+    """64-bit keys of every row's word shingles, returns (keys, shingles per row).
+
+    The keys of a row are consecutive, rows of fewer than SHINGLE_WORDS
+    words make one shorter shingle, rows without words none.
+    """
+    vocabulary = {}
+    lengths = []
+    ids = []
+    for words in word_lists:
+        # Word ids from 1, 0 pads short rows to one full shingle
+        row_ids = [vocabulary.setdefault(word, len(vocabulary) + 1) for word in words]
+        if 0 < len(row_ids) < SHINGLE_WORDS:
+            row_ids += [0] * (SHINGLE_WORDS - len(row_ids))
+        ids.extend(row_ids)
+        lengths.append(len(row_ids))
+
+    ids = np.array(ids, dtype=np.uint64)
+    lengths = np.array(lengths, dtype=np.int64)
+    counts = np.maximum(lengths - SHINGLE_WORDS + 1, 0)
+    starts = np.cumsum(lengths) - lengths
+    # Every shingle start that doesn't run into the next row
+    position_in_row = np.arange(len(ids)) - np.repeat(starts, lengths)
+    valid = (position_in_row < np.repeat(counts, lengths))[:max(len(ids) - SHINGLE_WORDS + 1, 0)]
+    keys = np.zeros(len(valid), dtype=np.uint64)
+    for offset, multiplier in enumerate(_SHINGLE_MULTIPLIERS):
+        # uint64 arithmetic wraps around
+        keys += ids[offset:offset + len(valid)] * np.uint64(multiplier)
+    return keys[valid], counts
+
+
+def _hash_functions(num_hashes=NUM_HASHES, seed=SEED):
+    """Odd multipliers and offsets of the multiply-shift hashes (a * x + b) mod 2^64 >> 32"""
+    rng = np.random.default_rng(seed)
+    return (rng.integers(0, 1 << 64, num_hashes, dtype=np.uint64, endpoint=False) | np.uint64(1),
+            rng.integers(0, 1 << 64, num_hashes, dtype=np.uint64, endpoint=False))
+
+
+def minhash_signatures(keys, counts, num_hashes=NUM_HASHES):
+    """(rows, num_hashes) uint32 signatures of shingle_keys' output, zeros for rows without shingles"""
+    a, b = _hash_functions(num_hashes)
+    a, b = a[:, None], b[:, None]
+    signatures = np.zeros((len(counts), num_hashes), dtype=np.uint32)
+    rows = np.flatnonzero(counts)
+    key_ends = np.cumsum(counts[rows])
+    key_starts = key_ends - counts[rows]
+    first = 0
+    while first < len(rows):
+        # Whole rows, as many as fit into one batch but at least one
+        last = max(int(np.searchsorted(key_ends, key_starts[first] + SHINGLES_PER_BATCH, side='right')), first + 1)
+        batch = keys[key_starts[first]:key_ends[last - 1]]
+        permuted = np.multiply(a, batch, out=np.empty((num_hashes, len(batch)), dtype=np.uint64))
+        permuted += b
+        offsets = key_starts[first:last] - key_starts[first]
+        # The top 32 bits of the minimum are the minimum of the top 32 bits
+        signatures[rows[first:last]] = (np.minimum.reduceat(permuted, offsets, axis=1) >> np.uint64(32)).T
+        first = last
+    return signatures
+
+
+class _UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, item):
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    def union(self, first, second):
+        first, second = self.find(first), self.find(second)
+        if first != second:
+            # The smaller row number stays the root
+            self.parent[max(first, second)] = min(first, second)
+
+
+def _join_similar_rows(signatures, rows, threshold, clusters, bands=BANDS):
+    """Join the rows sharing a bucket of a band if similar enough, returns the number of comparisons"""
+    rows_per_band = signatures.shape[1] // bands
+    min_equal = threshold * signatures.shape[1]
+    comparisons = 0
+    for band in range(bands):
+        values = np.ascontiguousarray(signatures[rows, band * rows_per_band:(band + 1) * rows_per_band])
+        keys = values.view(np.dtype((np.void, values.dtype.itemsize * rows_per_band))).ravel()
+        _, buckets, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+        buckets = buckets.ravel()
+        shared = sizes[buckets] > 1
+        band_rows, buckets = rows[shared], buckets[shared]
+        # One row per cluster already found in a bucket (by an earlier band)
+        labels = np.array([clusters.find(row) for row in band_rows.tolist()], dtype=np.int64)
+        order = np.lexsort((labels, buckets))
+        band_rows, buckets, labels = band_rows[order], buckets[order], labels[order]
+        distinct = np.ones(len(band_rows), dtype=bool)
+        distinct[1:] = (buckets[1:] != buckets[:-1]) | (labels[1:] != labels[:-1])
+        band_rows, buckets = band_rows[distinct], buckets[distinct]
+
+        for _ in range(BUCKET_PROBES):
+            is_first = np.ones(len(band_rows), dtype=bool)
+            is_first[1:] = buckets[1:] != buckets[:-1]
+            if is_first.all():
+                break
+            first_rows = band_rows[np.maximum.accumulate(np.where(is_first, np.arange(len(band_rows)), 0))]
+            others = ~is_first
+            similar = (signatures[band_rows[others]] == signatures[first_rows[others]]).sum(axis=1) >= min_equal
+            comparisons += int(others.sum())
+            for first, row in zip(first_rows[others][similar].tolist(), band_rows[others][similar].tolist()):
+                clusters.union(first, row)
+            # Next round: the rows that weren't similar to their bucket's first row
+            remaining = others.copy()
+            remaining[others] = ~similar
+            band_rows, buckets = band_rows[remaining], buckets[remaining]
+    return comparisons
+
+
+def find_clusters(word_lists, threshold=DEFAULT_THRESHOLD):
+    """Cluster id of every row (a list of its words) and the statistics of the run"""
+    keys, counts = shingle_keys(word_lists)
+    signatures = minhash_signatures(keys, counts)
+    clusters = _UnionFind(len(counts))
+    comparisons = _join_similar_rows(signatures, np.flatnonzero(counts), threshold, clusters)
+
+    cluster_ids = {}
+    row_clusters = [cluster_ids.setdefault(clusters.find(row), len(cluster_ids)) for row in range(len(counts))]
+    sizes = np.bincount(row_clusters, minlength=len(cluster_ids))
+    stats = {
+        'clusters': len(cluster_ids),
+        'duplicate_clusters': int((sizes > 1).sum()),
+        'rows_in_duplicate_clusters': int(sizes[sizes > 1].sum()),
+        'largest_cluster': int(sizes.max()) if len(sizes) else 0,
+        'comparisons': comparisons,
+    }
+    return row_clusters, stats
+
+
+def cluster_rows(titles, descriptions, threshold=DEFAULT_THRESHOLD):
+    """find_clusters over the words of each title and description"""
+    return find_clusters([text_words(title, description) for title, description in zip(titles, descriptions)],
+                         threshold)
@@ -0,0 +1,38 @@
+"""Process-pool helper for the per-row stages (2, 3b and 4a).
+
+Work is split into contiguous chunks and mapped over a process pool.
+Executor.map returns results in submission order, so concatenating them
+gives exactly the serial result.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+# Several chunks per worker so one slow chunk doesn't leave the other workers idle
+CHUNKS_PER_WORKER = 4
+
+_pools = {}
+
+
+def _get_pool(workers):
+    """One pool per worker count, reused across stages and stream chunks"""
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return _pools[workers]
+
+
+def split_chunks(items, parts):
+    """Split a list or Series into at most `parts` contiguous chunks of near-equal size"""
+    parts = max(1, min(parts, len(items)))
+    bounds = [len(items) * i // parts for i in range(parts + 1)]
+    slicer = items.iloc if hasattr(items, 'iloc') else items
+    return [slicer[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def map_chunks(func, items, workers=1):
+    """Apply func to contiguous chunks of items, in a process pool when workers > 1.
+
+    Returns the list of per-chunk results in input order. func must be a
+    module-level function so it can be sent to the worker processes.
+    """
+    if workers <= 1 or len(items) < 2:
+        return [func(items)]
+    return list(_get_pool(workers).map(func, split_chunks(items, workers * CHUNKS_PER_WORKER)))
@@ -0,0 +1,122 @@
+"""One entry point for every stage, with a fast start for small runs.
+
+Only the standard library is imported up front; a stage's module, and with
+it pandas, is imported when that stage runs:
+
+    python pipeline_cli.py 4b --no-excel      # a stage script with its own arguments
+    python pipeline_cli.py run --state-db ../output/pipeline_state.sqlite
+
+`run` runs stages 1 → 4b. When at most LITE_MAX_ROWS rows have to go
+through stages 2-4a (a small dump, or the new videos of an incremental
+run) it takes the pure-Python path of lite_pipeline.py, which doesn't
+import pandas, numpy or openpyxl at all without the Excel file. Larger
+batches and options only run_pipeline.py has (--workers, --format, ...)
+go to run_pipeline.py. Every command prints its measured start-up time,
+from the first line of this module until the stage starts; the bare
+interpreter adds about 20 ms to it.
+
+Usage:
+    python pipeline_cli.py {1,2,2b,3a,3b,3c,4a,4b,5} [STAGE OPTIONS]
+    python pipeline_cli.py run [--engine {auto,lite,pandas}] [--input FILE] [--output-dir DIR]
+                               [--state-db FILE] [--date-cache FILE] [--no-excel] [--quiet]
+                               [RUN_PIPELINE OPTIONS]
+"""
+import time
+
+STARTED_AT = time.perf_counter()
+
+import argparse
+import importlib
+import sys
+
+STAGE_SCRIPTS = {
+    '1': '1_extract_rename_columns',
+    '2': '2_extract_number_date_strings',
+    '2b': '2b_find_near_duplicates',
+    '3a': '3a_analyze_date_format',
+    '3b': '3b_convert_dates',
+    '3c': '3c_merge_3b_output_and_pub_date',
+    '4a': '4a_prepare_sorting',
+    '4b': '4b_create_chronological_order',
+    '5': '5_build_search_index',
+}
+ENGINES = ('auto', 'lite', 'pandas')
+
+
+def report_startup(what, started_at=STARTED_AT):
+    """Print the time spent importing since started_at (when this module was loaded), returns it in seconds"""
+    startup = time.perf_counter() - started_at
+    print(f"Start-up: {startup * 1000:.0f} ms importing {what}")
+    return startup
+
+
+def run_stage(name, args):
+    module = importlib.import_module(STAGE_SCRIPTS[name])
+    report_startup(f"stage {name}")
+    # The stage parses its own arguments
+    sys.argv = [module.__file__, *args]
+    module.main()
+
+
+def run_pandas(args, started_at=STARTED_AT):
+    run_pipeline = importlib.import_module('run_pipeline')
+    report_startup("run_pipeline.py", started_at)
+    sys.argv = [run_pipeline.__file__, *args]
+    run_pipeline.main()
+
+
+def run(argv):
+    parser = argparse.ArgumentParser(
+        prog='pipeline_cli.py run', allow_abbrev=False,
+        description="Run stages 1 → 4b, without pandas for small batches",
+        epilog="Any other run_pipeline.py option (--workers, --format, ...) selects run_pipeline.py.")
+    parser.add_argument('--engine', choices=ENGINES, default='auto',
+                        help="lite: pure Python, pandas: run_pipeline.py, auto: lite for small batches (default)")
+    parser.add_argument('--input', help="Apify scraper dump (JSON), or a directory / glob pattern of dumps")
+    parser.add_argument('--output-dir', help="Directory for the output files")
+    parser.add_argument('--state-db', metavar='FILE', help="SQLite state of the previous runs (incremental run)")
+    parser.add_argument('--date-cache', metavar='FILE', help="Keep parsed dates in this JSON file between runs")
+    parser.add_argument('--no-excel', action='store_true', help="Skip the Excel file")
+    parser.add_argument('--quiet', action='store_true', help="Only print a one-line summary at the end")
+    args, other_options = parser.parse_known_args(argv)
+    # run_pipeline.py gets the same arguments, without --engine
+    pandas_args = [arg for position, arg in enumerate(argv) if not arg.startswith('--engine')
+                   and (position == 0 or argv[position - 1] != '--engine')]
+
+    if args.engine == 'pandas' or (args.engine == 'auto' and other_options):
+        run_pandas(pandas_args)
+        return
+    if other_options:
+        parser.error(f"{' '.join(other_options)} needs the pandas engine")
+
+    from lite_pipeline import LITE_MAX_ROWS, run_lite
+    from pipeline_metrics import NORMAL, QUIET, stage_output
+    startup = report_startup("the lightweight pipeline")
+
+    options = {name: value for name, value in (('input_file', args.input), ('output_dir', args.output_dir))
+               if value is not None}
+    with stage_output(QUIET if args.quiet else NORMAL):
+        lectures = run_lite(state_db=args.state_db, date_cache_file=args.date_cache, excel=not args.no_excel,
+                            max_rows=LITE_MAX_ROWS if args.engine == 'auto' else None,
+                            startup_seconds=round(startup, 4), **options)
+    if lectures is None:
+        print(f"More than {LITE_MAX_ROWS} rows to process, using run_pipeline.py")
+        run_pandas(pandas_args, time.perf_counter())
+    elif args.quiet:
+        print(f"{lectures} lectures ordered in {time.perf_counter() - STARTED_AT:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run one stage of the lecture pipeline, or all of them with run")
+    parser.add_argument('command', choices=[*STAGE_SCRIPTS, 'run'], help="Stage script to run, or run for 1 → 4b")
+    parser.add_argument('options', nargs=argparse.REMAINDER, help="Options of the stage script or of run")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        run(args.options)
+    else:
+        run_stage(args.command, args.options)
+
+
+if __name__ == '__main__':
+    main()
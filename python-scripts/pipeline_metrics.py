@@ -0,0 +1,96 @@
+"""Per-stage metrics and console verbosity for pipeline runs.
+
+Every run appends one JSON line to pipeline_metrics.jsonl in the output
+directory: when and how the run was started, and for each stage its row
+count, elapsed time, rows/sec, the process's peak RSS so far and
+stage-specific counts such as extraction and date conversion success rates.
+
+Verbosity levels: QUIET silences the stage reports, NORMAL prints summaries
+and samples, VERBOSE also lists every row where a stage supports it.
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+METRICS_FILE_NAME = 'pipeline_metrics.jsonl'
+
+QUIET, NORMAL, VERBOSE = 0, 1, 2
+
+
+def peak_rss_mib():
+    """Peak resident set size of this process in MiB, None where it can't be measured"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return round(peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10, 1)
+
+
+def rate(part, total):
+    """part / total rounded for the metrics file, None when total is 0"""
+    return round(part / total, 4) if total else None
+
+
+@contextlib.contextmanager
+def stage_output(verbosity):
+    """Silence the stage reports printed inside the block when verbosity is QUIET"""
+    if verbosity > QUIET:
+        yield
+        return
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+class RunMetrics:
+    """Metrics of one pipeline run, one record per stage"""
+
+    def __init__(self, run_type, **run_info):
+        self.record = {
+            'run_type': run_type,
+            'started_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            **run_info,
+            'stages': [],
+        }
+        self._start = time.perf_counter()
+
+    def add_stage(self, name, rows, seconds, **counts):
+        """Record a stage that processed `rows` rows in `seconds`, plus stage-specific counts"""
+        self.record['stages'].append({
+            'stage': name,
+            'rows': int(rows),
+            'seconds': round(seconds, 4),
+            'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+            'peak_rss_mib': peak_rss_mib(),
+            **counts,
+        })
+
+    @contextlib.contextmanager
+    def stage(self, name, rows):
+        """Time the block as stage `name` over `rows` rows.
+
+        Yields a dict, stage-specific counts put into it inside the block are
+        added to the stage record.
+        """
+        counts = {}
+        start = time.perf_counter()
+        yield counts
+        self.add_stage(name, rows, time.perf_counter() - start, **counts)
+
+    def save(self, output_dir):
+        """Append the run record to the metrics file in output_dir, returns its path"""
+        self.record['seconds'] = round(time.perf_counter() - self._start, 4)
+        self.record['peak_rss_mib'] = peak_rss_mib()
+
+        os.makedirs(output_dir, exist_ok=True)
+        metrics_file = os.path.join(output_dir, METRICS_FILE_NAME)
+        with open(metrics_file, 'a', encoding='utf-8') as file:
+            file.write(json.dumps(self.record, ensure_ascii=False) + '\n')
+        return metrics_file
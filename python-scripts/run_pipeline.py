@@ -0,0 +1,368 @@
+"""Run stages 1 → 4b in one process over a single in-memory DataFrame.
+
+The numbered scripts can still be run one by one, this runner only reads the
+raw dump once and writes the final 4b outputs. Intermediate artifacts
+(01_, 02_, 03b_, 4a_) are written only with --save-intermediates.
+
+The raw dump is streamed in chunks of --chunk-size records: stages 1 and 2
+run chunk by chunk, so only the cleaned columns of the dump are ever held
+in memory.
+
+With --state-db the run is incremental: videos are tracked by their YouTube
+id in a SQLite database, only new or edited videos go through stages 2-4a,
+and they are merged into the previously sorted result.
+
+--format parquet writes the intermediates and the final 4b file as Parquet
+instead of JSON (needs pyarrow), --format ndjson as one JSON object per
+line (see ndjson_stream.py); the Excel file is written either way unless
+--no-excel is given.
+
+Every run appends its per-stage metrics (rows, elapsed time, rows/sec, peak
+RSS, success rates) to pipeline_metrics.jsonl in the output directory.
+--quiet silences the stage reports, --verbose also lists every row.
+
+--compact-text stores each distinct "►" boilerplate block of the
+descriptions once (see compact_text.py): after stage 2 the descriptions
+hold "[[boilerplate N]]" references, and the 4b outputs come with
+4b_boilerplate_blocks.json to expand them (full runs only).
+
+--strip-boilerplate removes the donation, contact and divider lines from
+the descriptions right after stage 1 (see boilerplate_strip.py, --phrases
+for another phrase list) and moves their hashtags to a "tags" column, so
+the later stages and the outputs carry less text (full runs only).
+
+--find-duplicates runs stage 2b after stage 2: near-duplicate lectures
+(re-uploads, parts sharing a description) get the same "cluster_id" in the
+4b outputs. --collapse-duplicates also keeps only the earliest row of each
+cluster and lecture number (full runs only).
+
+--search-index also runs stage 5, the full-text search index over the titles
+and descriptions (5_search_index.json, queried with search_index.py).
+
+Usage:
+    python run_pipeline.py [--input FILE] [--output-dir DIR] [--chunk-size N] [--workers N] [--save-intermediates]
+                           [--format {json,parquet,ndjson}] [--compact-text] [--search-index]
+                           [--find-duplicates | --collapse-duplicates] [--strip-boilerplate] [--phrases FILE]
+                           [--no-excel]
+    python run_pipeline.py --state-db ../output/pipeline_state.sqlite [--input FILE] [--output-dir DIR]
+    python run_pipeline.py --quiet | --verbose
+"""
+import argparse
+import importlib
+import os
+import time
+
+import pandas as pd
+
+from boilerplate_strip import DEFAULT_PHRASES, BoilerplateStripper, load_phrases
+from catalogue_facets import FacetCounts
+from columnar_io import OUTPUT_FORMATS
+from compact_text import BoilerplateTable, compact_descriptions, expand_descriptions
+from incremental_state import VideoStateStore, content_hashes
+from json_stream import DEFAULT_CHUNK_SIZE
+from pipeline_metrics import METRICS_FILE_NAME, NORMAL, QUIET, VERBOSE, RunMetrics, stage_output
+from russian_dates import DateCache, new_conversion_stats
+from search_index import INDEX_FILE, save_index
+
+# Stage modules start with a digit, so they can't be imported with a plain import statement
+stage1 = importlib.import_module('1_extract_rename_columns')
+stage2 = importlib.import_module('2_extract_number_date_strings')
+stage2b = importlib.import_module('2b_find_near_duplicates')
+stage3a = importlib.import_module('3a_analyze_date_format')
+stage3b = importlib.import_module('3b_convert_dates')
+stage4a = importlib.import_module('4a_prepare_sorting')
+stage4b = importlib.import_module('4b_create_chronological_order')
+stage5 = importlib.import_module('5_build_search_index')
+
+
+def save_search_index(df_final, output_dir, metrics, boilerplate=None):
+    """Stage 5 on the final frame"""
+    print("\nStage 5: building search index...")
+    with metrics.stage('5 search index', len(df_final)) as counts:
+        index = stage5.build_search_index(df_final, boilerplate)
+        counts['terms'] = len(index['postings'])
+    stage5.report_index(index, save_index(index, os.path.join(output_dir, os.path.basename(INDEX_FILE))))
+
+
+def run_pipeline(input_file=stage1.INPUT_FILE, output_dir=stage1.OUTPUT_DIR, save_intermediates=False,
+                 chunk_size=DEFAULT_CHUNK_SIZE, date_cache_file=None, workers=1, output_format='json',
+                 verbosity=NORMAL, compact_text=False, search_index=False, excel=True, duplicates=None,
+                 boilerplate_phrases=None):
+    """Run every stage in memory and return the final ordered DataFrame.
+
+    date_cache_file persists parsed dates between runs, without it they are cached in memory only.
+    With workers > 1, stages 2, 3b and 4a run in a process pool. Per-stage metrics are appended
+    to pipeline_metrics.jsonl in output_dir. With compact_text the descriptions of the returned
+    frame hold boilerplate references, the blocks are saved next to the 4b outputs.
+    search_index also builds the stage 5 search index, excel=False skips the Excel file.
+    duplicates='find' adds stage 2b's cluster ids, 'collapse' also drops the re-uploads in 4b.
+    With boilerplate_phrases (a phrase list) the lines containing one are stripped after stage 1.
+    """
+    start_time = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    metrics = RunMetrics('full', input_file=input_file, workers=workers, chunk_size=chunk_size)
+    # Stage 2 reads the full descriptions, so each chunk is compacted right after it
+    boilerplate = BoilerplateTable() if compact_text else None
+    stripper = BoilerplateStripper(boilerplate_phrases) if boilerplate_phrases is not None else None
+    strip_counts = {'chars_before': 0, 'chars_after': 0, 'with_tags': 0}
+
+    print(f"Stages 1-2: streaming {input_file} in chunks of {chunk_size} records")
+    cleaned_chunks = []
+    extracted_chunks = []
+    # Stages 1 and 2 alternate chunk by chunk, so their times are added up separately
+    clean_seconds = strip_seconds = extract_seconds = 0.0
+    chunk_start = time.perf_counter()
+    for chunk in stage1.iter_cleaned_chunks(input_file, chunk_size):
+        extract_start = time.perf_counter()
+        clean_seconds += extract_start - chunk_start
+        if stripper is not None:
+            strip_counts['chars_before'] += stage1.description_chars(chunk)
+            chunk = stage1.strip_boilerplate(chunk, stripper)
+            strip_counts['chars_after'] += stage1.description_chars(chunk)
+            strip_counts['with_tags'] += int(chunk['tags'].notna().sum())
+            strip_seconds += time.perf_counter() - extract_start
+            extract_start = time.perf_counter()
+        if save_intermediates:
+            cleaned_chunks.append(chunk)
+        extracted = stage2.extract_number_date_strings(chunk, workers)
+        if boilerplate is not None:
+            extracted = compact_descriptions(extracted, boilerplate)
+        extracted_chunks.append(extracted)
+        chunk_start = time.perf_counter()
+        extract_seconds += chunk_start - extract_start
+
+    if not extracted_chunks:
+        raise ValueError(f"{input_file} contains no records")
+    df = pd.concat(extracted_chunks, ignore_index=True)
+    metrics.add_stage('1 load + clean', len(df), clean_seconds)
+    if stripper is not None:
+        metrics.add_stage('1 strip boilerplate', len(df), strip_seconds, **strip_counts)
+        print(f"Stripped boilerplate: {strip_counts['chars_before']} → {strip_counts['chars_after']} "
+              f"description characters, {strip_counts['with_tags']} videos with hashtags")
+    metrics.add_stage('2 extract', len(df), extract_seconds, **stage2.extraction_metrics(df))
+    if boilerplate is not None:
+        print(f"Compacted descriptions: {len(boilerplate)} distinct boilerplate blocks")
+        metrics.record['boilerplate_blocks'] = len(boilerplate)
+    print(f"Loaded DataFrame shape: {df.shape}")
+    if verbosity >= VERBOSE:
+        stage2.report_extraction(df, verbose=True)
+    else:
+        print(f"Found {df['number'].notna().sum()} rows with lecture information")
+    if save_intermediates:
+        stage1.save_results(pd.concat(cleaned_chunks, ignore_index=True), output_dir, output_format)
+        stage2.save_results(df if boilerplate is None else expand_descriptions(df, boilerplate),
+                            output_dir, output_format)
+
+    if duplicates is not None:
+        print("\nStage 2b: finding near-duplicates...")
+        with metrics.stage('2b near-duplicates', len(df)) as counts:
+            df, duplicate_stats = stage2b.find_near_duplicates(df)
+            counts.update(duplicate_stats)
+        stage2b.report_clusters(df, duplicate_stats)
+        if save_intermediates:
+            stage2b.save_results(df if boilerplate is None else expand_descriptions(df, boilerplate),
+                                 output_dir, output_format)
+
+    print("\nStage 3a: analyzing date format...")
+    with metrics.stage('3a analyze', len(df)):
+        analysis = stage3a.analyze_date_format(df)
+    if analysis is None:
+        raise ValueError("Stage 2 output has no 'date' column")
+    if save_intermediates:
+        stage3a.save_results(analysis, output_dir)
+
+    print("\nStage 3b: converting dates...")
+    date_stats = new_conversion_stats()
+    date_cache = DateCache(path=date_cache_file)
+    with metrics.stage('3b convert', len(df)) as counts:
+        df = stage3b.convert_dates(df, analysis, date_stats, date_cache, workers)
+        counts.update(stage3b.conversion_metrics(df, date_stats))
+    date_cache.save()
+    stage3b.report_conversion(df, date_stats)
+    if save_intermediates:
+        stage3b.save_results(df if boilerplate is None else expand_descriptions(df, boilerplate),
+                             output_dir, output_format)
+    # 4a rebuilds the datetime column from date_standard, same as when reading the 03b file
+    df = df.drop(columns=['date_datetime'], errors='ignore')
+
+    print("\nStage 4a: preparing data for sorting...")
+    with metrics.stage('4a prepare', len(df)) as counts:
+        df = stage4a.prepare_sorting(df, workers)
+        counts.update(stage4a.preparation_metrics(df))
+    stage4a.report_preparation(df)
+    if save_intermediates:
+        stage4a.save_results(df if boilerplate is None else expand_descriptions(df, boilerplate),
+                             output_dir, output_format)
+
+    print("\nStage 4b: creating chronological order...")
+    facets = FacetCounts()
+    with metrics.stage('4b order', len(df)):
+        df_final = stage4b.create_chronological_order(df, collapse=duplicates == 'collapse', facets=facets)
+    with metrics.stage('4b save', len(df_final)):
+        output_files = stage4b.save_results(df_final, output_dir, output_format, boilerplate, excel, facets)
+    stage4b.report_summary(df_final, output_files)
+    if search_index:
+        save_search_index(df_final, output_dir, metrics, boilerplate)
+
+    print(f"\nMetrics appended to: {metrics.save(output_dir)}")
+    print(f"Pipeline finished in {time.perf_counter() - start_time:.2f}s")
+    return df_final
+
+
+def process_new_rows(df, date_cache, workers=1, metrics=None):
+    """Stages 2-4a for the new or edited videos of an incremental run, timed in metrics if given"""
+    metrics = metrics or RunMetrics('incremental')
+    with metrics.stage('2 extract', len(df)) as counts:
+        df = stage2.extract_number_date_strings(df, workers)
+        counts.update(stage2.extraction_metrics(df))
+    with metrics.stage('3a analyze', len(df)):
+        analysis = stage3a.analyze_date_format(df)
+    date_stats = new_conversion_stats()
+    with metrics.stage('3b convert', len(df)) as counts:
+        df = stage3b.convert_dates(df, analysis, date_stats, date_cache, workers)
+        counts.update(stage3b.conversion_metrics(df, date_stats))
+    stage3b.report_conversion(df, date_stats)
+    df = df.drop(columns=['date_datetime'], errors='ignore')
+    with metrics.stage('4a prepare', len(df)) as counts:
+        df = stage4a.prepare_sorting(df, workers)
+        counts.update(stage4a.preparation_metrics(df))
+    return df
+
+
+def run_incremental(state_db, input_file=stage1.INPUT_FILE, output_dir=stage1.OUTPUT_DIR,
+                    chunk_size=DEFAULT_CHUNK_SIZE, date_cache_file=None, workers=1, output_format='json',
+                    search_index=False, excel=True):
+    """Process only new or edited videos and merge them into the order stored in state_db"""
+    start_time = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    metrics = RunMetrics('incremental', input_file=input_file, workers=workers, chunk_size=chunk_size)
+
+    print(f"Stage 1: streaming {input_file} in chunks of {chunk_size} records")
+    stage_start = time.perf_counter()
+    df = pd.concat(stage1.iter_cleaned_chunks(input_file, chunk_size, keep_columns=['id']), ignore_index=True)
+    # A video scraped twice in the same dump is processed once, the later record wins
+    df = df.drop_duplicates(subset='id', keep='last').reset_index(drop=True)
+    df['content_hash'] = content_hashes(df)
+    metrics.add_stage('1 load + clean', len(df), time.perf_counter() - stage_start)
+
+    store = VideoStateStore(state_db)
+    try:
+        known_hashes = store.load_hashes()
+        is_changed = [known_hashes.get(video_id) != video_hash
+                      for video_id, video_hash in zip(df['id'], df['content_hash'])]
+        df_new = df[is_changed].reset_index(drop=True)
+        unchanged_ids = set(df.loc[[not changed for changed in is_changed], 'id'])
+        removed = len(set(known_hashes) - set(df['id']))
+
+        print(f"\nVideos in dump: {len(df)}")
+        print(f"New or edited: {len(df_new)}")
+        print(f"Unchanged: {len(unchanged_ids)}")
+        print(f"No longer in dump: {removed}")
+        metrics.record.update(new_or_edited=len(df_new), unchanged=len(unchanged_ids), removed=removed)
+
+        # Rows of the previous run that are still valid, already in chronological order
+        df_sorted = store.load_rows(unchanged_ids)
+        # The stored facet counts without the old rows of the edited and removed videos
+        facets = store.load_facets()
+        if facets is not None:
+            facets.add_records(store.load_records(set(known_hashes) - unchanged_ids), sign=-1)
+
+        if len(df_new) > 0:
+            print("\nStages 2-4a: processing new and edited videos...")
+            date_cache = DateCache(path=date_cache_file)
+            df_new = process_new_rows(df_new, date_cache, workers, metrics)
+            date_cache.save()
+            with metrics.stage('4b merge', len(df_new)):
+                df_sorted = stage4b.merge_into_sorted(df_sorted, df_new)
+
+        if facets is None:
+            print("\nNo stored facet counts, counting every lecture")
+            facets = FacetCounts()
+            facets.add_frame(df_sorted)
+        elif len(df_new) > 0:
+            facets.add_frame(df_new)
+        store.replace_all(df_sorted, facets)
+    finally:
+        store.close()
+
+    print("\nStage 4b: creating chronological order...")
+    df_final = stage4b.finalize_order(df_sorted.drop(columns=['id', 'content_hash']))
+    with metrics.stage('4b save', len(df_final)):
+        output_files = stage4b.save_results(df_final, output_dir, output_format, excel=excel, facets=facets)
+    stage4b.report_summary(df_final, output_files)
+    if search_index:
+        save_search_index(df_final, output_dir, metrics)
+
+    print(f"\nMetrics appended to: {metrics.save(output_dir)}")
+    print(f"Incremental run finished in {time.perf_counter() - start_time:.2f}s")
+    return df_final
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the whole lecture pipeline in memory")
+    parser.add_argument('--input', default=stage1.INPUT_FILE, help="Apify scraper dump (JSON), or a directory / glob pattern of dumps to merge by video id")
+    parser.add_argument('--output-dir', default=stage1.OUTPUT_DIR, help="Directory for the output files")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Records per chunk when streaming the raw dump")
+    parser.add_argument('--save-intermediates', action='store_true',
+                        help="Also write the 01_, 02_, 03b_ and 4a_ artifacts (full runs only)")
+    parser.add_argument('--date-cache', metavar='FILE',
+                        help="Keep parsed dates in this JSON file between runs, e.g. ../output/03b_date_cache.json")
+    parser.add_argument('--state-db', metavar='FILE',
+                        help="SQLite state of the previous runs, only process new or edited videos")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes for stages 2, 3b and 4a (default: 1, no pool)")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default='json',
+                        help="File format of the intermediates and the final 4b file (parquet needs pyarrow, "
+                             "ndjson is written line by line)")
+    parser.add_argument('--compact-text', action='store_true',
+                        help="Store repeated description boilerplate blocks once (full runs only)")
+    parser.add_argument('--search-index', action='store_true',
+                        help="Also build the stage 5 full-text search index")
+    parser.add_argument('--no-excel', action='store_true',
+                        help="Skip the Excel file (write it later with excel_stream.py)")
+    parser.add_argument('--strip-boilerplate', action='store_true',
+                        help="Remove the donation / contact / divider lines and move hashtags to a tags column "
+                             "(full runs only)")
+    parser.add_argument('--phrases', metavar='FILE',
+                        help="JSON list of the phrases whose lines are removed (implies --strip-boilerplate)")
+    duplicates = parser.add_mutually_exclusive_group()
+    duplicates.add_argument('--find-duplicates', action='store_const', const='find', dest='duplicates',
+                            help="Add a cluster_id of near-duplicate lectures (stage 2b, full runs only)")
+    duplicates.add_argument('--collapse-duplicates', action='store_const', const='collapse', dest='duplicates',
+                            help="Also keep only the earliest row of each cluster and lecture number")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument('--quiet', action='store_true', help="Only print a one-line summary at the end")
+    verbosity.add_argument('--verbose', action='store_true', help="Also list every row's extracted number and date")
+    args = parser.parse_args()
+    verbosity = QUIET if args.quiet else VERBOSE if args.verbose else NORMAL
+    if args.state_db and args.compact_text:
+        parser.error("--compact-text can't be combined with --state-db")
+    if args.state_db and args.duplicates:
+        parser.error(f"--{args.duplicates}-duplicates can't be combined with --state-db")
+    if args.state_db and (args.strip_boilerplate or args.phrases):
+        parser.error("--strip-boilerplate can't be combined with --state-db")
+    boilerplate_phrases = None
+    if args.phrases:
+        boilerplate_phrases = load_phrases(args.phrases)
+    elif args.strip_boilerplate:
+        boilerplate_phrases = DEFAULT_PHRASES
+
+    start_time = time.perf_counter()
+    with stage_output(verbosity):
+        if args.state_db:
+            df_final = run_incremental(args.state_db, args.input, args.output_dir, args.chunk_size, args.date_cache,
+                                       args.workers, args.format, args.search_index,
+                                       not args.no_excel)
+        else:
+            df_final = run_pipeline(args.input, args.output_dir, args.save_intermediates, args.chunk_size,
+                                    args.date_cache, args.workers, args.format, verbosity, args.compact_text,
+                                    args.search_index, not args.no_excel, args.duplicates, boilerplate_phrases)
+
+    if verbosity == QUIET:
+        print(f"{len(df_final)} lectures ordered in {time.perf_counter() - start_time:.2f}s, "
+              f"metrics appended to {os.path.join(args.output_dir, METRICS_FILE_NAME)}")
+
+
+if __name__ == '__main__':
+    main()
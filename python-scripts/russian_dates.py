@@ -0,0 +1,298 @@
+"""Fast parser for Russian lecture dates such as "16 мая 2021".
+
+Dates extracted in stage 2 almost always follow "<day> <genitive month> <year>",
+so they are parsed with one regex and a direct month lookup. Only strings that
+don't fit that grammar go through the old month-name replacement and the
+general-purpose dateutil parser (the "slow path").
+
+The same date strings repeat across lecture parts and re-uploads, so parse
+results can be memoised in a DateCache: a bounded LRU keyed on the raw date
+string, optionally persisted to a JSON file so later runs don't parse
+strings they have already seen.
+
+Archives can mix formats, so convert_dates_by_format first classifies every
+row (each distinct string once) as "russian", "dd_mm_yyyy" or "other" and
+routes each group to its parser: DD/MM/YYYY strings go through one
+column-wise pd.to_datetime, the rest through the Russian parser above.
+"""
+import json
+import os
+import re
+from collections import Counter, OrderedDict
+from datetime import datetime
+
+from dateutil.parser import parse
+
+from lazy_import import lazy_module
+from parallel import map_chunks
+
+np = lazy_module('numpy')
+pd = lazy_module('pandas')
+
+# Russian month mapping (genitive, as in "16 мая 2021")
+RUSSIAN_MONTHS = {
+    'января': 1, 'февраля': 2, 'марта': 3,
+    'апреля': 4, 'мая': 5, 'июня': 6,
+    'июля': 7, 'августа': 8, 'сентября': 9,
+    'октября': 10, 'ноября': 11, 'декабря': 12
+}
+
+# Month names for the dateutil fallback
+ENGLISH_MONTHS = {
+    'января': 'January', 'февраля': 'February', 'марта': 'March',
+    'апреля': 'April', 'мая': 'May', 'июня': 'June',
+    'июля': 'July', 'августа': 'August', 'сентября': 'September',
+    'октября': 'October', 'ноября': 'November', 'декабря': 'December'
+}
+
+# "<day> <month> <year>" with any whitespace and an optional "г", "г." or "года" at the end
+DATE_PATTERN = re.compile(r'\s*([0-9]{1,2})\s+([^\W\d_]+)\s+([0-9]{4})\s*(?:г\.?|года)?\s*', re.IGNORECASE)
+# "16/05/2021", day and month may have one digit
+SLASH_DATE_PATTERN = re.compile(r'\s*[0-9]{1,2}/[0-9]{1,2}/[0-9]{4}\s*')
+
+DATE_FORMATS = ('russian', 'dd_mm_yyyy', 'other')
+
+
+def parse_russian_date(date_str):
+    """Parse "<day> <genitive month> <year>", returns a datetime or None if the string doesn't fit"""
+    match = DATE_PATTERN.fullmatch(date_str)
+    if not match:
+        return None
+
+    month = RUSSIAN_MONTHS.get(match.group(2).lower())
+    if month is None:
+        return None
+
+    try:
+        return datetime(int(match.group(3)), month, int(match.group(1)))
+    except ValueError:
+        # e.g. "31 февраля 2021", dateutil rejects those too
+        return None
+
+
+def parse_with_dateutil(date_str):
+    """Slow path: replace Russian month names with English and let dateutil parse the rest"""
+    english_date = date_str
+    for ru_month, en_month in ENGLISH_MONTHS.items():
+        english_date = english_date.replace(ru_month, en_month)
+    try:
+        return parse(english_date)
+    except Exception:
+        return None
+
+
+DEFAULT_CACHE_SIZE = 100000
+
+_MISSING = object()
+
+
+class DateCache:
+    """Bounded LRU cache: raw date string -> parsed datetime, or None for strings that can't be parsed.
+
+    With a path, entries are loaded from that JSON file on creation and
+    written back by save().
+    """
+
+    def __init__(self, maxsize=DEFAULT_CACHE_SIZE, path=None):
+        self.maxsize = maxsize
+        self.path = path
+        self._entries = OrderedDict()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, date_str):
+        """Cached result for date_str, or the module's _MISSING sentinel if it isn't cached"""
+        parsed_date = self._entries.get(date_str, _MISSING)
+        if parsed_date is not _MISSING:
+            self._entries.move_to_end(date_str)
+        return parsed_date
+
+    def put(self, date_str, parsed_date):
+        self._entries[date_str] = parsed_date
+        self._entries.move_to_end(date_str)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def load(self):
+        with open(self.path, 'r', encoding='utf-8') as file:
+            stored = json.load(file)
+        for date_str, iso_date in stored.items():
+            self.put(date_str, datetime.fromisoformat(iso_date) if iso_date is not None else None)
+
+    def save(self):
+        if self.path is None:
+            return
+        stored = {date_str: parsed_date.isoformat() if parsed_date is not None else None
+                  for date_str, parsed_date in self._entries.items()}
+        # Write to a temporary file first so an interrupted run can't leave a broken cache behind
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(stored, file, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+
+def new_conversion_stats():
+    return {'fast_path': 0, 'slow_path': 0, 'dd_mm_yyyy': 0, 'failed': 0, 'cache_hits': 0, 'cache_misses': 0}
+
+
+def _parse(date_str, stats):
+    parsed_date = parse_russian_date(date_str.strip())
+    if parsed_date is None:
+        parsed_date = parse_with_dateutil(date_str.strip())
+        if stats is not None:
+            stats['slow_path'] += 1
+    elif stats is not None:
+        stats['fast_path'] += 1
+    return parsed_date
+
+
+def convert_russian_date(date_str, stats=None, cache=None):
+    """Convert a Russian date to (datetime, "DD/MM/YYYY"), (None, None) if it can't be parsed.
+
+    When a stats dict (see new_conversion_stats) is given, the path every
+    date took is counted in it. With a DateCache, strings seen before are
+    not parsed again.
+    """
+    # Strings are checked first so the per-row path doesn't need pandas
+    if not isinstance(date_str, str) and (date_str is None or pd.isna(date_str)):
+        return None, None
+
+    date_str = str(date_str)
+    parsed_date = cache.get(date_str) if cache is not None else _MISSING
+    if parsed_date is _MISSING:
+        parsed_date = _parse(date_str, stats)
+        if cache is not None:
+            cache.put(date_str, parsed_date)
+            if stats is not None:
+                stats['cache_misses'] += 1
+    elif stats is not None:
+        stats['cache_hits'] += 1
+
+    if parsed_date is None:
+        if stats is not None:
+            stats['failed'] += 1
+        return None, None
+
+    return parsed_date, parsed_date.strftime('%d/%m/%Y')
+
+
+def _parse_date_strings(date_strs):
+    """Worker for convert_russian_dates: parse a chunk of strings, with the path counts"""
+    stats = new_conversion_stats()
+    return [_parse(date_str, stats) for date_str in date_strs], stats
+
+
+def convert_russian_dates(dates, stats=None, cache=None, workers=1):
+    """convert_russian_date for a whole column, returns a list of (datetime, "DD/MM/YYYY") tuples.
+
+    With workers > 1 the distinct strings that aren't cached yet are parsed
+    in a process pool, then every row is looked up in the cache. Results
+    are the same as in a serial run.
+    """
+    if workers <= 1:
+        return [convert_russian_date(date_str, stats, cache) for date_str in dates]
+
+    count_cache = cache is not None and stats is not None
+    cache = cache if cache is not None else DateCache(maxsize=float('inf'))
+    to_parse = list(dict.fromkeys(str(date_str) for date_str in dates
+                                  if not pd.isna(date_str) and cache.get(str(date_str)) is _MISSING))
+
+    position = 0
+    for parsed_dates, chunk_stats in map_chunks(_parse_date_strings, to_parse, workers):
+        for date_str, parsed_date in zip(to_parse[position:position + len(parsed_dates)], parsed_dates):
+            cache.put(date_str, parsed_date)
+        position += len(parsed_dates)
+        if stats is not None:
+            stats['fast_path'] += chunk_stats['fast_path']
+            stats['slow_path'] += chunk_stats['slow_path']
+
+    results = []
+    for date_str in dates:
+        parsed_date = None if pd.isna(date_str) else cache.get(str(date_str))
+        if parsed_date is _MISSING:
+            # Evicted again because the cache is smaller than the number of distinct dates
+            parsed_date = _parse(str(date_str), stats)
+        if parsed_date is None:
+            if stats is not None and not pd.isna(date_str):
+                stats['failed'] += 1
+            results.append((None, None))
+        else:
+            results.append((parsed_date, parsed_date.strftime('%d/%m/%Y')))
+
+    if count_cache:
+        stats['cache_misses'] += len(to_parse)
+        stats['cache_hits'] += sum(not pd.isna(date_str) for date_str in dates) - len(to_parse)
+    return results
+
+
+def date_format(date_str):
+    """"russian", "dd_mm_yyyy" or "other", the format group of one date string"""
+    if SLASH_DATE_PATTERN.fullmatch(date_str):
+        return 'dd_mm_yyyy'
+    match = DATE_PATTERN.fullmatch(date_str)
+    if match and match.group(2).lower() in RUSSIAN_MONTHS:
+        return 'russian'
+    return 'other'
+
+
+def classify_date_formats(dates):
+    """Format group of every row (see date_format), None for missing dates.
+
+    Each distinct string is classified once and the labels are spread back
+    to the rows, so the pass is linear in the rows with a small constant.
+    """
+    codes, uniques = pd.factorize(pd.Series(dates, dtype=object))
+    # Code -1 (missing) picks the trailing None
+    labels = np.array([date_format(str(date_str)) for date_str in uniques] + [None], dtype=object)
+    return labels[codes]
+
+
+def format_histogram(formats):
+    """Row count per format group, every group of DATE_FORMATS included"""
+    counts = dict.fromkeys(DATE_FORMATS, 0)
+    counts.update(Counter(label for label in formats if label is not None))
+    return counts
+
+
+def convert_dates_by_format(dates, stats=None, cache=None, workers=1, formats=None):
+    """Convert a column of mixed-format dates, returns a list of (datetime, "DD/MM/YYYY") tuples.
+
+    DD/MM/YYYY rows are parsed column-wise with pd.to_datetime, the Russian
+    and other rows go through convert_russian_dates (fast path, cache and
+    dateutil fallback). formats are the row labels of classify_date_formats,
+    computed here if not given.
+    """
+    dates = pd.Series(dates, dtype=object).reset_index(drop=True)
+    formats = classify_date_formats(dates) if formats is None else np.asarray(formats, dtype=object)
+    slash_rows = np.flatnonzero(formats == 'dd_mm_yyyy')
+    other_rows = np.flatnonzero(formats != 'dd_mm_yyyy')
+
+    results = [(None, None)] * len(dates)
+    if len(slash_rows):
+        parsed = pd.to_datetime(dates.iloc[slash_rows].str.strip(), format='%d/%m/%Y', errors='coerce')
+        for row, parsed_date in zip(slash_rows, parsed):
+            if pd.isna(parsed_date):
+                # e.g. "31/02/2021"
+                if stats is not None:
+                    stats['failed'] += 1
+                continue
+            parsed_date = parsed_date.to_pydatetime()
+            results[row] = (parsed_date, parsed_date.strftime('%d/%m/%Y'))
+        if stats is not None:
+            stats['dd_mm_yyyy'] += len(slash_rows)
+    if len(other_rows):
+        for row, result in zip(other_rows, convert_russian_dates(dates.iloc[other_rows], stats, cache, workers)):
+            results[row] = result
+    return results
+
+
+def print_conversion_stats(stats):
+    print(f"DD/MM/YYYY conversions (column-wise): {stats['dd_mm_yyyy']}")
+    print(f"Fast-path conversions: {stats['fast_path']}")
+    print(f"Slow-path (dateutil) conversions: {stats['slow_path']}")
+    if stats['cache_hits'] or stats['cache_misses']:
+        print(f"Date cache hits: {stats['cache_hits']}")
+        print(f"Date cache misses: {stats['cache_misses']}")
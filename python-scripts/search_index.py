@@ -0,0 +1,181 @@
+"""Inverted index over lecture titles and descriptions with ranked queries.
+
+Text is normalised the same way when indexing and when querying:
+
+1. case folding and "ё" -> "е", so "Ёлка", "ёлка" and "елка" match;
+2. splitting into words of letters and digits;
+3. light suffix stripping: the longest common Russian ending in SUFFIXES is
+   cut off as long as MIN_STEM_LENGTH letters remain, so "лекция",
+   "лекции" and "лекциями" all become "лекц". Numbers are kept as they are.
+
+The index maps every term to its posting list, the `order` ids of the
+lectures containing it and how often it occurs there. Title terms count
+TITLE_WEIGHT times. Queries are ranked with BM25 and only touch the posting
+lists of their terms; the index file stores titles, dates and numbers for
+the results, but no descriptions.
+
+Usage:
+    python search_index.py "духовное развитие" [--index FILE] [--limit N]
+"""
+import argparse
+import functools
+import heapq
+import json
+import math
+import re
+import time
+from collections import Counter
+
+INDEX_FILE = '../output/5_search_index.json'
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+# Noun, adjective and verb endings, the longest matching one is stripped
+SUFFIXES = frozenset([
+    'остями', 'остью', 'остей', 'остям', 'остях', 'ость', 'ости',
+    'иями', 'ями', 'ами', 'ией', 'иях', 'ием', 'иям',
+    'его', 'ого', 'ему', 'ому', 'ыми', 'ими', 'ешь', 'ете', 'ишь', 'ите', 'ует', 'уют',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ую', 'юю', 'ых', 'их', 'ым', 'им',
+    'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев', 'ия', 'ии', 'ию', 'ть', 'ет', 'ит', 'ут', 'ят',
+    'ся', 'сь',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+])
+SUFFIX_LENGTHS = sorted({len(suffix) for suffix in SUFFIXES}, reverse=True)
+MIN_STEM_LENGTH = 3
+
+TITLE_WEIGHT = 3
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Columns stored for the results, descriptions are only used to build the index
+RESULT_COLUMNS = ['title', 'number', 'date_standard']
+
+
+def normalize(text):
+    """Case-folded text with "ё" replaced by "е" """
+    return text.casefold().replace('ё', 'е')
+
+
+# The same words repeat across descriptions, so each is stemmed once
+@functools.lru_cache(maxsize=2 ** 18)
+def stem(word):
+    """word without its longest Russian ending, if enough of it remains"""
+    if word.isdigit():
+        return word
+    for length in SUFFIX_LENGTHS:
+        if len(word) - length >= MIN_STEM_LENGTH and word[-length:] in SUFFIXES:
+            return word[:-length]
+    return word
+
+
+def tokenize(text):
+    """Normalised, stemmed terms of text in order, [] for a missing text"""
+    if not isinstance(text, str):
+        return []
+    return [stem(word) for word in TOKEN_PATTERN.findall(normalize(text))]
+
+
+def build_index(orders, titles, descriptions, **result_columns):
+    """Build the index from parallel columns, returns a JSON-serialisable dict.
+
+    result_columns (e.g. number=..., date_standard=...) are stored per lecture
+    and returned with the search results next to the title; titles and
+    these values must be JSON-serialisable, with None for missing values.
+    """
+    postings = {}
+    lengths = []
+    for position, (title, description) in enumerate(zip(titles, descriptions)):
+        term_counts = Counter(tokenize(description))
+        for term in tokenize(title):
+            term_counts[term] += TITLE_WEIGHT
+        lengths.append(sum(term_counts.values()))
+        for term, count in term_counts.items():
+            postings.setdefault(term, ([], []))
+            postings[term][0].append(position)
+            postings[term][1].append(count)
+
+    return {
+        'documents': {
+            'order': [int(order) for order in orders],
+            'length': lengths,
+            'title': list(titles),
+            **{name: list(values) for name, values in result_columns.items()},
+        },
+        # term -> [document positions, term counts]
+        'postings': {term: [positions, counts] for term, (positions, counts) in sorted(postings.items())},
+    }
+
+
+def save_index(index, path=INDEX_FILE):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(index, file, ensure_ascii=False, separators=(',', ':'))
+    return path
+
+
+class SearchIndex:
+    """Ranked queries over an index built by build_index"""
+
+    def __init__(self, index):
+        self.documents = index['documents']
+        self.postings = index['postings']
+        lengths = self.documents['length']
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+
+    @classmethod
+    def load(cls, path=INDEX_FILE):
+        with open(path, 'r', encoding='utf-8') as file:
+            return cls(json.load(file))
+
+    def __len__(self):
+        return len(self.documents['order'])
+
+    def search(self, query, limit=10):
+        """Lectures matching any query term, best BM25 score first.
+
+        Returns a list of dicts with the lecture's order, score and the
+        stored result columns.
+        """
+        document_count = len(self)
+        lengths = self.documents['length']
+        scores = {}
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            positions, counts = self.postings[term]
+            idf = math.log(1 + (document_count - len(positions) + 0.5) / (len(positions) + 0.5))
+            for position, count in zip(positions, counts):
+                length_norm = 1 - B + B * lengths[position] / self.average_length
+                scores[position] = scores.get(position, 0.0) + idf * count * (K1 + 1) / (count + K1 * length_norm)
+
+        ranked = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self._result(position, score) for position, score in ranked]
+
+    def _result(self, position, score):
+        result = {'order': self.documents['order'][position], 'score': round(score, 4)}
+        for column in RESULT_COLUMNS:
+            if column in self.documents:
+                result[column] = self.documents[column][position]
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the lecture index")
+    parser.add_argument('query', help="Search words")
+    parser.add_argument('--index', default=INDEX_FILE, help="Index file built by 5_build_search_index.py")
+    parser.add_argument('--limit', type=int, default=10, help="Number of results")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = SearchIndex.load(args.index)
+    loaded = time.perf_counter()
+    results = index.search(args.query, args.limit)
+    searched = time.perf_counter()
+
+    print(f"Loaded {len(index)} lectures in {(loaded - start) * 1000:.1f} ms, "
+          f"query took {(searched - loaded) * 1000:.2f} ms")
+    for result in results:
+        print(f"{result['order']:>6}  {result['score']:8.3f}  {result.get('date_standard') or '':10}  {result['title']}")
+
+
+if __name__ == '__main__':
+    main()
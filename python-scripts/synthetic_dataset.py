@@ -0,0 +1,127 @@
+"""Synthetic YouTube scraper dumps for benchmarks.
+
+Records follow the Apify schema of the real dump (duration, url, order, id,
+date, text, title, thumbnailUrl). Descriptions mix the three formats stage 2
+recognises with plain descriptions, and some lecture dates can't be parsed
+by stage 3b, in roughly the proportions of the real channel.
+
+Usage:
+    python synthetic_dataset.py --rows 100000 [--output FILE] [--seed N]
+"""
+import argparse
+import json
+import random
+import string
+from datetime import datetime, timedelta
+
+from russian_dates import RUSSIAN_MONTHS
+
+OUTPUT_FILE = '../input/synthetic_dataset.json'
+
+# Share of each description format, the rest has no lecture marker at all
+FORMAT_WEIGHTS = {
+    'multi_part': 0.35,
+    'single': 0.20,
+    'date_only': 0.15,
+    'none': 0.30,
+}
+# Share of lecture dates that stage 3b can't parse
+UNPARSABLE_DATE_RATE = 0.03
+
+ID_ALPHABET = string.ascii_letters + string.digits + '-_'
+MONTH_NAMES = list(RUSSIAN_MONTHS)
+
+TOPICS = [
+    "Духовная практика на работе", "Причины падения в практике медитации", "Желание богатства и уверенность в себе",
+    "Как сочетаются поиск истины и материальная деятельность", "Сосредоточение и отрешение", "Линия поведения практикующего",
+    "Правильное устремление", "Выбор между духовным и материальным", "Воля и последовательность в действиях",
+    "Сутра о бревне", "Эгоизм и привязанности", "Вопросы и ответы о медитации",
+]
+POINTS = [
+    "Практикующий делает то, что способствует его практике.",
+    "Чтобы продолжать процесс сосредоточения, нужно поставить для себя цель.",
+    "Правильный поступок укрепляет и усиливает волю.",
+    "Если человек отрешился от своих привязанностей, для него нет работы, которая нравится или не нравится.",
+    "Последовательность в действиях - есть сосредоточенность.",
+    "У кого нет правильного устремления, те даже не думают о том, что у них есть выбор.",
+]
+HASHTAGS = ['#медитация', '#дзен', '#духовноеразвитие', '#уверенность', '#выбор', '#практика']
+SUPPORT_FOOTER = ("► Поддержать создание лекций:\nПриватбанк: 4731 1856 1944 8878\n"
+                  "Юмани: https://yoomoney.ru/to/4100115065109229")
+UNPARSABLE_DATES = ['летом 1998', 'в конце 1990-х', '31 февраля 2001', '15 мартобря 2003', 'осенью 2005']
+
+
+def random_lecture_date(rng):
+    """A "<day> <month> <year>" string, or one stage 3b can't parse"""
+    if rng.random() < UNPARSABLE_DATE_RATE:
+        return rng.choice(UNPARSABLE_DATES)
+    return f"{rng.randint(1, 28)} {rng.choice(MONTH_NAMES)} {rng.randint(1995, 2024)}"
+
+
+def random_description(rng, description_format):
+    lines = [f'Лекция "{rng.choice(TOPICS)}" мастера дзен-буддизма Сергея Бугаева', '-' * 59, '']
+    lines += [f"{i}. {point}" for i, point in enumerate(rng.sample(POINTS, rng.randint(1, 4)), start=1)]
+    lines.append('')
+
+    lecture = rng.randint(1, 400)
+    if description_format == 'multi_part':
+        lines.append(f"© Лекцию №{lecture} (часть {rng.randint(1, 8)}) Сергей Бугаев прочитал "
+                     f"{random_lecture_date(rng)} года")
+    elif description_format == 'single':
+        lines.append(f"© Лекцию №{lecture} Сергей Бугаев прочитал {random_lecture_date(rng)} года")
+    elif description_format == 'date_only':
+        lines.append(f"Лекция прочитана {random_lecture_date(rng)} года")
+    else:
+        lines.append("В живой беседе Сергей Бугаев отвечает на вопросы.")
+
+    lines += ['', SUPPORT_FOOTER, '', ' '.join(rng.sample(HASHTAGS, 3))]
+    return '\n'.join(lines)
+
+
+def generate_records(count, seed=0):
+    """Yield count synthetic scraper records, the same ones for the same seed"""
+    rng = random.Random(seed)
+    formats = list(FORMAT_WEIGHTS)
+    weights = list(FORMAT_WEIGHTS.values())
+    upload_start = datetime(2012, 1, 1)
+
+    for order in range(1, count + 1):
+        video_id = ''.join(rng.choices(ID_ALPHABET, k=11))
+        upload_date = upload_start + timedelta(seconds=rng.randint(0, 13 * 365 * 24 * 3600))
+        duration = rng.randint(60, 2 * 3600)
+        yield {
+            'duration': f"{duration // 3600:02d}:{duration // 60 % 60:02d}:{duration % 60:02d}",
+            'url': f"https://www.youtube.com/watch?v={video_id}",
+            'order': order,
+            'id': video_id,
+            'date': upload_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'text': random_description(rng, rng.choices(formats, weights)[0]),
+            'title': rng.choice(TOPICS),
+            'thumbnailUrl': f"https://i.ytimg.com/vi/{video_id}/maxresdefault.jpg",
+        }
+
+
+def write_dataset(output_file, count, seed=0):
+    """Write a synthetic dump as a JSON array, one record at a time"""
+    with open(output_file, 'w', encoding='utf-8') as file:
+        file.write('[')
+        for i, record in enumerate(generate_records(count, seed)):
+            file.write(',\n' if i else '\n')
+            file.write(json.dumps(record, ensure_ascii=False))
+        file.write('\n]\n')
+    return output_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic YouTube scraper dump")
+    parser.add_argument('--rows', type=int, default=100000, help="Number of records")
+    parser.add_argument('--output', default=OUTPUT_FILE, help="Output JSON file")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed")
+    args = parser.parse_args()
+
+    write_dataset(args.output, args.rows, args.seed)
+    print(f"Wrote {args.rows} records to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
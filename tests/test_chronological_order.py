@@ -0,0 +1,45 @@
+import importlib
+
+import pandas as pd
+
+stage4a = importlib.import_module('4a_prepare_sorting')
+stage4b = importlib.import_module('4b_create_chronological_order')
+
+
+def _lectures(dates, lecture_nums=None):
+    return pd.DataFrame({
+        'date_datetime': dates,
+        'lecture_num': lecture_nums or [0] * len(dates),
+        'part_num': [0] * len(dates),
+    })
+
+
+def test_sorts_dates_past_2262():
+    # A nanosecond datetime can't hold these, the 4a JSON strings are parsed at pandas' own unit
+    df = _lectures(['2301-05-05 00:00:00', None, '1999-09-17 00:00:00', '2262-04-12 00:00:00'])
+    assert stage4b.chronological_order(df).tolist() == [2, 3, 0, 1]
+
+
+def test_prepare_and_sort_date_past_2262():
+    df = pd.DataFrame({'title': ['b', 'a'], 'number': [None, '5'], 'date': [None, None],
+                       'date_standard': ['05/05/2301', '17/09/1999']})
+    df = stage4b.sort_chronologically(stage4a.prepare_sorting(df))
+    assert df['date_standard'].tolist() == ['17/09/1999', '05/05/2301']
+
+
+def test_merge_into_sorted_with_nanosecond_frame_and_date_past_2262():
+    df_sorted = _lectures(pd.to_datetime(['1999-09-17', '2024-10-14']).as_unit('ns'), [1, 2])
+    df_new = _lectures(pd.to_datetime(['2301-05-05', '2020-09-06']).as_unit('s'), [3, 4])
+    merged = stage4b.merge_into_sorted(df_sorted, df_new)
+    assert merged['lecture_num'].tolist() == [1, 4, 2, 3]
+
+
+def test_external_sort_keys_compare_across_chunk_units():
+    # A chunk without dates parses at a coarser unit than one with date strings
+    dated = stage4b._sort_records([{'date_datetime': '2301-05-05 00:00:00', 'lecture_num': 1, 'part_num': 0},
+                                   {'date_datetime': '1999-09-17 00:00:00', 'lecture_num': 2, 'part_num': 0}])
+    undated = stage4b._sort_records([{'date_datetime': None, 'lecture_num': 3, 'part_num': 0}])
+    timestamped = stage4b._sort_records([{'date_datetime': pd.Timestamp('2020-09-06').as_unit('s'),
+                                          'lecture_num': 4, 'part_num': 0}])
+    records = [record for _, record in sorted(dated + undated + timestamped, key=lambda pair: pair[0])]
+    assert [record['lecture_num'] for record in records] == [2, 4, 1, 3]
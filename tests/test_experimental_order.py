@@ -0,0 +1,68 @@
+import importlib
+import os
+import pickle
+
+import pandas as pd
+
+stage3c = importlib.import_module('3c_merge_3b_output_and_pub_date')
+
+SHEET = pd.DataFrame({'title': ['ЛЕКЦИЯ 1', 'Лекция 2', 'лекция 2', 'Лекция 4'],
+                      'experimental_order': [1, 2, 99, 4],
+                      'date_standard': ['x1', 'x2', 'x99', 'x4']})
+
+
+def _write_sheet(path, sheet=SHEET):
+    sheet.to_excel(path, index=False, engine='openpyxl')
+    # The same mtime every time, so only the content tells the versions apart
+    os.utime(path, ns=(0, 0))
+
+
+def test_sheet_cache_hit_and_invalidation(tmp_path):
+    sheet_file = str(tmp_path / 'lectures_experimental_order')
+    cache_file = str(tmp_path / 'cache.pkl')
+    _write_sheet(sheet_file)
+
+    assert stage3c.load_experimental_order(sheet_file, cache_file)[1] is False
+    df, from_cache = stage3c.load_experimental_order(sheet_file, cache_file)
+    assert from_cache is True
+    assert df.equals(SHEET)
+
+    # Touched but unchanged: found by its hash
+    os.utime(sheet_file, ns=(10 ** 9, 10 ** 9))
+    assert stage3c.load_experimental_order(sheet_file, cache_file)[1] is True
+
+    # Changed content: parsed again
+    _write_sheet(sheet_file, SHEET.assign(experimental_order=SHEET['experimental_order'] * 10))
+    df, from_cache = stage3c.load_experimental_order(sheet_file, cache_file)
+    assert from_cache is False
+    assert df['experimental_order'].tolist() == [10, 20, 990, 40]
+
+
+def test_sheet_cache_of_another_version_is_parsed_again(tmp_path):
+    sheet_file = str(tmp_path / 'lectures_experimental_order')
+    cache_file = str(tmp_path / 'cache.pkl')
+    _write_sheet(sheet_file)
+    stage3c.load_experimental_order(sheet_file, cache_file)
+
+    with open(cache_file, 'rb') as file:
+        cached = pickle.load(file)
+    stage3c._save_cache({**cached, 'version': stage3c.CACHE_VERSION - 1}, cache_file)
+    assert stage3c.load_experimental_order(sheet_file, cache_file)[1] is False
+
+    with open(cache_file, 'wb') as file:
+        file.write(b'not a pickle')
+    assert stage3c.load_experimental_order(sheet_file, cache_file)[1] is False
+
+
+def test_merge_by_title():
+    lectures = pd.DataFrame({'title': ['Лекция 2', ' лекция 1 ', 'Лекция 3', None],
+                             'date_standard': ['02/01/2020', '01/01/2020', '03/01/2020', None]})
+    merged, stats = stage3c.merge_experimental_order(lectures, SHEET)
+
+    # Lectures keep their order, "Лекция 3" and the row without a title have no sheet row
+    assert merged['title'].tolist()[:3] == lectures['title'].tolist()[:3]
+    assert merged['experimental_order'].fillna(0).tolist() == [2, 1, 0, 0]
+    # The first of the duplicate "Лекция 2" rows is kept, shared columns get the suffix
+    assert merged['date_standard_experimental'].fillna('').tolist() == ['x2', 'x1', '', '']
+    assert merged['date_standard'].fillna('').tolist() == lectures['date_standard'].fillna('').tolist()
+    assert (stats['matched'], stats['duplicate_sheet_keys'], stats['sheet_rows']) == (2, 1, 4)